@@ -0,0 +1,755 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Dict, Any
+from uuid import UUID
+import logging
+import time
+
+from database import async_read_session_factory, get_async_db, get_async_read_db, read_session_factory
+import models
+import schemas
+from pagination import set_next_cursor
+from queries import (
+    ArtifactFilters, JsonFilters, artifact_version_stmt, by_ids_stmt, artifacts_page_stmt, caption_row_stmt, captions_page_stmt, chunked,
+    hard_delete_by_ids_stmt, insert_artifact_stmt, insert_map_stmt, insert_returning, json_filter_errors, md5_lookup_stmt, next_update_time, preset_caption_condition, presets_page_stmt,
+    soft_delete_by_ids_stmt, update_returning, upsert_preset_stmt, with_captions,
+)
+import bulk
+from fieldsets import RowsResponse, field_columns, rows_response, with_keys
+from search import SEARCH_ORDERS, caption_search_stmt, check_order, check_search_limit, resolve_mode
+from buckets import BucketSpec, bucket_counts_stmt, bucket_ids_stmt, buckets_response, stream_bucket_ids
+from lineage import artifact_parents_stmt, artifact_tree_stmt, check_tree_params, tree_response
+from changes import check_limit, feed_response, parse_watermark, read_changes
+from etag import (
+    artifact_etag, build_response, cached_response, etag_matches, etag_response, response_cache, serialize,
+)
+from preset_cache import notify_change_async, preset_cache
+from coalescer import caption_coalescer
+
+logger = logging.getLogger(__name__)
+
+# 与main.py中的同步路由一一对应，使用AsyncSession，等待数据库时不占用线程池
+router = APIRouter()
+
+
+async def _first(db: AsyncSession, stmt):
+    return (await db.execute(stmt)).scalars().first()
+
+
+# 创建新图片
+@router.post("/artifacts/", response_model=schemas.Artifact, status_code=status.HTTP_201_CREATED)
+async def create_artifact(artifact: schemas.ArtifactCreate, db: AsyncSession = Depends(get_async_db)):
+    # 创建图片，确保不包含aspect_ratio字段；md5冲突时不插入
+    artifact_dict = {k: v for k, v in artifact.model_dump().items() if k != 'aspect_ratio'}
+    try:
+        row = (await db.execute(insert_artifact_stmt(artifact_dict))).first()
+        existing_id = None
+        if row is None:
+            existing_id = (await db.execute(
+                select(models.Artifact.id).where(models.Artifact.md5 == artifact.md5)
+            )).scalar()
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.exception("创建图片时发生错误")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"创建图片失败: {str(e)}"
+        )
+
+    # 检查MD5是否已存在
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"具有相同MD5的图片已存在: {existing_id}"
+        )
+    return dict(row._mapping)
+
+# 批量创建图片（按MD5服务端去重）
+@router.post("/artifacts/batch/", response_model=schemas.ArtifactBatchResult, status_code=status.HTTP_201_CREATED)
+async def create_artifacts_batch(artifacts: List[schemas.ArtifactCreate], db: AsyncSession = Depends(get_async_db)):
+    if len(artifacts) > bulk.ARTIFACT_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"单次最多创建 {bulk.ARTIFACT_BATCH_MAX} 张图片"
+        )
+
+    try:
+        rows = bulk.prepare_artifact_rows(artifacts)
+        created = {}
+        for chunk in chunked(rows, bulk.ARTIFACT_BATCH_CHUNK):
+            for artifact_id, md5 in await db.execute(bulk.insert_artifacts_stmt(chunk)):
+                created[md5] = artifact_id
+
+        # 未插入的行即为重复，查询已存在图片的id
+        duplicate_md5s = [row["md5"] for row in rows if row["md5"] not in created]
+        existing = {}
+        if duplicate_md5s:
+            existing = dict((await db.execute(bulk.existing_artifacts_stmt(duplicate_md5s))).all())
+
+        await db.commit()
+        return bulk.artifact_batch_result(artifacts, created, existing)
+    except Exception as e:
+        await db.rollback()
+        logger.exception("批量创建图片时发生错误")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量创建图片失败: {str(e)}"
+        )
+
+# 获取所有图片（支持分页和过滤）
+@router.get("/artifacts/", response_model=List[schemas.Artifact])
+async def read_artifacts(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    filters: ArtifactFilters = Depends(),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    # 只查询fields指定的列（默认全部），Core行直接由orjson编码
+    # 传入cursor时使用 (upload_time, id) 键集分页，否则兼容skip
+    columns = field_columns(models.Artifact, schemas.Artifact, fields)
+    stmt = artifacts_page_stmt(
+        filters, skip, limit, cursor, with_keys(columns, models.Artifact.upload_time, models.Artifact.id)
+    )
+    rows = (await db.execute(stmt)).all()
+
+    response = rows_response(rows, columns)
+    set_next_cursor(response, rows, limit, "upload_time", "id")
+    return response
+
+# 获取图片列表及其描述（描述通过一条selectin查询批量加载）
+@router.get("/artifacts/full/", response_model=List[schemas.ArtifactWithCaptions])
+async def read_artifacts_full(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    preset_key: Optional[str] = None,
+    filters: ArtifactFilters = Depends(),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    stmt = with_captions(artifacts_page_stmt(filters, skip, limit, cursor), preset_key)
+    artifacts = (await db.execute(stmt)).scalars().all()
+
+    set_next_cursor(response, artifacts, limit, "upload_time", "id")
+    return artifacts
+
+# 按宽高比/分辨率、像素数分桶统计图片数量；ids=true 时以NDJSON流式输出每个桶的图片id
+@router.get("/artifacts/buckets", response_model=schemas.ArtifactBuckets)
+async def read_artifact_buckets(
+    request: Request,
+    spec: BucketSpec = Depends(),
+    filters: ArtifactFilters = Depends(),
+    ids: bool = False,
+):
+    # 流式输出与 /artifacts/export 一样在线程池中用同步会话逐批读取，只在该分支打开会话
+    if ids:
+        return StreamingResponse(
+            stream_bucket_ids(bucket_ids_stmt(filters, spec), spec, session_factory=read_session_factory(request)),
+            media_type="application/x-ndjson",
+        )
+    async with async_read_session_factory(request)() as db:
+        rows = (await db.execute(bucket_counts_stmt(filters, spec))).all()
+    return buckets_response(rows, spec)
+
+# 获取单个图片及其描述
+@router.get("/artifacts/{artifact_id}/full", response_model=schemas.ArtifactWithCaptions)
+async def read_artifact_full(artifact_id: UUID, preset_key: Optional[str] = None, db: AsyncSession = Depends(get_async_read_db)):
+    stmt = with_captions(select(models.Artifact).where(models.Artifact.id == artifact_id), preset_key)
+    db_artifact = await _first(db, stmt)
+    if db_artifact is None:
+        raise HTTPException(status_code=404, detail="图片不存在")
+    return db_artifact
+
+# 获取图片的派生树（沿children_id向下），一条递归CTE查询返回展平的节点及层数
+@router.get("/artifacts/{artifact_id}/tree", response_model=schemas.ArtifactTree)
+async def read_artifact_tree(
+    artifact_id: UUID,
+    depth: int = 3,
+    limit: int = 1000,
+    include_deleted: bool = False,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    check_tree_params(depth, limit)
+    columns = field_columns(models.Artifact, schemas.Artifact, fields)
+    stmt = artifact_tree_stmt(artifact_id, depth, include_deleted, columns, limit)
+    response = tree_response((await db.execute(stmt)).all(), columns, limit)
+    if response is None:
+        raise HTTPException(status_code=404, detail="图片不存在")
+    return response
+
+# 获取图片的来源（沿children_id向上查找父图片，使用children_id的GIN索引）
+@router.get("/artifacts/{artifact_id}/parents", response_model=schemas.ArtifactTree)
+async def read_artifact_parents(
+    artifact_id: UUID,
+    depth: int = 3,
+    limit: int = 1000,
+    include_deleted: bool = False,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    check_tree_params(depth, limit)
+    columns = field_columns(models.Artifact, schemas.Artifact, fields)
+    stmt = artifact_parents_stmt(artifact_id, depth, include_deleted, columns, limit)
+    response = tree_response((await db.execute(stmt)).all(), columns, limit)
+    if response is None:
+        raise HTTPException(status_code=404, detail="图片不存在")
+    return response
+
+# 获取单个图片
+@router.get("/artifacts/{artifact_id}", response_model=schemas.Artifact)
+async def read_artifact(artifact_id: UUID, request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    response = await artifact_response(request, db, models.Artifact.id == artifact_id, artifact_id)
+    if response is None:
+        raise HTTPException(status_code=404, detail="图片不存在")
+    return response
+
+async def artifact_response(request: Request, db: AsyncSession, condition, artifact_id: Optional[UUID] = None) -> Optional[Response]:
+    """按ETag返回304、缓存的响应体或重新序列化的图片；图片不存在时返回None
+
+    请求带If-None-Match或该图片的响应体已缓存时，先只查询版本列，304或缓存命中时不加载整行；
+    否则直接读取整行并从中取得版本，一次查询完成。
+    """
+    if request.headers.get("if-none-match") or response_cache.contains(("artifact", artifact_id)):
+        version = (await db.execute(artifact_version_stmt(condition))).first()
+        if version is None:
+            return None
+        etag = artifact_etag(version.id, version.update_time, version.is_deleted)
+        if etag_matches(request, etag):
+            return etag_response(request, etag)
+        response = cached_response(request, ("artifact", version.id), etag)
+        if response is not None:
+            return response
+        condition = models.Artifact.id == version.id
+    db_artifact = (await db.execute(select(models.Artifact).where(condition))).scalars().first()
+    if db_artifact is None:
+        return None
+    etag = artifact_etag(db_artifact.id, db_artifact.update_time, db_artifact.is_deleted)
+    key = ("artifact", db_artifact.id)
+    return build_response(request, key, etag, serialize(schemas.Artifact.model_validate(db_artifact)), etag)
+
+# 更新图片
+@router.put("/artifacts/{artifact_id}", response_model=schemas.Artifact)
+async def update_artifact(artifact_id: UUID, artifact: schemas.ArtifactUpdate, db: AsyncSession = Depends(get_async_db)):
+    # 移除aspect_ratio字段（这是数据库生成列）
+    update_data = artifact.model_dump(exclude_unset=True)
+    update_data.pop("aspect_ratio", None)
+    # update_time由服务端维护（图片ETag由它决定），忽略请求中的值；没有要更新的字段时不改动
+    update_data.pop("update_time", None)
+    if update_data:
+        update_data["update_time"] = next_update_time()
+
+    try:
+        row = (await db.execute(
+            update_returning(models.Artifact, models.Artifact.id == artifact_id, update_data)
+        )).first()
+        if row is not None:
+            await db.commit()
+            response_cache.invalidate(("artifact", artifact_id))
+    except Exception as e:
+        await db.rollback()
+        logger.exception("更新图片时发生错误")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"更新图片失败: {str(e)}"
+        )
+
+    if row is None:
+        raise HTTPException(status_code=404, detail="图片不存在")
+    return dict(row._mapping)
+
+# 软删除图片
+@router.delete("/artifacts/{artifact_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_artifact(artifact_id: UUID, permanent: bool = False, db: AsyncSession = Depends(get_async_db)):
+    db_artifact = await db.get(models.Artifact, artifact_id)
+    if db_artifact is None:
+        raise HTTPException(status_code=404, detail="图片不存在")
+
+    if permanent:
+        # 永久删除
+        await db.delete(db_artifact)
+    else:
+        # 软删除
+        db_artifact.is_deleted = True
+        db_artifact.deleted_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
+        db_artifact.update_time = next_update_time()
+
+    await db.commit()
+    response_cache.invalidate(("artifact", artifact_id))
+    return None
+
+# 根据MD5查找图片
+@router.get("/artifacts/md5/{md5}", response_model=schemas.Artifact)
+async def get_artifact_by_md5(md5: str, request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    response = await artifact_response(request, db, models.Artifact.md5 == md5)
+    if response is None:
+        raise HTTPException(status_code=404, detail="未找到具有此MD5的图片")
+    return response
+
+# Caption Preset API
+@router.post("/presets/", response_model=schemas.CaptionPreset, status_code=status.HTTP_201_CREATED)
+async def create_preset(preset: schemas.CaptionPresetCreate, db: AsyncSession = Depends(get_async_db)):
+    # 创建新预设；如果存在但已删除，则恢复并更新；存在且未删除时不返回行
+    try:
+        row = (await db.execute(upsert_preset_stmt(preset.model_dump()))).first()
+        if row is not None:
+            await notify_change_async(db, preset.preset_key)
+            await db.commit()
+            preset_cache.invalidate(preset.preset_key)
+    except Exception as e:
+        await db.rollback()
+        logger.exception("创建预设时发生错误")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"创建预设失败: {str(e)}"
+        )
+
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"具有相同键的预设已存在: {preset.preset_key}"
+        )
+    return dict(row._mapping)
+
+@router.get("/presets/", response_model=List[schemas.CaptionPreset])
+async def read_presets(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    include_deleted: bool = False,
+    cursor: Optional[str] = None,
+    json_filters: JsonFilters = Depends(),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    stmt = presets_page_stmt(
+        include_deleted, skip, limit, cursor, json_filters.conditions(models.CaptionPreset.config)
+    )
+    with json_filter_errors():
+        presets = (await db.execute(stmt)).scalars().all()
+
+    set_next_cursor(response, presets, limit, "create_time", "preset_key")
+    return presets
+
+@router.get("/presets/{preset_key}", response_model=schemas.CaptionPreset)
+async def read_preset(preset_key: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    generation = preset_cache.generation(preset_key)
+    preset = preset_cache.get(preset_key)
+    if preset is None:
+        db_preset = await _first(db, select(models.CaptionPreset).where(
+            models.CaptionPreset.preset_key == preset_key,
+            models.CaptionPreset.is_deleted == False
+        ))
+
+        if db_preset is None:
+            raise HTTPException(status_code=404, detail="预设不存在")
+
+        preset = schemas.CaptionPreset.model_validate(db_preset)
+        preset_cache.put(preset, generation)
+
+    # ETag为响应内容哈希，预设未变化时复用已序列化的响应体
+    key = ("preset", preset_key)
+    return cached_response(request, key, preset) or build_response(request, key, preset, serialize(preset))
+
+@router.put("/presets/{preset_key}", response_model=schemas.CaptionPreset)
+async def update_preset(preset_key: str, preset: schemas.CaptionPresetUpdate, db: AsyncSession = Depends(get_async_db)):
+    try:
+        update_data = preset.model_dump(exclude_unset=True)
+        row = (await db.execute(update_returning(
+            models.CaptionPreset, models.CaptionPreset.preset_key == preset_key, update_data
+        ))).first()
+        if row is not None:
+            await notify_change_async(db, preset_key)
+            await db.commit()
+            preset_cache.invalidate(preset_key)
+    except Exception as e:
+        await db.rollback()
+        logger.exception("更新预设时发生错误")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"更新预设失败: {str(e)}"
+        )
+
+    if row is None:
+        raise HTTPException(status_code=404, detail="预设不存在")
+    return dict(row._mapping)
+
+@router.delete("/presets/{preset_key}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_preset(preset_key: str, permanent: bool = False, db: AsyncSession = Depends(get_async_db)):
+    db_preset = await db.get(models.CaptionPreset, preset_key)
+    if db_preset is None:
+        raise HTTPException(status_code=404, detail="预设不存在")
+
+    try:
+        if permanent:
+            await db.delete(db_preset)
+        else:
+            db_preset.is_deleted = True
+            db_preset.deleted_time = int(time.time() * 1000)  # 使用毫秒时间戳
+
+        await notify_change_async(db, preset_key)
+        await db.commit()
+        preset_cache.invalidate(preset_key)
+        return None
+    except Exception as e:
+        await db.rollback()
+        logger.exception("删除预设时发生错误")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"删除预设失败: {str(e)}"
+        )
+
+# Caption API
+@router.post("/captions/", response_model=schemas.Caption, status_code=status.HTTP_201_CREATED)
+async def create_caption(caption: schemas.CaptionCreate, db: AsyncSession = Depends(get_async_db)):
+
+    # 开启写入合并时与其他请求攒成一批写入（见coalescer.py），结果与下面的逐条写入一致
+    if caption_coalescer is not None:
+        return await caption_coalescer.submit(caption.model_dump())
+
+    # 如果指定了preset_key，检查预设是否存在（优先使用预设缓存）
+    generation = preset_cache.generation(caption.preset_key) if caption.preset_key else None
+    if caption.preset_key and preset_cache.get(caption.preset_key) is None:
+        db_preset = await _first(db, select(models.CaptionPreset).where(
+            models.CaptionPreset.preset_key == caption.preset_key,
+            models.CaptionPreset.is_deleted == False
+        ))
+        if db_preset is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"预设不存在: {caption.preset_key}"
+            )
+        preset_cache.put(schemas.CaptionPreset.model_validate(db_preset), generation)
+
+    try:
+        caption_dict = caption.model_dump()
+        row = None
+        # 如果已存在相同预设的描述，则更新（UPDATE ... RETURNING）
+        if caption.preset_key:
+            row = (await db.execute(update_returning(
+                models.Caption, preset_caption_condition(caption.preset_key), caption_dict
+            ))).first()
+
+        # 创建新描述
+        if row is None:
+            row = (await db.execute(insert_returning(models.Caption, caption_dict))).first()
+        await db.commit()
+        return dict(row._mapping)
+    except Exception as e:
+        await db.rollback()
+        logger.exception("创建描述时发生错误")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"创建描述失败: {str(e)}"
+        )
+
+@router.get("/captions/", response_model=List[schemas.Caption])
+async def read_captions(
+    skip: int = 0,
+    limit: int = 100,
+    include_deleted: bool = False,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    json_filters: JsonFilters = Depends(),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    # 传入cursor时使用 (upload_time, id) 键集分页；只查询fields指定的列；json_*参数按extra_data过滤
+    columns = field_columns(models.Caption, schemas.Caption, fields)
+    stmt = captions_page_stmt(
+        include_deleted, skip, limit, cursor, with_keys(columns, models.Caption.upload_time, models.Caption.id),
+        json_filters.conditions(models.Caption.extra_data),
+    )
+    with json_filter_errors():
+        rows = (await db.execute(stmt)).all()
+
+    response = rows_response(rows, columns)
+    set_next_cursor(response, rows, limit, "upload_time", "id")
+    return response
+
+# 搜索描述文本：英文走全文搜索，含中日韩字符走子串匹配，按相关度（order=recent时按上传时间）排序，通过 X-Next-Cursor 翻页
+@router.get("/captions/search", response_model=List[schemas.CaptionSearchResult])
+async def search_captions(
+    q: str,
+    preset_key: Optional[str] = None,
+    mode: str = "auto",
+    order: str = "rank",
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    stmt = caption_search_stmt(
+        q, resolve_mode(q, mode), preset_key, check_search_limit(limit), cursor, check_order(order)
+    )
+    rows = (await db.execute(stmt)).all()
+
+    response = RowsResponse([dict(row._mapping, artifact_ids=row.artifact_ids or []) for row in rows])
+    set_next_cursor(response, rows, limit, *SEARCH_ORDERS[order])
+    return response
+
+@router.get("/captions/{caption_id}", response_model=schemas.Caption)
+async def read_caption(caption_id: UUID, request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    # 使用Core读取整行，行内容未变化时复用已序列化的响应体（ETag为内容哈希）
+    row = (await db.execute(caption_row_stmt(caption_id))).first()
+
+    if row is None:
+        raise HTTPException(status_code=404, detail="描述不存在")
+
+    key = ("caption", caption_id)
+    version = tuple(row)
+    return cached_response(request, key, version) or build_response(
+        request, key, version, serialize(schemas.Caption.model_validate(dict(row._mapping)))
+    )
+
+@router.get("/captions/preset/{preset_key}", response_model=schemas.Caption)
+async def read_caption_by_preset(preset_key: str, db: AsyncSession = Depends(get_async_read_db)):
+    db_caption = await _first(db, select(models.Caption).where(
+        models.Caption.preset_key == preset_key,
+        models.Caption.is_deleted == False
+    ))
+
+    if db_caption is None:
+        raise HTTPException(status_code=404, detail="描述不存在")
+
+    return db_caption
+
+@router.put("/captions/{caption_id}", response_model=schemas.Caption)
+async def update_caption(caption_id: UUID, caption: schemas.CaptionUpdate, db: AsyncSession = Depends(get_async_db)):
+    try:
+        update_data = caption.model_dump(exclude_unset=True)
+        row = (await db.execute(
+            update_returning(models.Caption, models.Caption.id == caption_id, update_data)
+        )).first()
+        if row is not None:
+            await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.exception("更新描述时发生错误")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"更新描述失败: {str(e)}"
+        )
+
+    if row is None:
+        raise HTTPException(status_code=404, detail="描述不存在")
+    return dict(row._mapping)
+
+@router.delete("/captions/{caption_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_caption(caption_id: UUID, permanent: bool = False, db: AsyncSession = Depends(get_async_db)):
+    db_caption = await db.get(models.Caption, caption_id)
+    if db_caption is None:
+        raise HTTPException(status_code=404, detail="描述不存在")
+
+    try:
+        if permanent:
+            await db.delete(db_caption)
+        else:
+            db_caption.is_deleted = True
+            db_caption.deleted_time = int(time.time() * 1000)  # 使用毫秒时间戳
+
+        await db.commit()
+        return None
+    except Exception as e:
+        await db.rollback()
+        logger.exception("删除描述时发生错误")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"删除描述失败: {str(e)}"
+        )
+
+# ArtifactCaptionMap API
+@router.post("/artifact-caption-maps/", response_model=schemas.ArtifactCaptionMap, status_code=status.HTTP_201_CREATED)
+async def create_artifact_caption_map(map_data: schemas.ArtifactCaptionMapCreate, db: AsyncSession = Depends(get_async_db)):
+    # 创建新映射；图片或描述不存在时由外键约束报错，只在出错后再查询是哪一个不存在
+    try:
+        row = (await db.execute(insert_map_stmt(map_data.model_dump()))).first()
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        # 检查图片是否存在
+        if await db.get(models.Artifact, map_data.artifact_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"图片不存在: {map_data.artifact_id}"
+            )
+        # 检查描述是否存在
+        if await db.get(models.Caption, map_data.caption_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"描述不存在: {map_data.caption_id}"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="创建映射失败"
+        )
+    except Exception as e:
+        await db.rollback()
+        logger.exception("创建映射时发生错误")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"创建映射失败: {str(e)}"
+        )
+
+    # 映射已存在时不插入、不返回行
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"图片 {map_data.artifact_id} 与描述 {map_data.caption_id} 的映射已存在"
+        )
+    return dict(row._mapping)
+
+@router.get("/artifact-caption-maps/", response_model=List[schemas.ArtifactCaptionMap])
+async def read_artifact_caption_maps(
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    columns = field_columns(models.ArtifactCaptionMap, schemas.ArtifactCaptionMap, fields)
+    rows = (await db.execute(select(*columns).offset(skip).limit(limit))).all()
+    return rows_response(rows, columns)
+
+@router.get("/artifact-caption-maps/artifact/{artifact_id}", response_model=List[schemas.ArtifactCaptionMap])
+async def read_maps_by_artifact(artifact_id: UUID, db: AsyncSession = Depends(get_async_read_db)):
+    stmt = select(models.ArtifactCaptionMap).where(models.ArtifactCaptionMap.artifact_id == artifact_id)
+    return (await db.execute(stmt)).scalars().all()
+
+@router.get("/artifact-caption-maps/caption/{caption_id}", response_model=List[schemas.ArtifactCaptionMap])
+async def read_maps_by_caption(caption_id: UUID, db: AsyncSession = Depends(get_async_read_db)):
+    stmt = select(models.ArtifactCaptionMap).where(models.ArtifactCaptionMap.caption_id == caption_id)
+    return (await db.execute(stmt)).scalars().all()
+
+@router.delete("/artifact-caption-maps/{artifact_id}/{caption_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_artifact_caption_map(artifact_id: UUID, caption_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    db_map = await db.get(models.ArtifactCaptionMap, (artifact_id, caption_id))
+
+    if db_map is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"图片 {artifact_id} 与描述 {caption_id} 的映射不存在"
+        )
+
+    try:
+        await db.delete(db_map)
+        await db.commit()
+        return None
+    except Exception as e:
+        await db.rollback()
+        logger.exception("删除映射时发生错误")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"删除映射失败: {str(e)}"
+        )
+
+# 批量创建映射
+@router.post("/artifact-caption-maps/batch/", response_model=Dict[str, Any], status_code=status.HTTP_201_CREATED)
+async def create_artifact_caption_maps_batch(maps_data: List[schemas.ArtifactCaptionMapCreate], db: AsyncSession = Depends(get_async_db)):
+    try:
+        artifact_ids = {m.artifact_id for m in maps_data}
+        caption_ids = {m.caption_id for m in maps_data}
+        existing_artifacts = set((await db.execute(bulk.existing_ids_stmt(models.Artifact.id, artifact_ids))).scalars()) if artifact_ids else set()
+        existing_captions = set((await db.execute(bulk.existing_ids_stmt(models.Caption.id, caption_ids))).scalars()) if caption_ids else set()
+
+        rows, errors = bulk.prepare_map_rows(maps_data, existing_artifacts, existing_captions)
+
+        created_count = 0
+        for chunk in chunked(rows, bulk.MAP_BATCH_CHUNK):
+            created_count += len((await db.execute(bulk.insert_maps_stmt(chunk))).all())
+
+        await db.commit()
+        return {
+            "success": True,
+            "created_count": created_count,
+            "skipped_count": len(maps_data) - len(errors) - created_count,
+            "errors": errors
+        }
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量创建映射失败: {str(e)}"
+        )
+
+# 批量查询MD5是否已存在（上传前去重）
+@router.post("/artifacts/md5/lookup", response_model=schemas.Md5LookupResult)
+async def lookup_artifacts_by_md5(lookup: schemas.Md5LookupRequest, db: AsyncSession = Depends(get_async_read_db)):
+    md5s = list(dict.fromkeys(lookup.md5s))
+    found = {}
+    if md5s:
+        for md5, artifact_id, is_deleted in await db.execute(md5_lookup_stmt(md5s)):
+            found[md5] = schemas.Md5LookupItem(
+                md5=md5, id=artifact_id, is_deleted=is_deleted if lookup.with_deleted_status else None
+            )
+    return schemas.Md5LookupResult(
+        found=[found[md5] for md5 in md5s if md5 in found],
+        missing=[md5 for md5 in md5s if md5 not in found],
+    )
+
+async def _lookup_by_ids(db: AsyncSession, model, lookup: schemas.IdsLookupRequest):
+    """按请求顺序返回找到的行（重复id只返回一次）和缺失的id"""
+    ids = list(dict.fromkeys(lookup.ids))
+    found = {}
+    if ids:
+        rows = (await db.execute(by_ids_stmt(model, ids, lookup.include_deleted))).scalars()
+        found = {row.id: row for row in rows}
+    return {
+        "items": [found[i] for i in ids if i in found],
+        "missing": [i for i in ids if i not in found],
+    }
+
+# 按id列表批量获取图片
+@router.post("/artifacts/by-ids", response_model=schemas.ArtifactsByIdsResult)
+async def read_artifacts_by_ids(lookup: schemas.IdsLookupRequest, db: AsyncSession = Depends(get_async_read_db)):
+    return await _lookup_by_ids(db, models.Artifact, lookup)
+
+# 按id列表批量获取描述
+@router.post("/captions/by-ids", response_model=schemas.CaptionsByIdsResult)
+async def read_captions_by_ids(lookup: schemas.IdsLookupRequest, db: AsyncSession = Depends(get_async_read_db)):
+    return await _lookup_by_ids(db, models.Caption, lookup)
+
+async def _delete_by_ids(db: AsyncSession, model, request: schemas.IdsDeleteRequest, deleted_time):
+    """一条 id = ANY(...) 的UPDATE或DELETE，返回实际删除的id"""
+    ids = list(dict.fromkeys(request.ids))
+    if not ids:
+        return [], set()
+    if request.permanent:
+        stmt = hard_delete_by_ids_stmt(model, ids)
+    else:
+        stmt = soft_delete_by_ids_stmt(model, ids, deleted_time)
+    try:
+        deleted = set((await db.execute(stmt)).scalars())
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量删除失败: {str(e)}"
+        )
+    return ids, deleted
+
+# 按id列表批量删除图片
+@router.post("/artifacts/delete-batch", response_model=schemas.IdsDeleteResult)
+async def delete_artifacts_batch(request: schemas.IdsDeleteRequest, db: AsyncSession = Depends(get_async_db)):
+    ids, deleted = await _delete_by_ids(
+        db, models.Artifact, request, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
+    )
+    for artifact_id in deleted:
+        response_cache.invalidate(("artifact", artifact_id))
+    return {"deleted_count": len(deleted), "skipped": [i for i in ids if i not in deleted]}
+
+# 按id列表批量删除描述
+@router.post("/captions/delete-batch", response_model=schemas.IdsDeleteResult)
+async def delete_captions_batch(request: schemas.IdsDeleteRequest, db: AsyncSession = Depends(get_async_db)):
+    ids, deleted = await _delete_by_ids(db, models.Caption, request, int(time.time() * 1000))
+    return {"deleted_count": len(deleted), "skipped": [i for i in ids if i not in deleted]}
+
+# 变更日志：since之后的图片、描述、映射变更（按写入事务顺序），返回新水位线；since=now 只返回当前水位线
+@router.get("/changes", response_model=schemas.ChangeFeed)
+async def read_change_feed(since: Optional[str] = None, limit: int = 1000, db: AsyncSession = Depends(get_async_read_db)):
+    # 快照xmin与变更查询需要在同一个会话中依次执行，复用同步版本的 read_changes
+    rows, watermark, has_more = await db.run_sync(read_changes, parse_watermark(since), check_limit(limit))
+    return feed_response(rows, watermark, has_more)
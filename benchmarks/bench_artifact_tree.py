@@ -0,0 +1,96 @@
+"""GET /artifacts/{id}/tree 与 /parents 的递归CTE与逐节点查询的对比（不经过HTTP）
+
+用法：
+    python -m benchmarks.bench_artifact_tree --artifacts 200000 --roots 50
+
+seed 中约30%的图片带有 children_id（指向较早写入的图片）。
+1. 向下遍历：改写前客户端对每个节点调用一次 GET /artifacts/{id}，逐层读取 children_id；
+   与一条递归CTE查询对比（同样的层数，结果节点数一致）
+2. 向上查找父图片：改写前只能扫描整张表找 children_id 包含该图片的行；
+   与使用迁移0008 GIN索引的递归CTE对比，同一事务中删除索引后再测一次作为对照（随后回滚）
+"""
+import argparse
+import time
+
+from sqlalchemy import select, text
+
+import models
+import schemas
+from fieldsets import field_columns
+from lineage import artifact_parents_stmt, artifact_tree_stmt
+from benchmarks import seed
+from benchmarks.common import DEFAULT_DATABASE_URL, make_engine, make_session_factory, prepare_schema, summarize
+
+
+def walk_per_node(db, root, depth: int) -> int:
+    """改写前：每个节点一次按主键查询整行，再按 children_id 读取下一层；返回查询次数"""
+    seen, level, queries = {root}, [root], 0
+    for current in range(depth + 1):
+        next_level = []
+        for artifact_id in level:
+            artifact = db.execute(select(models.Artifact).where(models.Artifact.id == artifact_id)).scalars().first()
+            queries += 1
+            if artifact is None or current == depth:
+                continue
+            for child in artifact.children_id or []:
+                if child not in seen:
+                    seen.add(child)
+                    next_level.append(child)
+        level = next_level
+        db.expunge_all()
+    return queries
+
+
+def timed(fn, items) -> dict:
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--artifacts", type=int, default=200000)
+    parser.add_argument("--roots", type=int, default=50)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--skip-seed", action="store_true")
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url)
+    prepare_schema(engine)
+    session_factory = make_session_factory(engine)
+    if not args.skip_seed:
+        seed.seed(session_factory, args.artifacts)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE artifacts"))
+
+    columns = field_columns(models.Artifact, schemas.Artifact, None)
+    with session_factory() as db:
+        roots = db.execute(text(
+            "SELECT id FROM artifacts WHERE cardinality(children_id) > 0 AND NOT is_deleted "
+            "ORDER BY upload_time DESC LIMIT :n"
+        ), {"n": args.roots}).scalars().all()
+        leaves = db.execute(text(
+            "SELECT DISTINCT child FROM artifacts, unnest(children_id) AS child LIMIT :n"
+        ), {"n": args.roots}).scalars().all()
+
+        nodes = sum(len(db.execute(artifact_tree_stmt(r, args.depth, False, columns, 10000)).all()) for r in roots)
+        cte = timed(lambda r: db.execute(artifact_tree_stmt(r, args.depth, False, columns, 10000)).all(), roots)
+        per_node = timed(lambda r: walk_per_node(db, r, args.depth), roots)
+        print(f"tree depth={args.depth} ({nodes / len(roots):.1f} nodes/root): "
+              f"recursive CTE p50={cte['p50_ms']}ms  per-node p50={per_node['p50_ms']}ms")
+
+        parents = sum(len(db.execute(artifact_parents_stmt(l, args.depth, False, columns, 10000)).all()) for l in leaves)
+        indexed = timed(lambda l: db.execute(artifact_parents_stmt(l, args.depth, False, columns, 10000)).all(), leaves)
+        db.execute(text("DROP INDEX ix_artifacts_children_id"))
+        plain = timed(lambda l: db.execute(artifact_parents_stmt(l, 1, False, columns, 10000)).all(), leaves[:5])
+        db.rollback()
+        print(f"parents depth={args.depth} ({parents / len(leaves):.1f} nodes/leaf): GIN p50={indexed['p50_ms']}ms  "
+              f"without index (depth=1) p50={plain['p50_ms']}ms")
+
+
+if __name__ == "__main__":
+    main_cli()
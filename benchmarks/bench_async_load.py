@@ -0,0 +1,88 @@
+"""对比同步模式与 DB_ASYNC=1 异步模式在并发读负载下的吞吐和p99延迟
+
+用法：
+    python -m benchmarks.bench_async_load --concurrency 64 --duration 20
+
+服务端以子进程方式启动（uvicorn单进程），连接 --database-url 指定的本地PostgreSQL。
+本地数据库延迟极低，如需模拟跨可用区RDS，可用 tc netem 给回环网卡加延迟。
+"""
+import argparse
+import json
+import random
+import uuid
+
+from sqlalchemy import text
+
+import models
+from benchmarks.common import (
+    DEFAULT_DATABASE_URL, make_engine, make_session_factory, prepare_schema, run_load, start_server, stop_server,
+)
+
+
+def seed(session_factory, count: int):
+    artifact_rows = [
+        dict(id=uuid.uuid4(), width=1024, height=768, size=200000, pixels=1024 * 768, format=random.choice(["png", "jpg", "webp"]),
+             md5=uuid.uuid4().hex, upload_time=i, update_time=i, created_time=i, original_path=f"oss://bench/{i}.png",
+             has_alpha=False, is_deleted=False)
+        for i in range(count)
+    ]
+    preset_rows = [
+        dict(preset_key=f"bench-{i}", config={"model": "gemini", "prompt": "describe"}, create_time=i, is_deleted=False)
+        for i in range(20)
+    ]
+    caption_rows = [
+        dict(id=uuid.uuid4(), type="bench", preset_key=None, upload_time=i, text=f"caption {i}", is_deleted=False)
+        for i in range(count)
+    ]
+    with session_factory() as db:
+        db.execute(text("TRUNCATE artifact_caption_map, captions, caption_preset, artifacts CASCADE"))
+        db.execute(models.Artifact.__table__.insert(), artifact_rows)
+        db.execute(models.CaptionPreset.__table__.insert(), preset_rows)
+        db.execute(models.Caption.__table__.insert(), caption_rows)
+        db.commit()
+    return artifact_rows, preset_rows, caption_rows
+
+
+def build_requests(artifacts, presets, captions):
+    requests = []
+    for i in range(200):
+        requests.append(("GET", "/artifacts/?limit=20", None))
+        requests.append(("GET", f"/artifacts/{artifacts[i % len(artifacts)]['id']}", None))
+        requests.append(("GET", f"/artifacts/md5/{artifacts[(i * 3) % len(artifacts)]['md5']}", None))
+        requests.append(("GET", f"/presets/{presets[i % len(presets)]['preset_key']}", None))
+        requests.append(("GET", f"/captions/{captions[i % len(captions)]['id']}", None))
+    random.shuffle(requests)
+    return requests
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url)
+    prepare_schema(engine)
+    random.seed(42)
+    requests = build_requests(*seed(make_session_factory(engine), args.rows))
+
+    results = {}
+    for mode in ("sync", "async"):
+        env = {"DATABASE_URL": args.database_url, "DB_ASYNC": "1" if mode == "async" else "0"}
+        proc = start_server(args.port, env)
+        try:
+            run_load(args.port, requests, args.concurrency, min(3.0, args.duration))  # 预热
+            results[mode] = run_load(args.port, requests, args.concurrency, args.duration)
+        finally:
+            stop_server(proc)
+
+    print(json.dumps(results, indent=2))
+    for mode, r in results.items():
+        print(f"{mode:>5}: {r['rps']:>8} req/s  p50={r['p50_ms']}ms  p99={r['p99_ms']}ms  errors={r['errors']}")
+
+
+if __name__ == "__main__":
+    main_cli()
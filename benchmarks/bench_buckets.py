@@ -0,0 +1,122 @@
+"""GET /artifacts/buckets 与客户端分桶的对比，以及宽高比过滤的索引效果（不经过HTTP）
+
+用法：
+    python -m benchmarks.bench_buckets --artifacts 200000
+
+1. 分桶计数：改写前训练任务用 GET /artifacts/?fields=width,height 按游标分页取回全部图片再本地分桶，
+   与一条 GROUP BY 查询（迁移0007的 (aspect_ratio, pixels) 索引上的仅索引扫描）对比
+2. 分桶id：同样分页取回 id、width、height 后本地分组，与 stream_bucket_ids 的NDJSON流对比
+3. 宽高比过滤：另外写入 --panoramas 张 4096x1024 的全景图，GET /artifacts/?min_aspect=3 的首页耗时，
+   在同一事务中删除索引后再测一次作为对照（随后回滚）
+"""
+import argparse
+import time
+import uuid
+from collections import Counter, defaultdict
+
+from sqlalchemy import text
+
+import models
+import schemas
+from buckets import BucketSpec, bucket_counts_stmt, bucket_ids_stmt, stream_bucket_ids
+from fieldsets import field_columns, with_keys
+from pagination import encode_cursor
+from queries import ArtifactFilters, artifacts_page_stmt
+from benchmarks import seed
+from benchmarks.common import DEFAULT_DATABASE_URL, make_engine, make_session_factory, prepare_schema, summarize
+
+RESOLUTIONS = "832x1216,1024x1536,1024x1024,1216x832,1536x1024,1920x1080"
+PIXEL_EDGES = "589824,1048576,2097152"
+PAGE_SIZE = 1000
+
+
+def add_panoramas(session_factory, count: int) -> None:
+    now = int(time.time() * 1000)
+    rows = [seed.artifact_row(i, now, [uuid.uuid4()], []) for i in range(count)]
+    for row in rows:
+        row.update(width=4096, height=1024, pixels=4096 * 1024, is_deleted=False, deleted_time=None)
+    with session_factory() as db:
+        db.execute(models.Artifact.__table__.insert(), rows)
+        db.commit()
+
+
+def client_side(db, spec: BucketSpec, with_ids: bool) -> dict:
+    """改写前：按 (upload_time, id) 游标分页取回全部图片，本地按与服务端相同的规则分桶"""
+    names = "id,width,height,pixels" if with_ids else "width,height,pixels"
+    columns = field_columns(models.Artifact, schemas.Artifact, names)
+    columns = with_keys(columns, models.Artifact.upload_time, models.Artifact.id)
+    buckets = defaultdict(list) if with_ids else Counter()
+    cursor = None
+    while True:
+        rows = db.execute(artifacts_page_stmt(ArtifactFilters(), 0, PAGE_SIZE, cursor, columns)).all()
+        for row in rows:
+            key = (bucket_of(spec.aspect_edges, row.width / row.height), bucket_of(spec.pixel_edges, row.pixels))
+            if with_ids:
+                buckets[key].append(row.id)
+            else:
+                buckets[key] += 1
+        if len(rows) < PAGE_SIZE:
+            return buckets
+        cursor = encode_cursor(rows[-1].upload_time, rows[-1].id)
+
+
+def bucket_of(edges, value) -> int:
+    return sum(1 for edge in edges if value >= edge)
+
+
+def timed_runs(fn, repeat: int):
+    latencies, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies), result
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--artifacts", type=int, default=200000)
+    parser.add_argument("--panoramas", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-seed", action="store_true")
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url)
+    prepare_schema(engine)
+    session_factory = make_session_factory(engine)
+    if not args.skip_seed:
+        seed.seed(session_factory, args.artifacts)
+        add_panoramas(session_factory, args.panoramas)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # 仅索引扫描依赖可见性映射
+        conn.execute(text("VACUUM ANALYZE artifacts"))
+
+    spec = BucketSpec(resolutions=RESOLUTIONS, pixel_edges=PIXEL_EDGES)
+    with session_factory() as db:
+        server, rows = timed_runs(lambda: db.execute(bucket_counts_stmt(ArtifactFilters(), spec)).all(), args.repeat)
+        client, counts = timed_runs(lambda: client_side(db, spec, False), args.repeat)
+        assert {(r.aspect_bucket, r.pixel_bucket): r.count for r in rows} == dict(counts), "分桶结果不一致"
+        print(f"counts ({sum(counts.values())} artifacts, {len(rows)} buckets): "
+              f"GROUP BY p50={server['p50_ms']}ms  client-side p50={client['p50_ms']}ms")
+
+        client, _ = timed_runs(lambda: client_side(db, spec, True), args.repeat)
+    stream, _ = timed_runs(
+        lambda: sum(len(chunk) for chunk in stream_bucket_ids(bucket_ids_stmt(ArtifactFilters(), spec), spec,
+                                                               session_factory=session_factory)),
+        args.repeat,
+    )
+    print(f"ids: stream_bucket_ids p50={stream['p50_ms']}ms  client-side p50={client['p50_ms']}ms")
+
+    stmt = artifacts_page_stmt(ArtifactFilters(min_aspect=3), 0, 100, None)
+    with session_factory() as db:
+        indexed, rows = timed_runs(lambda: db.execute(stmt).all(), args.repeat * 4)
+        db.execute(text("DROP INDEX ix_artifacts_live_aspect_ratio_pixels"))
+        plain, _ = timed_runs(lambda: db.execute(stmt).all(), args.repeat * 4)
+        db.rollback()
+    print(f"min_aspect=3 first page ({len(rows)} rows): indexed p50={indexed['p50_ms']}ms  "
+          f"without index p50={plain['p50_ms']}ms")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,88 @@
+"""对比 POST /captions/ 逐条写入与 CAPTION_COALESCE_ENABLED=1 合并写入在200个并发客户端下的吞吐
+
+用法：
+    python -m benchmarks.bench_caption_coalesce --concurrency 200 --duration 15
+
+同步（DB_ASYNC=0）和异步（DB_ASYNC=1）模式各跑一遍，服务端以uvicorn单进程子进程启动。
+请求中80%不带预设（各插入一行），20%带20个预设之一（覆盖该预设的描述），另有少量引用不存在的预设（404）。
+合并写入时SQL在后台批次中执行，不计入 X-Query-Count，因此不比较每请求SQL条数。
+"""
+import argparse
+import json
+import random
+
+from sqlalchemy import text
+
+import models
+from benchmarks.common import (
+    DEFAULT_DATABASE_URL, make_engine, make_session_factory, prepare_schema, run_load, start_server, stop_server,
+)
+
+PRESETS = [f"bench-coalesce-{i}" for i in range(20)]
+
+
+def reset(session_factory):
+    with session_factory() as db:
+        db.execute(text("TRUNCATE artifact_caption_map, captions, caption_preset CASCADE"))
+        db.execute(models.CaptionPreset.__table__.insert(), [
+            dict(preset_key=key, config={"model": "gemini", "prompt": "describe"}, create_time=i, is_deleted=False)
+            for i, key in enumerate(PRESETS)
+        ])
+        db.commit()
+
+
+def build_requests(count: int):
+    requests = []
+    for i in range(count):
+        body = {"type": "bench", "upload_time": i, "text": f"caption {i} " + "word " * 40,
+                "extra_data": {"model": "gemini", "tokens": i % 500}}
+        roll = random.random()
+        if roll < 0.01:
+            body["preset_key"] = "bench-coalesce-missing"
+        elif roll < 0.2:
+            body["preset_key"] = random.choice(PRESETS)
+        requests.append(("POST", "/captions/", body))
+    return requests
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--wait-ms", default="5")
+    parser.add_argument("--max-items", default="200")
+    parser.add_argument("--port", type=int, default=8768)
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url)
+    prepare_schema(engine)
+    session_factory = make_session_factory(engine)
+    random.seed(42)
+    requests = build_requests(200000)
+
+    results = {}
+    for mode in ("sync", "async"):
+        for coalesce in ("0", "1"):
+            name = f"{mode}{' coalesce' if coalesce == '1' else ''}"
+            reset(session_factory)
+            env = {
+                "DATABASE_URL": args.database_url, "DB_ASYNC": "1" if mode == "async" else "0",
+                "CAPTION_COALESCE_ENABLED": coalesce, "CAPTION_COALESCE_WAIT_MS": args.wait_ms,
+                "CAPTION_COALESCE_MAX_ITEMS": args.max_items,
+            }
+            proc = start_server(args.port, env)
+            try:
+                run_load(args.port, requests, args.concurrency, min(3.0, args.duration))  # 预热
+                results[name] = run_load(args.port, requests, args.concurrency, args.duration)
+            finally:
+                stop_server(proc)
+
+    print(json.dumps(results, indent=2))
+    for name, r in results.items():
+        print(f"{name:>14}: {r['rps']:>8} req/s  p50={r['p50_ms']}ms  p99={r['p99_ms']}ms  "
+              f"errors={r['errors']}  statuses={r['statuses']}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,121 @@
+"""GET /captions/search 使用的查询在大表上的延迟（不经过HTTP）
+
+用法：
+    python -m benchmarks.bench_caption_search --rows 1000000
+
+在 captions 表中生成 --rows 条描述（会清空描述和映射），词频服从长尾分布：
+少数常见词出现在大部分描述中，长尾词只出现在极少数描述中；约20%为中文描述。
+对不同命中规模的查询报告首页和第二页（游标）的 p50 延迟，并与改写前只能做的
+全表扫描（ILIKE 取出全部命中行）对比。按相关度排序的耗时主要取决于命中行数（所有命中行都要计算
+相关度后取前N），选择性高的查询在毫秒级返回；宽泛的查询可用 order=recent。
+"""
+import argparse
+import time
+from typing import Dict, List, Tuple
+
+from sqlalchemy import func, select, text
+
+import models
+from pagination import encode_cursor
+from search import SEARCH_ORDERS, caption_search_stmt
+from benchmarks.common import DEFAULT_DATABASE_URL, make_engine, make_session_factory, prepare_schema, summarize
+
+COMMON_WORDS = [
+    "girl", "woman", "man", "dress", "red", "blue", "hair", "smile", "city", "night", "street", "tree", "flower",
+    "window", "light", "shadow", "portrait", "outdoor", "indoor", "sky", "cloud", "water", "river", "mountain",
+]
+CHINESE_WORDS = [
+    "红色", "连衣裙", "女人", "男人", "城市", "夜晚", "天空", "白云", "河流", "山脉", "微笑", "长发",
+    "窗户", "灯光", "阴影", "肖像", "街道", "花朵", "树木", "雨伞", "自行车", "咖啡馆", "海边", "日落",
+]
+
+# power(random(), 4) 使靠前的词出现得多得多，长尾词很少出现
+SEED_SQL = """
+INSERT INTO captions (id, type, upload_time, text, is_deleted)
+SELECT gen_random_uuid(), 'natural', g,
+       CASE WHEN g % 5 = 0
+            THEN (SELECT string_agg((:zh ::text[])[1 + floor(power(random(), 2) * :zh_size)::int], '')
+                  FROM generate_series(1, 6 + g % 4) WHERE g > 0)
+            ELSE (SELECT string_agg((:en ::text[])[1 + floor(power(random(), 4) * :en_size)::int], ' ')
+                  FROM generate_series(1, 12 + g % 6) WHERE g > 0)
+       END,
+       g % 50 = 0
+FROM generate_series(:start, :stop) g
+"""
+
+
+def seed(session_factory, rows: int, vocabulary: int) -> None:
+    english = COMMON_WORDS + [f"term{i:05d}" for i in range(vocabulary)]
+    params = {"en": english, "en_size": len(english), "zh": CHINESE_WORDS, "zh_size": len(CHINESE_WORDS)}
+    with session_factory() as db:
+        db.execute(text("TRUNCATE artifact_caption_map, captions CASCADE"))
+        for start in range(1, rows + 1, 200000):
+            db.execute(text(SEED_SQL), dict(params, start=start, stop=min(start + 199999, rows)))
+            db.commit()
+        db.execute(text("ANALYZE captions"))
+        db.commit()
+
+
+def timed_runs(db, stmt, repeat: int) -> Tuple[List[float], list]:
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = db.execute(stmt).all()
+        latencies.append(time.perf_counter() - start)
+    return latencies, rows
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--skip-seed", action="store_true")
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url)
+    prepare_schema(engine)
+    session_factory = make_session_factory(engine)
+    if not args.skip_seed:
+        start = time.perf_counter()
+        seed(session_factory, args.rows, args.vocabulary)
+        print(f"写入 {args.rows} 条描述，耗时 {time.perf_counter() - start:.1f}s")
+
+    queries = {
+        "rare term": ("term19000", "fts", "rank"),
+        "mid term": ("term00300", "fts", "rank"),
+        "two terms": ("dress term00300", "fts", "rank"),
+        "phrase": ('"red dress"', "fts", "rank"),
+        "common term": ("window", "fts", "rank"),
+        "common recent": ("window", "fts", "recent"),
+        "rare recent": ("term19000", "fts", "recent"),
+        "cjk substring": ("自行车咖啡馆", "substring", "rank"),
+    }
+    results: Dict[str, Dict[str, object]] = {}
+    with session_factory() as db:
+        for name, (q, mode, order) in queries.items():
+            first_latencies, rows = timed_runs(db, caption_search_stmt(q, mode, None, 20, None, order), args.repeat)
+            entry = {"q": q, "first_page": summarize(first_latencies)}
+            if len(rows) == 20:
+                last = rows[-1]
+                cursor = encode_cursor(*(getattr(last, key) for key in SEARCH_ORDERS[order]))
+                entry["second_page"] = summarize(timed_runs(db, caption_search_stmt(q, mode, None, 20, cursor, order),
+                                                            args.repeat)[0])
+            entry["matched"] = db.execute(select(func.count()).select_from(
+                caption_search_stmt(q, mode, None, 10 ** 9, None).subquery())).scalar()
+            # 改写前：只能扫描全部描述取出命中行，再在客户端排序
+            like = select(models.Caption.id).where(
+                models.Caption.text.ilike(f"%{q.strip(chr(34))}%"), models.Caption.is_deleted == False
+            )
+            entry["full_scan"] = summarize(timed_runs(db, like, 3)[0])
+            results[name] = entry
+
+    for name, r in results.items():
+        second = r.get("second_page", {}).get("p50_ms", "-")
+        print(f"{name:>14} ({r['q']}): matched={r['matched']:>8}  first p50={r['first_page']['p50_ms']}ms  "
+              f"second p50={second}ms  full scan p50={r['full_scan']['p50_ms']}ms")
+
+
+if __name__ == "__main__":
+    main_cli()
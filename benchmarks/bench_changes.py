@@ -0,0 +1,177 @@
+"""变更日志（迁移0006）的写入开销、增量同步耗时和SSE推送延迟
+
+用法：
+    python -m benchmarks.bench_changes --rows 400000 --changes 1000
+
+1. 写入开销：触发器开启/关闭时，逐条 INSERT（每条一个事务）与 500 行一条的批量 INSERT 的耗时
+2. 同步耗时：表中有 --rows 条描述、其中 --changes 条发生变化时，下游用 GET /changes 的查询
+   拿到全部变更，与改写前重扫整张表（取 id 和 upload_time）对比
+3. 推送延迟：以子进程启动服务，订阅 GET /changes/stream，从写入提交到收到事件的时间；
+   CHANGES_LISTEN=1 时由 NOTIFY 唤醒，=0 时按 CHANGES_POLL_SECONDS 轮询
+"""
+import argparse
+import http.client
+import importlib
+import json
+import threading
+import time
+import uuid
+from typing import List
+
+from sqlalchemy import select, text
+
+import models
+from changes import read_changes
+from benchmarks.common import (
+    DEFAULT_DATABASE_URL, make_engine, make_session_factory, prepare_schema, start_server, stop_server, summarize,
+)
+
+CHANGE_TRIGGER_TABLES = ("artifacts", "captions", "artifact_caption_map")
+
+
+def install_change_log(engine) -> None:
+    migration = importlib.import_module("migrations.0006_change_log")
+    with engine.begin() as conn:
+        for sql in migration.UPGRADE:
+            conn.execute(text(sql))
+
+
+def set_triggers(engine, enabled: bool) -> None:
+    with engine.begin() as conn:
+        for table in CHANGE_TRIGGER_TABLES:
+            conn.execute(text(f"ALTER TABLE {table} {'ENABLE' if enabled else 'DISABLE'} TRIGGER USER"))
+
+
+def caption_rows(count: int) -> List[dict]:
+    return [dict(id=uuid.uuid4(), type="bench", upload_time=i, text=f"change {i}", extra_data={"i": i},
+                 is_deleted=False) for i in range(count)]
+
+
+def seed(session_factory, rows: int) -> None:
+    with session_factory() as db:
+        db.execute(text("TRUNCATE artifact_caption_map, captions, change_log CASCADE"))
+        for start in range(0, rows, 10000):
+            db.execute(models.Caption.__table__.insert(), caption_rows(min(10000, rows - start)))
+        db.commit()
+        db.execute(text("ANALYZE captions"))
+        db.commit()
+
+
+def write_overhead(engine, session_factory, single: int, batches: int) -> dict:
+    results = {}
+    for enabled in (False, True):
+        set_triggers(engine, enabled)
+        name = "triggers on" if enabled else "triggers off"
+        latencies = []
+        with session_factory() as db:
+            for row in caption_rows(single):
+                start = time.perf_counter()
+                db.execute(models.Caption.__table__.insert(), [row])
+                db.commit()
+                latencies.append(time.perf_counter() - start)
+        results[f"{name} single"] = summarize(latencies)
+        latencies = []
+        with session_factory() as db:
+            for _ in range(batches):
+                rows = caption_rows(500)
+                start = time.perf_counter()
+                db.execute(models.Caption.__table__.insert().values(rows))
+                db.commit()
+                latencies.append(time.perf_counter() - start)
+        results[f"{name} batch500"] = summarize(latencies)
+    set_triggers(engine, True)
+    return results
+
+
+def sync_cost(session_factory, changes: int, repeat: int) -> dict:
+    with session_factory() as db:
+        _, watermark, _ = read_changes(db, None, 1)
+        ids = db.execute(select(models.Caption.id).limit(changes)).scalars().all()
+        db.execute(models.Caption.__table__.update().where(models.Caption.id.in_(ids)).values(type="changed"))
+        db.commit()
+
+        feed, rescan = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            after, count, has_more = watermark, 0, True
+            while has_more:
+                rows, after, has_more = read_changes(db, after, 1000)
+                count += len(rows)
+            feed.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            scanned = len(db.execute(select(models.Caption.id, models.Caption.upload_time)).all())
+            rescan.append(time.perf_counter() - start)
+    return {"changed": count, "table_rows": scanned, "feed": summarize(feed), "rescan": summarize(rescan)}
+
+
+def push_latency(session_factory, port: int, env: dict, events: int) -> dict:
+    proc = start_server(port, env)
+    received = {}
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        conn.request("GET", "/changes/stream?since=now")
+        resp = conn.getresponse()
+
+        def reader():
+            try:
+                for line in resp:
+                    if line.startswith(b"data: "):
+                        item = json.loads(line[6:])
+                        received.setdefault(item["caption_id"], time.perf_counter())
+            except (OSError, AttributeError, http.client.HTTPException):
+                pass  # 测试结束时关闭连接
+
+        threading.Thread(target=reader, daemon=True).start()
+        time.sleep(1)
+        committed = {}
+        with session_factory() as db:
+            for row in caption_rows(events):
+                db.execute(models.Caption.__table__.insert(), [row])
+                db.commit()
+                committed[str(row["id"])] = time.perf_counter()
+                time.sleep(0.05)
+        deadline = time.time() + 10
+        while len(received) < events and time.time() < deadline:
+            time.sleep(0.05)
+        conn.close()
+    finally:
+        stop_server(proc)
+    latencies = [received[key] - at for key, at in committed.items() if key in received]
+    return dict(summarize(latencies), received=len(latencies))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--rows", type=int, default=400000)
+    parser.add_argument("--changes", type=int, default=1000)
+    parser.add_argument("--single", type=int, default=1000)
+    parser.add_argument("--batches", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8769)
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url)
+    prepare_schema(engine)
+    install_change_log(engine)
+    session_factory = make_session_factory(engine)
+
+    seed(session_factory, args.rows)
+    for name, r in write_overhead(engine, session_factory, args.single, args.batches).items():
+        print(f"{name:>22}: p50={r['p50_ms']}ms  p99={r['p99_ms']}ms  mean={r['mean_ms']}ms")
+
+    seed(session_factory, args.rows)
+    r = sync_cost(session_factory, args.changes, args.repeat)
+    print(f"sync {r['changed']} changes of {r['table_rows']} rows: GET /changes p50={r['feed']['p50_ms']}ms  "
+          f"full rescan p50={r['rescan']['p50_ms']}ms")
+
+    for listen in ("1", "0"):
+        env = {"DATABASE_URL": args.database_url, "CHANGES_LISTEN": listen, "CHANGES_POLL_SECONDS": "1"}
+        r = push_latency(session_factory, args.port, env, args.events)
+        print(f"stream CHANGES_LISTEN={listen}: received={r['received']}/{args.events}  "
+              f"p50={r['p50_ms']}ms  p99={r['p99_ms']}ms")
+
+
+if __name__ == "__main__":
+    main_cli()
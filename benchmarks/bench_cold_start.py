@@ -0,0 +1,108 @@
+"""冷启动：从启动进程到第一个成功的 GET /artifacts/ 响应的耗时
+
+用法：
+    python -m benchmarks.bench_cold_start --runs 5
+
+对比两种启动方式（都连接 --database-url 指定的本地PostgreSQL，需先运行 benchmarks.seed）：
+- uvicorn：改写前的 `uvicorn main:app`，不预热（WARMUP_ENABLED=0）
+- serve：`python serve.py`，lifespan中预先建立连接并执行热点查询
+
+每次启动报告：端口可用耗时、第一个 /artifacts/ 请求的延迟、启动到第一个成功响应的总耗时，
+以及随后各热点接口第一次请求的最大延迟。跨可用区访问RDS时建连更慢，预热的收益更明显。
+"""
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+from sqlalchemy import text
+
+from benchmarks.common import DEFAULT_DATABASE_URL, make_engine, stop_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _get(port: int, path: str) -> int:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        conn.request("GET", path)
+        resp = conn.getresponse()
+        resp.read()
+        return resp.status
+    finally:
+        conn.close()
+
+
+def _timed_get(port: int, path: str) -> float:
+    start = time.perf_counter()
+    status = _get(port, path)
+    if status != 200:
+        raise RuntimeError(f"{path} 返回 {status}")
+    return (time.perf_counter() - start) * 1000
+
+
+def cold_start(command: List[str], env: Dict[str, str], port: int, hot_paths: List[str]) -> Dict[str, float]:
+    started = time.perf_counter()
+    proc = subprocess.Popen(command, cwd=ROOT, env=dict(os.environ, **env),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        # 端口可用（lifespan启动完成）之前连接会被拒绝
+        deadline = started + 60
+        while True:
+            try:
+                _get(port, "/healthz")
+                break
+            except OSError:
+                if proc.poll() is not None or time.perf_counter() > deadline:
+                    raise RuntimeError("服务启动失败")
+                time.sleep(0.005)
+        listening = time.perf_counter()
+        first_request_ms = _timed_get(port, "/artifacts/")
+        first_ok = time.perf_counter()
+        hot_ms = [_timed_get(port, path) for path in hot_paths]
+        return {
+            "listen_ms": round((listening - started) * 1000, 1),
+            "first_artifacts_ms": round(first_request_ms, 1),
+            "time_to_first_artifacts_ms": round((first_ok - started) * 1000, 1),
+            "first_hot_max_ms": round(max(hot_ms), 1) if hot_ms else 0.0,
+        }
+    finally:
+        stop_server(proc)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    with make_engine(args.database_url).connect() as conn:
+        artifact = conn.execute(text("SELECT id, md5 FROM artifacts WHERE is_deleted = false LIMIT 1")).first()
+        caption_id = conn.execute(text("SELECT id FROM captions WHERE is_deleted = false LIMIT 1")).scalar()
+    if artifact is None or caption_id is None:
+        raise SystemExit("数据不足，请先运行 python -m benchmarks.seed")
+    hot_paths = [
+        f"/artifacts/{artifact.id}", f"/artifacts/md5/{artifact.md5}", f"/captions/{caption_id}",
+        "/captions/?limit=100", "/presets/", f"/artifact-caption-maps/artifact/{artifact.id}",
+    ]
+
+    env = {"DATABASE_URL": args.database_url, "SERVER_PORT": str(args.port), "WEB_CONCURRENCY": "1"}
+    variants = {
+        "uvicorn": ([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port),
+                     "--log-level", "warning"], dict(env, WARMUP_ENABLED="0")),
+        "serve": ([sys.executable, "serve.py"], dict(env, SERVER_HOST="127.0.0.1", WARMUP_ENABLED="1")),
+    }
+    for name, (command, variant_env) in variants.items():
+        results = [cold_start(command, variant_env, args.port, hot_paths) for _ in range(args.runs)]
+        print(name)
+        for key in results[0]:
+            values = sorted(r[key] for r in results)
+            print(f"  {key:<28} median {values[len(values) // 2]:>8} ms   min {values[0]:>8}   max {values[-1]:>8}")
+
+
+if __name__ == "__main__":
+    main_cli()
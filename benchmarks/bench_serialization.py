@@ -0,0 +1,118 @@
+"""对比列表接口 ORM + pydantic + json 与 Core列查询 + orjson 的耗时（不经过HTTP）
+
+用法：
+    python -m benchmarks.bench_serialization --limit 1000 --repeat 20
+"""
+import argparse
+import json
+import random
+import uuid
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import text
+
+import main
+import models
+import schemas
+from queries import ArtifactFilters, artifacts_page_stmt, captions_page_stmt, chunked
+from benchmarks.common import DEFAULT_DATABASE_URL, make_engine, make_session_factory, prepare_schema, timed
+
+
+def seed(session_factory, count):
+    """图片带children_id和四个路径字段，描述带extra_data，与线上数据形状接近"""
+    artifact_rows = []
+    for i in range(count):
+        md5 = uuid.uuid4().hex
+        artifact_rows.append(dict(
+            id=uuid.uuid4(), width=random.choice([512, 768, 1024, 2048]), height=random.choice([512, 768, 1024]),
+            size=random.randint(50_000, 5_000_000), pixels=1024 * 1024, format=random.choice(["png", "jpg", "webp"]),
+            md5=md5, upload_time=i, update_time=i, created_time=i, upload_user=uuid.uuid4(),
+            children_id=[uuid.uuid4() for _ in range(random.randint(0, 4))],
+            origin_name=f"{md5}.png", local_path=f"/data/images/{md5[:2]}/{md5}.png",
+            original_path=f"oss://bucket/original/{md5}.png", size_2048x_path=f"oss://bucket/2048/{md5}.webp",
+            size_1024x_path=f"oss://bucket/1024/{md5}.webp", size_256x_path=f"oss://bucket/256/{md5}.webp",
+            has_alpha=False, is_deleted=False,
+        ))
+    caption_rows = [
+        dict(id=uuid.uuid4(), type="tag", upload_time=i, is_deleted=False,
+             text="1girl, solo, long hair, looking at viewer, smile, outdoors, " * 4,
+             extra_data={"model": "wd-v1-4", "scores": {"1girl": 0.99, "solo": 0.97}, "elapsed_ms": 120})
+        for i in range(count)
+    ]
+    with session_factory() as db:
+        db.execute(text("TRUNCATE artifact_caption_map, captions, artifacts CASCADE"))
+        for chunk in chunked(artifact_rows, 1000):
+            db.execute(models.Artifact.__table__.insert(), chunk)
+        for chunk in chunked(caption_rows, 1000):
+            db.execute(models.Caption.__table__.insert(), chunk)
+        db.commit()
+
+
+def legacy_artifacts(db, limit):
+    """改写前：加载ORM对象，按response_model校验后用标准库json编码"""
+    artifacts = db.execute(artifacts_page_stmt(ArtifactFilters(), 0, limit, None)).scalars().all()
+    adapter = TypeAdapter(List[schemas.Artifact])
+    content = adapter.dump_python(adapter.validate_python(artifacts, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def legacy_captions(db, limit):
+    captions = db.execute(captions_page_stmt(False, 0, limit, None)).scalars().all()
+    adapter = TypeAdapter(List[schemas.Caption])
+    content = adapter.dump_python(adapter.validate_python(captions, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def measure(session_factory, func, repeat):
+    timings = []
+    body = b""
+    for _ in range(repeat):
+        with session_factory() as db, timed(timings):
+            body = func(db)
+    return min(timings), sorted(timings)[len(timings) // 2], body
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url)
+    prepare_schema(engine)
+    session_factory = make_session_factory(engine)
+    random.seed(42)
+    seed(session_factory, args.rows)
+
+    limit = args.limit
+    cases = [
+        ("artifacts legacy (ORM + pydantic + json)", lambda db: legacy_artifacts(db, limit)),
+        ("artifacts new (Core + orjson)",
+         lambda db: main.read_artifacts(skip=0, limit=limit, cursor=None, fields=None,
+                                        filters=ArtifactFilters(), db=db).body),
+        ("artifacts new fields=id,md5,width,height",
+         lambda db: main.read_artifacts(skip=0, limit=limit, cursor=None, fields="id,md5,width,height",
+                                        filters=ArtifactFilters(), db=db).body),
+        ("captions legacy (ORM + pydantic + json)", lambda db: legacy_captions(db, limit)),
+        ("captions new (Core + orjson)",
+         lambda db: main.read_captions(skip=0, limit=limit, include_deleted=False, cursor=None,
+                                       fields=None, db=db).body),
+    ]
+
+    print(f"limit={limit} rows={args.rows} repeat={args.repeat}")
+    bodies = {}
+    for name, func in cases:
+        best, median, body = measure(session_factory, func, args.repeat)
+        bodies[name] = body
+        print(f"{name:<45} min {best * 1000:7.1f} ms  median {median * 1000:7.1f} ms  {len(body) / 1024:7.1f} KiB")
+
+    # 默认字段的新旧输出内容应一致
+    assert json.loads(bodies[cases[0][0]]) == json.loads(bodies[cases[1][0]])
+    assert json.loads(bodies[cases[3][0]]) == json.loads(bodies[cases[4][0]])
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,146 @@
+"""对比单条写接口 SELECT + setattr + commit + refresh 与 UPDATE/INSERT ... RETURNING 的耗时（不经过HTTP）
+
+用法：
+    python -m benchmarks.bench_write_returning --items 500 --repeat 3
+
+每种写法报告单次调用的 p50/p99 延迟和SQL条数；跨可用区访问RDS时，每少一条SQL约节省一个网络往返。
+"""
+import argparse
+import time
+import uuid
+from typing import Callable, Dict, List
+
+from sqlalchemy import event, text
+
+import main
+import models
+import schemas
+from queries import chunked
+from benchmarks.common import DEFAULT_DATABASE_URL, make_engine, make_session_factory, prepare_schema, summarize
+
+
+def legacy_update_artifact(artifact_id, artifact, db):
+    """改写前：先SELECT，逐个setattr，commit后再refresh重新SELECT"""
+    db_artifact = db.query(models.Artifact).filter(models.Artifact.id == artifact_id).first()
+    update_data = artifact.model_dump(exclude_unset=True)
+    update_data.pop("aspect_ratio", None)
+    for key, value in update_data.items():
+        setattr(db_artifact, key, value)
+    db.commit()
+    db.refresh(db_artifact)
+    return db_artifact
+
+
+def legacy_update_caption(caption_id, caption, db):
+    db_caption = db.query(models.Caption).filter(models.Caption.id == caption_id).first()
+    for key, value in caption.model_dump(exclude_unset=True).items():
+        setattr(db_caption, key, value)
+    db.commit()
+    db.refresh(db_caption)
+    return db_caption
+
+
+def legacy_create_artifact(artifact, db):
+    """改写前：先按md5查重，db.add后commit再refresh"""
+    db.query(models.Artifact).filter(models.Artifact.md5 == artifact.md5).first()
+    db_artifact = models.Artifact(**{k: v for k, v in artifact.model_dump().items() if k != "aspect_ratio"})
+    db.add(db_artifact)
+    db.commit()
+    db.refresh(db_artifact)
+    return db_artifact
+
+
+def seed(session_factory, count):
+    artifact_rows = [
+        dict(id=uuid.uuid4(), width=1024, height=768, size=200000, pixels=1024 * 768, format="png",
+             md5=uuid.uuid4().hex, upload_time=i, update_time=i, created_time=i, original_path=f"oss://bench/{i}.png",
+             has_alpha=False, is_deleted=False)
+        for i in range(count)
+    ]
+    caption_rows = [
+        dict(id=uuid.uuid4(), type="bench", upload_time=i, text=f"caption {i}", is_deleted=False)
+        for i in range(count)
+    ]
+    with session_factory() as db:
+        db.execute(text("TRUNCATE artifact_caption_map, captions, artifacts CASCADE"))
+        for chunk in chunked(artifact_rows, 1000):
+            db.execute(models.Artifact.__table__.insert(), chunk)
+        db.execute(models.Caption.__table__.insert(), caption_rows)
+        db.commit()
+    return [r["id"] for r in artifact_rows], [r["id"] for r in caption_rows]
+
+
+def artifact_create(i: int) -> schemas.ArtifactCreate:
+    now = int(time.time() * 1000)
+    return schemas.ArtifactCreate(
+        width=1024, height=1024, size=1_500_000, pixels=1024 * 1024, format="png", md5=uuid.uuid4().hex,
+        upload_time=now, update_time=now, created_time=now, original_path=f"oss://bench/new/{i}.png",
+    )
+
+
+def run(engine, session_factory, calls: List[Callable], repeat: int) -> Dict[str, float]:
+    """每次调用使用新会话；statements_per_call 为单次调用执行的SQL条数（不含COMMIT）"""
+    statements = [0]
+
+    def count(*args):
+        statements[0] += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    latencies = []
+    try:
+        for _ in range(repeat):
+            for call in calls:
+                with session_factory() as db:
+                    start = time.perf_counter()
+                    call(db)
+                    latencies.append(time.perf_counter() - start)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    result = summarize(latencies)
+    result["statements_per_call"] = round(statements[0] / len(latencies), 2) if latencies else 0.0
+    return result
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url)
+    prepare_schema(engine)
+    session_factory = make_session_factory(engine)
+
+    artifact_ids, caption_ids = seed(session_factory, args.items)
+    artifact_update = schemas.ArtifactUpdate(update_time=int(time.time() * 1000), local_path="/bench/updated")
+    caption_update = schemas.CaptionUpdate(text="bench update")
+    creates = iter(range(10 ** 9))
+
+    cases = {
+        "PUT /artifacts/{artifact_id}": (
+            [lambda db, i=i: legacy_update_artifact(i, artifact_update, db) for i in artifact_ids],
+            [lambda db, i=i: main.update_artifact(i, artifact_update, db) for i in artifact_ids],
+        ),
+        "PUT /captions/{caption_id}": (
+            [lambda db, i=i: legacy_update_caption(i, caption_update, db) for i in caption_ids],
+            [lambda db, i=i: main.update_caption(i, caption_update, db) for i in caption_ids],
+        ),
+        "POST /artifacts/": (
+            [lambda db: legacy_create_artifact(artifact_create(next(creates)), db) for _ in range(args.items)],
+            [lambda db: main.create_artifact(artifact_create(next(creates)), db) for _ in range(args.items)],
+        ),
+    }
+    for name, (legacy_calls, returning_calls) in cases.items():
+        legacy = run(engine, session_factory, legacy_calls, args.repeat)
+        returning = run(engine, session_factory, returning_calls, args.repeat)
+        print(name)
+        print(f"  legacy (SELECT + refresh): p50 {legacy['p50_ms']:.3f} ms  p99 {legacy['p99_ms']:.3f} ms  "
+              f"sql/call {legacy['statements_per_call']}")
+        print(f"  RETURNING:                 p50 {returning['p50_ms']:.3f} ms  p99 {returning['p99_ms']:.3f} ms  "
+              f"sql/call {returning['statements_per_call']}")
+        print(f"  p50 speedup: {legacy['p50_ms'] / returning['p50_ms']:.2f}x")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,56 @@
+"""比较两次 benchmarks.suite 的结果
+
+用法：
+    python -m benchmarks.compare OLD.json NEW.json [--threshold 10]
+
+p99 延迟上升或吞吐下降超过阈值（百分比）、或每请求SQL条数增加的场景标记为回归，存在回归时退出码为1。
+"""
+import argparse
+import json
+import sys
+
+
+def _change(old, new):
+    if not old:
+        return None
+    return (new - old) / old * 100
+
+
+def compare(old: dict, new: dict, threshold: float) -> int:
+    print(f"old: {old['commit'][:8]}{' (dirty)' if old.get('dirty') else ''} {old['timestamp']} {old['mode']}")
+    print(f"new: {new['commit'][:8]}{' (dirty)' if new.get('dirty') else ''} {new['timestamp']} {new['mode']}")
+    print(f"{'scenario':<58} {'req/s':>18} {'p99 ms':>20} {'q/req':>12}")
+    regressions = 0
+    for name, n in new["scenarios"].items():
+        o = old["scenarios"].get(name)
+        if o is None:
+            print(f"{name:<58} {n['rps']:>18} {n['p99_ms']:>20} {n['queries_per_request']!s:>12}  (new)")
+            continue
+        rps_change = _change(o["rps"], n["rps"]) or 0.0
+        p99_change = _change(o["p99_ms"], n["p99_ms"]) or 0.0
+        queries_up = (n["queries_per_request"] or 0) > (o["queries_per_request"] or 0)
+        flag = ""
+        if rps_change < -threshold or p99_change > threshold or queries_up:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{name:<58} {o['rps']:>7}->{n['rps']:<7}{rps_change:+4.0f}% "
+              f"{o['p99_ms']:>8}->{n['p99_ms']:<8}{p99_change:+4.0f}% "
+              f"{o['queries_per_request']!s:>5}->{n['queries_per_request']!s:<5}{flag}")
+    return 1 if regressions else 0
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0)
+    args = parser.parse_args()
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    sys.exit(compare(old, new, args.threshold))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,160 @@
+"""生成接近线上形状的测试数据
+
+用法：
+    python -m benchmarks.seed --artifacts 20000
+
+- 图片：常见分辨率、对数正态的文件大小、约30%带 children_id、约80%带缩略图路径、3%已软删除
+- 预设：config 中包含模型、较长的提示词和采样参数
+- 描述：每张图片1~3条，约60%使用预设，extra_data 为嵌套JSON，2%已软删除
+- 映射：每条描述与所属图片一一映射
+"""
+import argparse
+import random
+import time
+import uuid
+from typing import Dict, List
+
+from sqlalchemy import text
+
+import models
+from queries import chunked
+from benchmarks.common import DEFAULT_DATABASE_URL, make_engine, make_session_factory, prepare_schema
+
+INSERT_CHUNK = 2000
+
+# (宽, 高, 权重)
+RESOLUTIONS = [
+    (512, 512, 10), (768, 768, 8), (1024, 1024, 20), (832, 1216, 15), (1216, 832, 10),
+    (1024, 1536, 8), (1920, 1080, 8), (2048, 2048, 5), (3840, 2160, 3), (640, 480, 3),
+]
+FORMATS = [("png", 50), ("jpg", 35), ("webp", 15)]
+TAGS = [
+    "1girl", "solo", "long hair", "looking at viewer", "smile", "blush", "outdoors", "sky", "cloud", "dress",
+    "short hair", "blue eyes", "holding", "standing", "upper body", "simple background", "white background",
+    "hat", "jewelry", "flower", "tree", "water", "night", "city", "building", "scenery", "no humans",
+]
+MODELS = ["gemini-1.5-pro", "gpt-4o", "wd-v1-4-vit", "joycaption-alpha", "florence-2-large"]
+
+
+def _weighted(choices):
+    values, weights = zip(*[(c[:-1] if len(c) > 2 else c[0], c[-1]) for c in choices])
+    return random.choices(values, weights=weights)[0]
+
+
+def _caption_text() -> str:
+    if random.random() < 0.5:
+        return ", ".join(random.sample(TAGS, random.randint(5, 20)))
+    words = random.sample(TAGS, 10)
+    return " ".join(f"The image shows {w}." for w in words) * random.randint(1, 4)
+
+
+def artifact_row(i: int, now: int, users: List[uuid.UUID], previous: List[uuid.UUID]) -> Dict:
+    width, height = _weighted(RESOLUTIONS)
+    fmt = _weighted(FORMATS)
+    md5 = uuid.uuid4().hex
+    upload_time = now - random.randint(0, 180 * 86400 * 1000)
+    is_deleted = random.random() < 0.03
+    has_thumbnails = random.random() < 0.8
+    children = None
+    if previous and random.random() < 0.3:
+        children = random.sample(previous[-5000:], min(len(previous[-5000:]), random.randint(1, 8)))
+    return dict(
+        id=uuid.uuid4(), width=width, height=height, pixels=width * height,
+        size=int(min(max(random.lognormvariate(14.2, 0.8), 20_000), 40_000_000)),
+        format=fmt, md5=md5, has_alpha=fmt == "png" and random.random() < 0.2,
+        upload_time=upload_time, update_time=upload_time + random.randint(0, 86400 * 1000), created_time=upload_time,
+        upload_user=random.choice(users), children_id=children,
+        origin_name=f"IMG_{i:08d}.{fmt}", local_path=f"/data/images/{md5[:2]}/{md5}.{fmt}",
+        original_path=f"oss://artifacts/original/{md5[:2]}/{md5}.{fmt}",
+        size_2048x_path=f"oss://artifacts/2048/{md5}.webp" if has_thumbnails else None,
+        size_1024x_path=f"oss://artifacts/1024/{md5}.webp" if has_thumbnails else None,
+        size_256x_path=f"oss://artifacts/256/{md5}.webp" if has_thumbnails else None,
+        is_deleted=is_deleted,
+        deleted_time=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(upload_time / 1000)) if is_deleted else None,
+    )
+
+
+def preset_row(i: int, now: int) -> Dict:
+    return dict(
+        preset_key=f"preset-{i:03d}",
+        config={
+            "model": random.choice(MODELS),
+            "prompt": "Describe the image in detail, including subjects, style, lighting and composition. " * 3,
+            "temperature": round(random.uniform(0, 1), 2),
+            "max_tokens": random.choice([256, 512, 1024]),
+            "tags": random.sample(TAGS, 5),
+        },
+        description=f"benchmark preset {i}", creator_id=uuid.uuid4(),
+        create_time=now - random.randint(0, 365 * 86400 * 1000), is_deleted=False,
+    )
+
+
+def caption_row(artifact: Dict, presets: List[str]) -> Dict:
+    model = random.choice(MODELS)
+    return dict(
+        id=uuid.uuid4(), type=random.choice(["tag", "natural", "short"]),
+        preset_key=random.choice(presets) if random.random() < 0.6 else None,
+        upload_time=artifact["upload_time"] + random.randint(0, 3600 * 1000), text=_caption_text(),
+        extra_data={
+            "model": model,
+            "elapsed_ms": random.randint(50, 8000),
+            "tokens": {"prompt": random.randint(200, 1200), "completion": random.randint(20, 600)},
+            "scores": {tag: round(random.random(), 3) for tag in random.sample(TAGS, random.randint(0, 10))},
+        },
+        is_deleted=random.random() < 0.02,
+    )
+
+
+def seed(session_factory, artifacts: int, presets: int = 30, truncate: bool = True) -> Dict[str, int]:
+    """写入测试数据，返回各表行数"""
+    random.seed(42)
+    now = int(time.time() * 1000)
+    users = [uuid.uuid4() for _ in range(200)]
+    preset_rows = [preset_row(i, now) for i in range(presets)]
+    preset_keys = [p["preset_key"] for p in preset_rows]
+    counts = {"artifacts": 0, "presets": len(preset_rows), "captions": 0, "maps": 0}
+
+    with session_factory() as db:
+        if truncate:
+            db.execute(text("TRUNCATE artifact_caption_map, captions, caption_preset, artifacts CASCADE"))
+        db.execute(models.CaptionPreset.__table__.insert(), preset_rows)
+
+        previous: List[uuid.UUID] = []
+        for start in range(0, artifacts, INSERT_CHUNK):
+            artifact_rows = [artifact_row(i, now, users, previous) for i in range(start, min(start + INSERT_CHUNK, artifacts))]
+            caption_rows, map_rows = [], []
+            for artifact in artifact_rows:
+                for _ in range(random.randint(1, 3)):
+                    caption = caption_row(artifact, preset_keys)
+                    caption_rows.append(caption)
+                    map_rows.append(dict(artifact_id=artifact["id"], caption_id=caption["id"], add_time=caption["upload_time"]))
+            db.execute(models.Artifact.__table__.insert(), artifact_rows)
+            for chunk in chunked(caption_rows, INSERT_CHUNK):
+                db.execute(models.Caption.__table__.insert(), chunk)
+            for chunk in chunked(map_rows, INSERT_CHUNK):
+                db.execute(models.ArtifactCaptionMap.__table__.insert(), chunk)
+            previous.extend(a["id"] for a in artifact_rows)
+            counts["artifacts"] += len(artifact_rows)
+            counts["captions"] += len(caption_rows)
+            counts["maps"] += len(map_rows)
+        db.execute(text("ANALYZE"))
+        db.commit()
+    return counts
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--artifacts", type=int, default=20000)
+    parser.add_argument("--presets", type=int, default=30)
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url)
+    prepare_schema(engine)
+    start = time.perf_counter()
+    counts = seed(make_session_factory(engine), args.artifacts, args.presets)
+    print(f"seeded {counts} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,248 @@
+"""全接口压测：每个路由一个场景，结果保存为JSON，便于比较不同提交
+
+用法：
+    python -m benchmarks.seed --artifacts 20000          # 先灌数据（可重复使用）
+    python -m benchmarks.suite --duration 5 --concurrency 8
+    python -m benchmarks.suite --only artifacts --mode async
+    python -m benchmarks.compare benchmarks/results/A.json benchmarks/results/B.json
+
+场景按 只读 -> 写入 -> 删除 的顺序执行，写入和删除只操作预留的数据，不影响只读场景使用的行。
+每个场景报告吞吐、p50/p95/p99 延迟、状态码分布和每请求SQL条数（X-Query-Count）。
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from benchmarks.common import DEFAULT_DATABASE_URL, make_engine, run_load, start_server, stop_server
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+Request = Tuple[str, str, Optional[object]]
+
+
+class Sample:
+    """从已灌数据的库中抽样，供场景构造请求"""
+
+    def __init__(self, engine, size: int = 2000):
+        with engine.connect() as conn:
+            artifacts = conn.execute(text(
+                "SELECT id, md5 FROM artifacts WHERE is_deleted = false ORDER BY md5 LIMIT :n"
+            ), {"n": size * 2}).all()
+            captions = conn.execute(text(
+                "SELECT id FROM captions WHERE is_deleted = false ORDER BY id LIMIT :n"
+            ), {"n": size * 2}).scalars().all()
+            presets = conn.execute(text(
+                "SELECT preset_key FROM caption_preset WHERE is_deleted = false ORDER BY preset_key"
+            )).scalars().all()
+            self.recent_update_time = conn.execute(text("SELECT max(update_time) FROM artifacts")).scalar() or 0
+        if len(artifacts) < 20 or len(captions) < 20 or len(presets) < 10:
+            raise RuntimeError("数据不足，请先运行 python -m benchmarks.seed")
+
+        # 前一半只读，后一半留给更新/删除场景
+        half = len(artifacts) // 2
+        self.artifact_ids = [str(r.id) for r in artifacts[:half]]
+        self.md5s = [r.md5 for r in artifacts[:half]]
+        self.mutable_artifact_ids = [str(r.id) for r in artifacts[half:]]
+        half = len(captions) // 2
+        self.caption_ids = [str(c) for c in captions[:half]]
+        self.mutable_caption_ids = [str(c) for c in captions[half:]]
+        self.preset_keys = presets[:-5]
+        self.mutable_preset_keys = presets[-5:]
+        # 每次运行使用新的前缀，避免与上次写入的数据冲突
+        self.run_id = uuid.uuid4().hex[:8]
+
+
+def _artifact_body(key: str) -> Dict:
+    now = int(time.time() * 1000)
+    return dict(
+        width=1024, height=1024, size=1_500_000, pixels=1024 * 1024, format="png",
+        md5=uuid.uuid5(uuid.NAMESPACE_URL, key).hex, upload_time=now, update_time=now, created_time=now,
+        original_path=f"oss://bench/{key}.png", children_id=[str(uuid.uuid4()) for _ in range(len(key) % 4)],
+    )
+
+
+def _map_pairs(s: Sample, offset: int, side: int = 200) -> List[Tuple[str, str]]:
+    """预留图片 x 预留描述 的组合（side x side 对），offset用于区分单条创建和批量创建使用的区域"""
+    artifacts = s.mutable_artifact_ids[offset * side:(offset + 1) * side]
+    captions = s.mutable_caption_ids[offset * side:(offset + 1) * side]
+    return [(a, c) for a in artifacts for c in captions]
+
+
+def _map_batches(s: Sample, size: int = 100) -> List[Request]:
+    pairs = _map_pairs(s, 1)
+    return [
+        ("POST", "/artifact-caption-maps/batch/", [
+            {"artifact_id": a, "caption_id": c, "add_time": 1} for a, c in pairs[start:start + size]
+        ])
+        for start in range(0, len(pairs), size)
+    ]
+
+
+# 场景名 -> (阶段, 构造请求列表)；阶段：read / write / delete
+SCENARIOS: Dict[str, Tuple[str, Callable[[Sample], List[Request]]]] = {
+    "GET /": ("read", lambda s: [("GET", "/", None)]),
+    "POST /test-connection/": ("read", lambda s: [("POST", "/test-connection/", None)]),
+    "GET /admin/pool": ("read", lambda s: [("GET", "/admin/pool", None)]),
+    "GET /metrics": ("read", lambda s: [("GET", "/metrics", None)]),
+    "GET /artifacts/ limit=100": ("read", lambda s: [("GET", "/artifacts/?limit=100", None)]),
+    "GET /artifacts/ filtered": ("read", lambda s: [("GET", "/artifacts/?limit=100&format=png&min_width=1024", None)]),
+    "GET /artifacts/ limit=1000 fields=id,md5": ("read", lambda s: [("GET", "/artifacts/?limit=1000&fields=id,md5", None)]),
+    "GET /artifacts/full/ limit=50": ("read", lambda s: [("GET", "/artifacts/full/?limit=50", None)]),
+    "GET /artifacts/{artifact_id}/full": ("read", lambda s: [("GET", f"/artifacts/{i}/full", None) for i in s.artifact_ids]),
+    "GET /artifacts/{artifact_id}": ("read", lambda s: [("GET", f"/artifacts/{i}", None) for i in s.artifact_ids]),
+    "GET /artifacts/md5/{md5}": ("read", lambda s: [("GET", f"/artifacts/md5/{m}", None) for m in s.md5s]),
+    "GET /artifacts/export updated_since": ("read", lambda s: [
+        ("GET", f"/artifacts/export?updated_since={s.recent_update_time - 3600 * 1000}", None)
+    ]),
+    "POST /artifacts/md5/lookup 1000": ("read", lambda s: [
+        ("POST", "/artifacts/md5/lookup", {"md5s": s.md5s[:1000] + [uuid.uuid4().hex for _ in range(100)]})
+    ]),
+    "POST /artifacts/by-ids 500": ("read", lambda s: [("POST", "/artifacts/by-ids", {"ids": s.artifact_ids[:500]})]),
+    "POST /captions/by-ids 500": ("read", lambda s: [("POST", "/captions/by-ids", {"ids": s.caption_ids[:500]})]),
+    "GET /presets/": ("read", lambda s: [("GET", "/presets/", None)]),
+    "GET /presets/{preset_key}": ("read", lambda s: [("GET", f"/presets/{k}", None) for k in s.preset_keys]),
+    "GET /captions/ limit=100": ("read", lambda s: [("GET", "/captions/?limit=100", None)]),
+    "GET /captions/{caption_id}": ("read", lambda s: [("GET", f"/captions/{i}", None) for i in s.caption_ids]),
+    "GET /captions/preset/{preset_key}": ("read", lambda s: [("GET", f"/captions/preset/{k}", None) for k in s.preset_keys]),
+    "GET /artifact-caption-maps/ limit=100": ("read", lambda s: [("GET", "/artifact-caption-maps/?limit=100", None)]),
+    "GET /artifact-caption-maps/artifact/{artifact_id}": ("read", lambda s: [
+        ("GET", f"/artifact-caption-maps/artifact/{i}", None) for i in s.artifact_ids
+    ]),
+    "GET /artifact-caption-maps/caption/{caption_id}": ("read", lambda s: [
+        ("GET", f"/artifact-caption-maps/caption/{i}", None) for i in s.caption_ids
+    ]),
+
+    "POST /artifacts/": ("write", lambda s: [
+        ("POST", "/artifacts/", _artifact_body(f"{s.run_id}/single/{i}")) for i in range(50000)
+    ]),
+    "POST /artifacts/batch/ 100": ("write", lambda s: [
+        ("POST", "/artifacts/batch/", [_artifact_body(f"{s.run_id}/batch/{n}/{i}") for i in range(100)])
+        for n in range(2000)
+    ]),
+    "PUT /artifacts/{artifact_id}": ("write", lambda s: [
+        ("PUT", f"/artifacts/{i}", {"update_time": int(time.time() * 1000), "local_path": f"/bench/{i}"})
+        for i in s.mutable_artifact_ids
+    ]),
+    "POST /presets/": ("write", lambda s: [
+        ("POST", "/presets/", {"preset_key": f"b-{s.run_id}-{i}", "config": {"model": "bench"}, "create_time": i})
+        for i in range(50000)
+    ]),
+    "PUT /presets/{preset_key}": ("write", lambda s: [
+        ("PUT", f"/presets/{k}", {"description": "bench update"}) for k in s.mutable_preset_keys
+    ]),
+    "POST /captions/": ("write", lambda s: [
+        ("POST", "/captions/", {"type": "bench", "upload_time": i, "text": "bench caption", "extra_data": {"i": i}})
+        for i in range(50000)
+    ]),
+    "POST /captions/ preset upsert": ("write", lambda s: [
+        ("POST", "/captions/", {"preset_key": k, "upload_time": 1, "text": "bench upsert"}) for k in s.mutable_preset_keys
+    ]),
+    "PUT /captions/{caption_id}": ("write", lambda s: [
+        ("PUT", f"/captions/{i}", {"text": "bench update"}) for i in s.mutable_caption_ids
+    ]),
+    "POST /artifact-caption-maps/": ("write", lambda s: [
+        ("POST", "/artifact-caption-maps/", {"artifact_id": a, "caption_id": c, "add_time": 1})
+        for a, c in _map_pairs(s, 0)
+    ]),
+    "POST /artifact-caption-maps/batch/ 100": ("write", _map_batches),
+
+    "DELETE /artifact-caption-maps/{artifact_id}/{caption_id}": ("delete", lambda s: [
+        ("DELETE", f"/artifact-caption-maps/{a}/{c}", None) for a, c in _map_pairs(s, 0)
+    ]),
+    "DELETE /captions/{caption_id}": ("delete", lambda s: [("DELETE", f"/captions/{i}", None) for i in s.mutable_caption_ids]),
+    "DELETE /presets/{preset_key}": ("delete", lambda s: [("DELETE", f"/presets/{k}", None) for k in s.mutable_preset_keys]),
+    "DELETE /artifacts/{artifact_id}": ("delete", lambda s: [
+        ("DELETE", f"/artifacts/{i}", None) for i in s.mutable_artifact_ids
+    ]),
+}
+
+PHASES = ("read", "write", "delete")
+
+
+def git_revision() -> Dict[str, object]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=root, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root, text=True).strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = "unknown", False
+    return {"commit": commit, "dirty": dirty}
+
+
+def run_suite(port: int, sample: Sample, names: List[str], concurrency: int, duration: float) -> Dict[str, Dict]:
+    results = {}
+    for phase in PHASES:
+        for name in names:
+            scenario_phase, build = SCENARIOS[name]
+            if scenario_phase != phase:
+                continue
+            requests = build(sample)
+            results[name] = run_load(port, requests, concurrency, duration)
+            r = results[name]
+            print(f"{name:<58} {r['rps']:>8} req/s  p50 {r['p50_ms']:>8}ms  p95 {r['p95_ms']:>8}ms  "
+                  f"p99 {r['p99_ms']:>8}ms  q/req {r['queries_per_request']}  {r['statuses']}")
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--mode", choices=("sync", "async"), default="sync")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0, help="每个场景的持续秒数")
+    parser.add_argument("--only", default=None, help="只运行名称包含该字符串的场景")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--output", default=None, help="结果文件路径，默认写入 benchmarks/results/")
+    args = parser.parse_args()
+
+    names = [name for name in SCENARIOS if not args.only or args.only in name]
+    engine = make_engine(args.database_url)
+    sample = Sample(engine)
+    with engine.connect() as conn:
+        server_version = conn.execute(text("SHOW server_version")).scalar()
+        row_counts = {
+            table: conn.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+            for table in ("artifacts", "captions", "caption_preset", "artifact_caption_map")
+        }
+
+    env = {"DATABASE_URL": args.database_url, "DB_ASYNC": "1" if args.mode == "async" else "0", "SLOW_QUERY_MS": "0"}
+    proc = start_server(args.port, env)
+    try:
+        run_load(args.port, [("GET", f"/artifacts/{i}", None) for i in sample.artifact_ids], args.concurrency, 2.0)  # 预热
+        results = run_suite(args.port, sample, names, args.concurrency, args.duration)
+    finally:
+        stop_server(proc)
+
+    revision = git_revision()
+    report = {
+        **revision,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "mode": args.mode,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "python": platform.python_version(),
+        "postgres": server_version,
+        "rows": row_counts,
+        "scenarios": results,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        suffix = "-dirty" if revision["dirty"] else ""
+        output = os.path.join(
+            RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{revision['commit'][:8]}{suffix}-{args.mode}.json"
+        )
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"结果已保存: {output}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,178 @@
+import json
+import math
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import BigInteger, Float, String, cast, func, literal, literal_column, select
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from database import SessionLocal
+import models
+from queries import ASPECT_RATIO, ArtifactFilters
+
+# 每个维度最多的分界数
+BUCKET_EDGES_MAX = 256
+
+# ids=true 时每行输出的最大id数，同一个桶可能输出多行
+BUCKET_IDS_CHUNK = 1000
+
+
+def _bad_request(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+
+def _parse_edges(name: str, value: str, convert) -> list:
+    """逗号分隔、严格升序的正数"""
+    try:
+        edges = [convert(v) for v in value.split(",") if v.strip()]
+    except ValueError:
+        raise _bad_request(f"{name} 必须是逗号分隔的数字: {value}")
+    if not edges or len(edges) > BUCKET_EDGES_MAX:
+        raise _bad_request(f"{name} 需要 1 到 {BUCKET_EDGES_MAX} 个分界")
+    if any(not math.isfinite(e) or e <= 0 for e in edges) or any(a >= b for a, b in zip(edges, edges[1:])):
+        raise _bad_request(f"{name} 必须是严格升序的正数: {value}")
+    return edges
+
+
+def _parse_resolutions(value: str) -> List[Tuple[int, int]]:
+    """1024x1024,1152x896,... 按宽高比升序返回"""
+    try:
+        resolutions = [tuple(int(n) for n in v.strip().lower().split("x")) for v in value.split(",") if v.strip()]
+    except ValueError:
+        raise _bad_request(f"resolutions 必须是逗号分隔的 宽x高: {value}")
+    if not resolutions or len(resolutions) > BUCKET_EDGES_MAX + 1:
+        raise _bad_request(f"resolutions 需要 1 到 {BUCKET_EDGES_MAX + 1} 个分辨率")
+    if any(len(r) != 2 or min(r) <= 0 for r in resolutions):
+        raise _bad_request(f"resolutions 必须是逗号分隔的 宽x高: {value}")
+    resolutions.sort(key=lambda r: r[0] / r[1])
+    ratios = [w / h for w, h in resolutions]
+    if any(a == b for a, b in zip(ratios, ratios[1:])):
+        raise _bad_request("resolutions 中的宽高比不能重复，按大小分桶请使用 pixel_edges")
+    return resolutions
+
+
+def _bounds(edges: list, index: int) -> Tuple[Optional[float], Optional[float]]:
+    """width_bucket 返回的桶号 -> [下界, 上界)，两端的桶没有下界或上界"""
+    lower = edges[index - 1] if index > 0 else None
+    upper = edges[index] if index < len(edges) else None
+    return lower, upper
+
+
+class BucketSpec:
+    """GET /artifacts/buckets 的分桶规则，作为依赖解析
+
+    - aspect_edges：升序的宽高比（宽/高）分界，如 0.5,0.75,1,1.34,2；分界为下一个桶的下界（含），两端各多一个桶
+    - resolutions：训练分辨率，如 1024x1024,1152x896,896x1152；每张图归入宽高比最接近（按比值的对数距离）的分辨率，
+      与 aspect_edges 二选一。相邻分辨率宽高比的几何平均即为分界
+    - pixel_edges：升序的像素数分界，如 262144,589824,1048576，与宽高比分桶组合
+    分桶在数据库中用 width_bucket 计算，一条 GROUP BY 查询返回所有桶的数量。
+    """
+
+    def __init__(
+        self,
+        aspect_edges: Optional[str] = None,
+        resolutions: Optional[str] = None,
+        pixel_edges: Optional[str] = None,
+    ):
+        if aspect_edges and resolutions:
+            raise _bad_request("aspect_edges 与 resolutions 只能指定一个")
+        self.resolutions = _parse_resolutions(resolutions) if resolutions else None
+        if self.resolutions:
+            ratios = [w / h for w, h in self.resolutions]
+            self.aspect_edges = [math.sqrt(a * b) for a, b in zip(ratios, ratios[1:])]
+        else:
+            self.aspect_edges = _parse_edges("aspect_edges", aspect_edges, float) if aspect_edges else None
+        self.pixel_edges = _parse_edges("pixel_edges", pixel_edges, int) if pixel_edges else None
+        if self.aspect_edges is None and self.pixel_edges is None:
+            raise _bad_request("需要指定 aspect_edges、resolutions 或 pixel_edges")
+
+    def aspect_bucket(self):
+        # 只有一个分辨率时没有分界，所有图片都在0号桶
+        if not self.aspect_edges:
+            return literal(0)
+        return func.width_bucket(ASPECT_RATIO, cast(self.aspect_edges, ARRAY(Float)))
+
+    def pixel_bucket(self):
+        if self.pixel_edges is None:
+            return literal(0)
+        return func.width_bucket(models.Artifact.pixels, cast(self.pixel_edges, ARRAY(BigInteger)))
+
+    def conditions(self) -> list:
+        # 高为0的图片没有宽高比，不归入任何宽高比桶
+        if self.aspect_edges is None:
+            return []
+        return [ASPECT_RATIO.isnot(None)]
+
+    def describe(self, aspect_bucket: int, pixel_bucket: int) -> dict:
+        bucket = {"aspect_bucket": aspect_bucket, "pixel_bucket": pixel_bucket}
+        if self.resolutions:
+            width, height = self.resolutions[aspect_bucket]
+            bucket["resolution"] = f"{width}x{height}"
+        if self.aspect_edges is not None:
+            bucket["min_aspect"], bucket["max_aspect"] = _bounds(self.aspect_edges, aspect_bucket)
+        if self.pixel_edges is not None:
+            bucket["min_pixels"], bucket["max_pixels"] = _bounds(self.pixel_edges, pixel_bucket)
+        return bucket
+
+
+def bucket_counts_stmt(filters: ArtifactFilters, spec: BucketSpec):
+    """每个非空桶一行：(aspect_bucket, pixel_bucket, count)
+
+    默认过滤条件下只读取 (aspect_ratio, pixels) 部分索引（仅索引扫描），不回表。
+    """
+    # 按输出列名分组：未指定的维度是常量0，直接写在 GROUP BY 中会被当作列序号
+    keys = (literal_column("aspect_bucket"), literal_column("pixel_bucket"))
+    return select(
+        spec.aspect_bucket().label("aspect_bucket"), spec.pixel_bucket().label("pixel_bucket"),
+        func.count().label("count"),
+    ).select_from(models.Artifact).where(*filters.conditions(), *spec.conditions()).group_by(*keys).order_by(*keys)
+
+
+def bucket_ids_stmt(filters: ArtifactFilters, spec: BucketSpec):
+    """每张图片一行：(aspect_bucket, pixel_bucket, id)；不排序，由 stream_bucket_ids 按桶分组输出
+
+    id 在数据库中转为文本：输出本来就是字符串，省去驱动逐行构造UUID对象的开销。
+    """
+    return select(
+        spec.aspect_bucket().label("aspect_bucket"), spec.pixel_bucket().label("pixel_bucket"),
+        cast(models.Artifact.id, String).label("id"),
+    ).where(*filters.conditions(), *spec.conditions())
+
+
+def buckets_response(rows: list, spec: BucketSpec) -> dict:
+    buckets = [dict(spec.describe(row.aspect_bucket, row.pixel_bucket), count=row.count) for row in rows]
+    return {"buckets": buckets, "total": sum(b["count"] for b in buckets)}
+
+
+def _ids_line(spec: BucketSpec, key: Tuple[int, int], ids: list) -> bytes:
+    line = dict(spec.describe(*key), ids=ids)
+    return json.dumps(line, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def stream_bucket_ids(
+    stmt, spec: BucketSpec, batch_size: int = BUCKET_IDS_CHUNK, session_factory=SessionLocal
+) -> Iterator[bytes]:
+    """NDJSON，每行为一个桶的描述和至多 batch_size 个id
+
+    通过服务端游标逐批读取，各桶攒满 batch_size 个id即输出一行，结束时输出各桶剩余的id；
+    内存占用与桶数 × batch_size 成正比，与总行数无关。不需要为按桶排序而对全部结果排序。
+    """
+    db = session_factory()
+    try:
+        pending: Dict[Tuple[int, int], list] = {}
+        result = db.execute(stmt.execution_options(yield_per=batch_size))
+        for rows in result.partitions():
+            chunk = []
+            for aspect_bucket, pixel_bucket, artifact_id in rows:
+                ids = pending.setdefault((aspect_bucket, pixel_bucket), [])
+                ids.append(artifact_id)
+                if len(ids) >= batch_size:
+                    chunk.append(_ids_line(spec, (aspect_bucket, pixel_bucket), ids))
+                    pending[(aspect_bucket, pixel_bucket)] = []
+            if chunk:
+                yield b"".join(chunk)
+        tail = [_ids_line(spec, key, ids) for key, ids in sorted(pending.items()) if ids]
+        if tail:
+            yield b"".join(tail)
+    finally:
+        db.close()
@@ -0,0 +1,108 @@
+import uuid
+from typing import Dict, Iterable, List, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+import models
+import schemas
+from queries import text_any, uuid_any
+
+# 单次请求允许的最大行数
+ARTIFACT_BATCH_MAX = 10000
+# 每条多行INSERT的行数（约20列，远低于65535个参数的上限）
+ARTIFACT_BATCH_CHUNK = 1000
+# 映射表只有3列，每条INSERT可以容纳更多行
+MAP_BATCH_CHUNK = 5000
+
+
+def prepare_artifact_rows(artifacts: List[schemas.ArtifactCreate]) -> List[dict]:
+    """生成待插入行：批次内重复的MD5只保留第一条，id在应用侧生成"""
+    rows: Dict[str, dict] = {}
+    for artifact in artifacts:
+        if artifact.md5 in rows:
+            continue
+        # 不包含aspect_ratio，因为它是生成列
+        row = {k: v for k, v in artifact.model_dump().items() if k != 'aspect_ratio'}
+        row["id"] = uuid.uuid4()
+        row["is_deleted"] = False
+        rows[artifact.md5] = row
+    return list(rows.values())
+
+
+def insert_artifacts_stmt(rows: List[dict]):
+    """INSERT ... ON CONFLICT (md5) DO NOTHING RETURNING id, md5"""
+    return (
+        pg_insert(models.Artifact)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=[models.Artifact.md5])
+        .returning(models.Artifact.id, models.Artifact.md5)
+    )
+
+
+def existing_artifacts_stmt(md5s: List[str]):
+    """查询已存在MD5对应的图片id"""
+    return select(models.Artifact.md5, models.Artifact.id).where(text_any(models.Artifact.md5, md5s))
+
+
+def artifact_batch_result(
+    artifacts: List[schemas.ArtifactCreate],
+    created: Dict[str, UUID],
+    existing: Dict[str, UUID],
+) -> schemas.ArtifactBatchResult:
+    """按请求顺序汇总每一行的创建/重复状态"""
+    results = []
+    reported = set()
+    for artifact in artifacts:
+        md5 = artifact.md5
+        if md5 in created and md5 not in reported:
+            results.append(schemas.ArtifactBatchItem(md5=md5, status="created", id=created[md5]))
+            reported.add(md5)
+        else:
+            results.append(schemas.ArtifactBatchItem(
+                md5=md5, status="duplicate", id=created.get(md5) or existing.get(md5)
+            ))
+    created_count = sum(1 for r in results if r.status == "created")
+    return schemas.ArtifactBatchResult(
+        created_count=created_count,
+        duplicate_count=len(results) - created_count,
+        results=results,
+    )
+
+
+def existing_ids_stmt(id_column, ids: Iterable[UUID]):
+    """SELECT id FROM ... WHERE id = ANY(:ids)"""
+    return select(id_column).where(uuid_any(id_column, ids))
+
+
+def prepare_map_rows(
+    maps_data: List[schemas.ArtifactCaptionMapCreate],
+    existing_artifacts: Set[UUID],
+    existing_captions: Set[UUID],
+) -> Tuple[List[dict], List[str]]:
+    """校验图片和描述是否存在，返回待插入行（批次内去重）和错误信息"""
+    rows: Dict[Tuple[UUID, UUID], dict] = {}
+    errors = []
+    for map_data in maps_data:
+        if map_data.artifact_id not in existing_artifacts:
+            errors.append(f"图片不存在: {map_data.artifact_id}")
+            continue
+        if map_data.caption_id not in existing_captions:
+            errors.append(f"描述不存在: {map_data.caption_id}")
+            continue
+        rows.setdefault((map_data.artifact_id, map_data.caption_id), map_data.model_dump())
+    return list(rows.values()), errors
+
+
+def insert_maps_stmt(rows: List[dict]):
+    """INSERT ... ON CONFLICT (artifact_id, caption_id) DO NOTHING RETURNING"""
+    return (
+        pg_insert(models.ArtifactCaptionMap)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=[
+            models.ArtifactCaptionMap.artifact_id,
+            models.ArtifactCaptionMap.caption_id,
+        ])
+        .returning(models.ArtifactCaptionMap.artifact_id, models.ArtifactCaptionMap.caption_id)
+    )
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import threading
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, text, tuple_
+from starlette.concurrency import run_in_threadpool
+
+import lifecycle
+import models
+from pagination import decode_cursor, encode_cursor
+
+# 触发器在每条写语句后 pg_notify 的频道（迁移0006）
+CHANGE_CHANNEL = "change_log"
+
+# 当前快照中最早的未结束事务，txid 小于它的变更都已提交（或回滚），之后不会再出现
+SNAPSHOT_XMIN_SQL = text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+
+CHANGE_COLUMNS = ("txid", "seq", "table_name", "op", "artifact_id", "caption_id", "change_time")
+
+# 单次返回的最大变更条数
+CHANGES_PAGE_MAX = 10000
+
+Watermark = Tuple[int, int]
+
+
+def check_limit(limit: int) -> int:
+    if not 0 < limit <= CHANGES_PAGE_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"limit 必须在 1 到 {CHANGES_PAGE_MAX} 之间"
+        )
+    return limit
+
+
+def parse_watermark(since: Optional[str]) -> Optional[Watermark]:
+    """since 为上次返回的水位线；未传时从日志开头读取，now 表示只取当前水位线（返回None）"""
+    if not since:
+        return 0, 0
+    if since == "now":
+        return None
+    txid, seq = decode_cursor(since, 2)
+    if not isinstance(txid, int) or not isinstance(seq, int):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"无效的水位线: {since}")
+    return txid, seq
+
+
+def changes_stmt(after: Watermark, xmin: int, limit: int):
+    """(txid, seq) 大于水位线、且事务已结束的变更，按 (txid, seq) 升序"""
+    log = models.ChangeLog
+    return select(*(log.__table__.c[name] for name in CHANGE_COLUMNS)).where(
+        tuple_(log.txid, log.seq) > tuple_(*after), log.txid < xmin
+    ).order_by(log.txid, log.seq).limit(limit)
+
+
+def read_changes(db, after: Optional[Watermark], limit: int) -> Tuple[list, Watermark, bool]:
+    """返回 (变更行, 新水位线, 是否还有更多)
+
+    先取快照xmin，再读 txid < xmin 的变更：读已提交下第二条语句的快照更新，这些事务的变更都已可见。
+    本页未满时水位线推进到 (xmin, 0)，不必等到下一次有变更；多个只读副本的xmin可能不同，水位线不会后退。
+    """
+    xmin = db.execute(SNAPSHOT_XMIN_SQL).scalar()
+    if after is None:
+        return [], (xmin, 0), False
+    rows = db.execute(changes_stmt(after, xmin, limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if has_more:
+        return rows, (rows[-1].txid, rows[-1].seq), True
+    return rows, max(after, (xmin, 0)), False
+
+
+def change_item(row) -> dict:
+    return {
+        "table": row.table_name, "op": row.op, "artifact_id": row.artifact_id, "caption_id": row.caption_id,
+        "change_time": row.change_time,
+    }
+
+
+def feed_response(rows: list, watermark: Watermark, has_more: bool) -> dict:
+    return {"items": [change_item(row) for row in rows], "watermark": encode_cursor(*watermark), "has_more": has_more}
+
+
+class ChangeNotifier:
+    """把监听线程收到的 change_log 通知转发给各个流式响应所在的事件循环"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters: Dict[asyncio.Event, asyncio.AbstractEventLoop] = {}
+
+    def register(self) -> asyncio.Event:
+        event = asyncio.Event()
+        with self._lock:
+            self._waiters[event] = asyncio.get_running_loop()
+        return event
+
+    def unregister(self, event: asyncio.Event) -> None:
+        with self._lock:
+            self._waiters.pop(event, None)
+
+    def notify(self, _payload: str = "") -> None:
+        with self._lock:
+            waiters = list(self._waiters.items())
+        for event, loop in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+
+change_notifier = ChangeNotifier()
+
+
+def register_listener(listener) -> None:
+    """收到通知时唤醒所有流；重连期间可能漏掉通知，重连后也唤醒一次"""
+    listener.subscribe(CHANGE_CHANNEL, change_notifier.notify)
+    listener.on_reconnect(change_notifier.notify)
+
+
+def _read_with_session(session_factory, after: Watermark, limit: int):
+    with session_factory() as db:
+        return read_changes(db, after, limit)
+
+
+def _sse_event(row) -> bytes:
+    data = json.dumps(change_item(row), default=str, separators=(",", ":"))
+    return f"id: {encode_cursor(row.txid, row.seq)}\nevent: change\ndata: {data}\n\n".encode("utf-8")
+
+
+async def stream_changes(session_factory, after: Optional[Watermark], batch_size: int, poll_seconds: float):
+    """SSE：先追上积压的变更，之后每收到通知（或最多 poll_seconds 秒）拉取一次
+
+    每个事件的id是该变更对应的水位线；没有变更但水位线推进时发送只有id的空事件，
+    客户端断线重连时（EventSource 自动带上 Last-Event-ID）从最新水位线继续。
+    数据库读取在线程池中用同步会话执行；等待通知时不占用线程和连接。
+    停机排空时结束流，客户端重连到其他副本后继续。
+    """
+    wake = change_notifier.register()
+    sent = None
+    try:
+        while not lifecycle.is_draining():
+            # 先清除再读取：读取期间到达的通知会让下一次等待立即返回
+            wake.clear()
+            rows, after, has_more = await run_in_threadpool(_read_with_session, session_factory, after, batch_size)
+            chunk = b"".join(_sse_event(row) for row in rows)
+            if not has_more and after != sent:
+                chunk += f"id: {encode_cursor(*after)}\n\n".encode("ascii")
+            sent = after
+            if chunk:
+                yield chunk
+            if has_more:
+                continue
+            try:
+                await asyncio.wait_for(wake.wait(), poll_seconds)
+            except asyncio.TimeoutError:
+                # 注释行作为心跳，防止代理因空闲断开连接
+                yield b": keep-alive\n\n"
+    finally:
+        change_notifier.unregister(wake)
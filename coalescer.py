@@ -0,0 +1,299 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+
+import config
+import models
+import schemas
+from database import AsyncSessionLocal, SessionLocal
+from metrics import REGISTRY, Histogram
+from preset_cache import preset_cache
+from queries import insert_many_returning, preset_caption_targets_stmt, text_any, update_returning
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = REGISTRY.register(Histogram(
+    "caption_coalesce_batch_size", "合并写入的每批描述条数", (),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+))
+
+
+def _missing_presets(db, preset_keys: List[str]) -> set:
+    """一条查询检查缓存中没有的预设，找到的写入预设缓存，返回不存在（或已删除）的preset_key"""
+    generations = {key: preset_cache.generation(key) for key in preset_keys}
+    unknown = [key for key in preset_keys if preset_cache.get(key) is None]
+    if not unknown:
+        return set()
+    presets = db.execute(select(models.CaptionPreset).where(
+        text_any(models.CaptionPreset.preset_key, unknown),
+        models.CaptionPreset.is_deleted == False
+    )).scalars().all()
+    for preset in presets:
+        preset_cache.put(schemas.CaptionPreset.model_validate(preset), generations[preset.preset_key])
+    return set(unknown) - {preset.preset_key for preset in presets}
+
+
+def flush_captions(db, items: List[dict]) -> List[object]:
+    """在一个事务中写入一批描述，按顺序返回每条的结果（行字典或HTTPException）
+
+    与逐条调用 create_caption 的结果一致：
+    - 预设不存在的条目返回404，不影响同批其他条目
+    - 没有preset_key的条目各插入一行，同一条多行 INSERT ... RETURNING
+    - 同一预设的条目依次覆盖该预设已有的描述（没有时由第一条插入）。最终行等于最后一条的内容，
+      只需一条 UPDATE（或随批量INSERT插入）；之前各条返回的是被自己覆盖后的行
+    """
+    results: List[object] = [None] * len(items)
+    missing = _missing_presets(db, sorted({item["preset_key"] for item in items if item["preset_key"]}))
+
+    plain: List[int] = []
+    groups: Dict[str, List[int]] = {}
+    for i, item in enumerate(items):
+        key = item["preset_key"]
+        if not key:
+            plain.append(i)
+        elif key in missing:
+            results[i] = HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"预设不存在: {key}")
+        else:
+            groups.setdefault(key, []).append(i)
+
+    final_rows: Dict[str, dict] = {}
+    if groups:
+        targets = dict(db.execute(preset_caption_targets_stmt(list(groups))).all())
+        for key, indexes in groups.items():
+            if key not in targets:
+                continue
+            row = db.execute(update_returning(
+                models.Caption,
+                (models.Caption.id == targets[key]) & (models.Caption.is_deleted == False),
+                items[indexes[-1]],
+            )).first()
+            if row is not None:
+                final_rows[key] = dict(row._mapping)
+
+    # 主键在这里生成，按id把 RETURNING 的行对应回请求
+    inserts: List[Tuple[object, dict]] = [(i, dict(items[i], id=uuid.uuid4())) for i in plain]
+    inserts += [(key, dict(items[indexes[-1]], id=uuid.uuid4())) for key, indexes in groups.items()
+                if key not in final_rows]
+    if inserts:
+        rows = db.execute(insert_many_returning(models.Caption, [values for _, values in inserts])).all()
+        by_id = {row.id: dict(row._mapping) for row in rows}
+        for target, values in inserts:
+            if isinstance(target, str):
+                final_rows[target] = by_id[values["id"]]
+            else:
+                results[target] = by_id[values["id"]]
+    db.commit()
+
+    for key, indexes in groups.items():
+        for i in indexes:
+            results[i] = dict(final_rows[key], **items[i])
+    return results
+
+
+def _failed(e: Exception) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"创建描述失败: {str(e)}")
+
+
+def _timed_out(timeout: float) -> HTTPException:
+    """等待超时：条目仍在队列或正在写入的批次中，之后可能成功提交，写入结果未知"""
+    logger.warning("等待合并写入超过 %.1f 秒，描述的写入结果未知", timeout)
+    return HTTPException(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        detail=f"等待写入超过 {timeout:g} 秒，写入结果未知：描述可能已经或稍后写入，请查询确认后再重试"
+    )
+
+
+def flush_or_isolate(db, items: List[dict]) -> List[object]:
+    """整批写入失败时回滚，再逐条各自提交，只让出错的条目失败"""
+    try:
+        return flush_captions(db, items)
+    except Exception as e:
+        db.rollback()
+        if len(items) == 1:
+            logger.error("创建描述时发生错误: %s", e)
+            return [_failed(e)]
+        logger.warning("合并写入 %d 条描述失败，改为逐条写入: %s", len(items), e)
+    results = []
+    for item in items:
+        try:
+            results.extend(flush_captions(db, [item]))
+        except Exception as e:
+            db.rollback()
+            logger.error("创建描述时发生错误: %s", e)
+            results.append(_failed(e))
+    return results
+
+
+class CaptionCoalescer:
+    """同步路由使用：请求线程把描述放入队列并等待结果，后台线程攒批后写入
+
+    取到第一条后最多再等待 max_wait 秒或攒满 max_items 条，用一个会话、一个事务写入。
+    """
+
+    def __init__(self, session_factory, max_wait: float, max_items: int, timeout: float = 30):
+        self.session_factory = session_factory
+        self.max_wait = max_wait
+        self.max_items = max_items
+        self.timeout = timeout
+        self._queue: "queue.Queue[Tuple[dict, Future]]" = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="caption-coalescer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout)
+            self._thread = None
+
+    def submit(self, item: dict) -> dict:
+        """返回写入后的行；失败时抛出对应的HTTPException
+
+        等待超过 timeout 秒时返回504，写入结果未知。
+        """
+        future: Future = Future()
+        self._queue.put((item, future))
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise _timed_out(self.timeout)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _collect(self) -> List[Tuple[dict, Future]]:
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_items:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        # 停止后把队列中剩余的条目写完再退出
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch: List[Tuple[dict, Future]]) -> None:
+        BATCH_SIZE.observe(len(batch))
+        try:
+            with self.session_factory() as db:
+                results = flush_or_isolate(db, [item for item, _ in batch])
+        except Exception as e:
+            results = [_failed(e)] * len(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+class AsyncCaptionCoalescer:
+    """异步路由使用：第一条到达时创建攒批任务，等待 max_wait 秒或攒满 max_items 条后写入
+
+    写入通过 AsyncSession.run_sync 复用 flush_captions。与同步版本的单个写入线程一样，同一时刻只写入一批：
+    同一预设的描述不会在两个并发事务中都被插入，写入期间到达的请求攒到下一批。
+    等待超过 timeout 秒的请求返回504（批次不取消，结果未知）；stop 立即写入并等待剩余的批次。
+    """
+
+    def __init__(self, session_factory, max_wait: float, max_items: int, timeout: float = 30):
+        self.session_factory = session_factory
+        self.max_wait = max_wait
+        self.max_items = max_items
+        self.timeout = timeout
+        self._pending: List[Tuple[dict, asyncio.Future]] = []
+        self._full: Optional[asyncio.Event] = None
+        self._task = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        # 写入批次可能接着为剩余条目创建下一个攒批任务，直到没有任务为止
+        while self._task is not None:
+            task = self._task
+            self._full.set()
+            await task
+
+    async def submit(self, item: dict) -> dict:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        if self._task is None:
+            self._full = asyncio.Event()
+            self._task = loop.create_task(self._collect())
+        elif len(self._pending) >= self.max_items:
+            self._full.set()
+        try:
+            # shield：超时只放弃等待，不取消future，批次写完时照常设置结果
+            result = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise _timed_out(self.timeout)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def _collect(self) -> None:
+        try:
+            await asyncio.wait_for(self._full.wait(), self.max_wait)
+        except asyncio.TimeoutError:
+            pass
+        async with self._flush_lock:
+            await self._take_and_flush()
+
+    async def _take_and_flush(self) -> None:
+        batch, self._pending = self._pending[:self.max_items], self._pending[self.max_items:]
+        if self._pending:
+            self._full = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._collect())
+        else:
+            self._task = None
+        await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[dict, asyncio.Future]]) -> None:
+        BATCH_SIZE.observe(len(batch))
+        try:
+            async with self.session_factory() as db:
+                results = await db.run_sync(flush_or_isolate, [item for item, _ in batch])
+        except Exception as e:
+            results = [_failed(e)] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+# CAPTION_COALESCE_ENABLED开启时由 POST /captions/ 使用，按DB_ASYNC选择同步或异步版本
+caption_coalescer = None
+if config.CAPTION_COALESCE_ENABLED:
+    if config.DB_ASYNC:
+        caption_coalescer = AsyncCaptionCoalescer(
+            AsyncSessionLocal, config.CAPTION_COALESCE_WAIT_MS / 1000, config.CAPTION_COALESCE_MAX_ITEMS,
+            config.CAPTION_COALESCE_TIMEOUT,
+        )
+    else:
+        caption_coalescer = CaptionCoalescer(
+            SessionLocal, config.CAPTION_COALESCE_WAIT_MS / 1000, config.CAPTION_COALESCE_MAX_ITEMS,
+            config.CAPTION_COALESCE_TIMEOUT,
+        )
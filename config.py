@@ -0,0 +1,97 @@
+import os
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# 数据库连接配置（可通过环境变量覆盖）
+DB_HOST = os.getenv("DB_HOST", 'pgm-uf69c9uhbi5m373gmo.pg.rds.aliyuncs.com')
+DB_PORT = int(os.getenv("DB_PORT", "5432"))
+DB_USER = os.getenv("DB_USER", 'image_owner')
+DB_PASSWORD = os.getenv("DB_PASSWORD", 'JG@w!B9DpkXMJdjC')
+DB_NAME = os.getenv("DB_NAME", 'imagedatabase')
+
+# 完整连接串，设置后优先于上面的分项配置
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+# 连接池配置：k8s多副本共享同一个RDS实例，需要按副本数分配连接数
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+# 每个进程一个连接池；serve.py 按CPU配额启动多个worker时会设置 WEB_CONCURRENCY
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+# 异步模式：使用 AsyncEngine + asyncpg，路由改为 async def（主库和每个副本再各多一个异步连接池）
+DB_ASYNC = _env_bool("DB_ASYNC", False)
+
+# 单个pod到主库的连接预算，设置后覆盖上面两项：先按worker数平分，
+# 每个worker扣除LISTEN连接（PRESET_CACHE_NOTIFY/CHANGES_LISTEN开启时1个），剩余的由同步和异步连接池平分
+DB_POOL_BUDGET = int(os.getenv("DB_POOL_BUDGET", "0"))
+if DB_POOL_BUDGET > 0:
+    _listen_connections = int(_env_bool("PRESET_CACHE_NOTIFY", False) or _env_bool("CHANGES_LISTEN", False))
+    _pools = 2 if DB_ASYNC else 1
+    _per_pool = max(2, (DB_POOL_BUDGET // WEB_CONCURRENCY - _listen_connections) // _pools)
+    DB_POOL_SIZE = max(1, _per_pool // 2)
+    DB_MAX_OVERFLOW = _per_pool - DB_POOL_SIZE
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # 获取连接的最长等待秒数
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))  # 连接最长存活秒数，-1为不回收
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", False)  # 取出连接前先探活
+
+# 预设缓存：TTL同时是跨副本读到旧配置的最长时间
+PRESET_CACHE_TTL = float(os.getenv("PRESET_CACHE_TTL", "30"))  # 秒，0为关闭缓存
+PRESET_CACHE_SIZE = int(os.getenv("PRESET_CACHE_SIZE", "1024"))
+# 通过PostgreSQL LISTEN/NOTIFY在副本间同步失效
+PRESET_CACHE_NOTIFY = _env_bool("PRESET_CACHE_NOTIFY", False)
+
+# SQL执行超过该毫秒数时记录慢查询日志（含发起查询的路由），0为关闭
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+
+# 条件GET：已序列化响应体的LRU容量，0为关闭
+ETAG_CACHE_SIZE = int(os.getenv("ETAG_CACHE_SIZE", "4096"))
+# 响应体缓存的过期秒数，同时是其他worker/副本在失效后仍返回旧响应体的最长时间，0为关闭
+ETAG_CACHE_TTL = float(os.getenv("ETAG_CACHE_TTL", "30"))
+
+# 软删除清理：后台定期物理删除超过保留期的软删除行
+PURGE_ENABLED = _env_bool("PURGE_ENABLED", False)
+PURGE_RETENTION_DAYS = float(os.getenv("PURGE_RETENTION_DAYS", "30"))
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "1000"))  # 每批删除的最大行数
+PURGE_BATCH_PAUSE = float(os.getenv("PURGE_BATCH_PAUSE", "0.2"))  # 批次间暂停秒数
+PURGE_INTERVAL = float(os.getenv("PURGE_INTERVAL", "3600"))  # 两轮清理之间的秒数
+
+# 只读副本：逗号分隔的连接串，未设置时所有查询走主库
+DB_REPLICA_URLS = [url.strip() for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url.strip()]
+DB_REPLICA_POOL_SIZE = int(os.getenv("DB_REPLICA_POOL_SIZE", str(DB_POOL_SIZE)))
+DB_REPLICA_HEALTH_INTERVAL = float(os.getenv("DB_REPLICA_HEALTH_INTERVAL", "5"))  # 健康检查间隔秒数
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "0"))  # 复制延迟超过该秒数视为不健康，0为不检查
+# 写请求成功后该秒数内，同一客户端（cookie）的读请求仍走主库，保证读到自己的写入
+READ_PRIMARY_STICKY_SECONDS = float(os.getenv("READ_PRIMARY_STICKY_SECONDS", "5"))
+
+# 启动预热：lifespan中预先建立连接并执行一遍热点查询，完成前 /readyz 返回503
+WARMUP_ENABLED = _env_bool("WARMUP_ENABLED", True)
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", str(DB_POOL_SIZE)))  # 每个连接池预先建立的连接数
+
+# serve.py：监听地址、worker数（默认按CPU配额）和停机
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+# 收到SIGTERM后先让 /readyz 返回503、继续处理请求的秒数，等待k8s把pod从Service端点中摘除
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "5"))
+# 排空结束后等待进行中请求完成的最长秒数
+SHUTDOWN_GRACEFUL_TIMEOUT = int(os.getenv("SHUTDOWN_GRACEFUL_TIMEOUT", "20"))
+
+# 描述写入合并：POST /captions/ 排队最多 CAPTION_COALESCE_WAIT_MS 毫秒或 CAPTION_COALESCE_MAX_ITEMS 条后，
+# 在一个事务中批量写入，再把各自的结果返回给对应请求
+CAPTION_COALESCE_ENABLED = _env_bool("CAPTION_COALESCE_ENABLED", False)
+CAPTION_COALESCE_WAIT_MS = float(os.getenv("CAPTION_COALESCE_WAIT_MS", "5"))
+CAPTION_COALESCE_MAX_ITEMS = int(os.getenv("CAPTION_COALESCE_MAX_ITEMS", "200"))
+# 请求等待写入结果的最长秒数，超时返回504（写入结果未知）
+CAPTION_COALESCE_TIMEOUT = float(os.getenv("CAPTION_COALESCE_TIMEOUT", "30"))
+
+# 变更日志：GET /changes/stream 通过 LISTEN change_log 及时推送，未开启或收不到通知时每 CHANGES_POLL_SECONDS 秒拉取一次
+CHANGES_LISTEN = _env_bool("CHANGES_LISTEN", False)
+CHANGES_POLL_SECONDS = float(os.getenv("CHANGES_POLL_SECONDS", "1"))
+# 清理任务（PURGE_ENABLED）同时删除超过该天数的变更日志，下游应在此期限内至少同步一次
+CHANGE_LOG_RETENTION_DAYS = float(os.getenv("CHANGE_LOG_RETENTION_DAYS", "7"))
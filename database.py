@@ -1,30 +1,150 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, MetaData, Table
+from sqlalchemy import create_engine, event, Column, Integer, String, Text, MetaData, Table
+from sqlalchemy.engine import URL, make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from fastapi import Request
+from typing import Optional
 
-# 数据库连接配置
-DB_HOST = 'pgm-uf69c9uhbi5m373gmo.pg.rds.aliyuncs.com'
-DB_PORT = 5432
-DB_USER = 'image_owner'
-DB_PASSWORD = 'JG@w!B9DpkXMJdjC'
-DB_NAME = 'imagedatabase'
+import config
+from pool_stats import InstrumentedAsyncQueuePool, InstrumentedQueuePool, register_pool
+from replicas import READ_ROUTING, Replica, ReplicaSet, mark_primary_session, register_gauge, wants_primary
+from request_metrics import after_cursor_execute, before_cursor_execute
 
-# 创建数据库URL
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# 创建数据库URL（使用URL.create，密码中的特殊字符无需转义）
+if config.DATABASE_URL:
+    DATABASE_URL = make_url(config.DATABASE_URL)
+else:
+    DATABASE_URL = URL.create(
+        "postgresql",
+        username=config.DB_USER,
+        password=config.DB_PASSWORD,
+        host=config.DB_HOST,
+        port=config.DB_PORT,
+        database=config.DB_NAME,
+    )
+
+# 连接池参数
+POOL_OPTIONS = dict(
+    pool_size=config.DB_POOL_SIZE,
+    max_overflow=config.DB_MAX_OVERFLOW,
+    pool_timeout=config.DB_POOL_TIMEOUT,
+    pool_recycle=config.DB_POOL_RECYCLE,
+    pool_pre_ping=config.DB_POOL_PRE_PING,
+)
+
+# LISTEN/NOTIFY使用独立的psycopg2连接
+LISTEN_DSN = DATABASE_URL.set(drivername="postgresql").render_as_string(hide_password=False)
 
 # 创建数据库引擎
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, poolclass=InstrumentedQueuePool, **POOL_OPTIONS)
+register_pool("primary", engine.pool)
+
+
+def instrument_engine(sync_engine):
+    """统计每个请求的SQL条数和耗时，并记录慢查询"""
+    event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+
+
+instrument_engine(engine)
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步引擎（仅在DB_ASYNC开启时创建，未安装asyncpg时同步模式不受影响）
+async_engine = None
+AsyncSessionLocal = None
+if config.DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    ASYNC_DATABASE_URL = DATABASE_URL.set(drivername="postgresql+asyncpg")
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=InstrumentedAsyncQueuePool, **POOL_OPTIONS)
+    register_pool("primary_async", async_engine.sync_engine.pool)
+    instrument_engine(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# 只读副本（DB_REPLICA_URLS），每个副本有独立的连接池；同步引擎同时用于健康检查
+REPLICA_POOL_OPTIONS = dict(POOL_OPTIONS, pool_size=config.DB_REPLICA_POOL_SIZE)
+_replicas = []
+for _index, _url in enumerate(config.DB_REPLICA_URLS):
+    _name = f"replica-{_index}"
+    _replica_url = make_url(_url).set(drivername="postgresql")
+    _engine = create_engine(_replica_url, poolclass=InstrumentedQueuePool, **REPLICA_POOL_OPTIONS)
+    register_pool(_name, _engine.pool)
+    instrument_engine(_engine)
+    _async_engine = _async_factory = None
+    if config.DB_ASYNC:
+        _async_engine = create_async_engine(
+            _replica_url.set(drivername="postgresql+asyncpg"), poolclass=InstrumentedAsyncQueuePool, **REPLICA_POOL_OPTIONS
+        )
+        register_pool(f"{_name}_async", _async_engine.sync_engine.pool)
+        instrument_engine(_async_engine.sync_engine)
+        _async_factory = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    _replicas.append(Replica(
+        _name, _engine, sessionmaker(autocommit=False, autoflush=False, bind=_engine), _async_engine, _async_factory
+    ))
+replica_set = ReplicaSet(_replicas, config.DB_REPLICA_HEALTH_INTERVAL, config.DB_REPLICA_MAX_LAG)
+register_gauge(replica_set)
+
 # 创建基础类
 Base = declarative_base()
 
-# 获取数据库会话
-def get_db():
+
+def all_engines():
+    """(同步引擎, 异步引擎)，键为连接池名称，用于启动预热和停机时关闭连接"""
+    sync_engines = {"primary": engine}
+    async_engines = {"primary_async": async_engine} if async_engine is not None else {}
+    for replica in replica_set.replicas:
+        sync_engines[replica.name] = replica.engine
+        if replica.async_engine is not None:
+            async_engines[f"{replica.name}_async"] = replica.async_engine
+    return sync_engines, async_engines
+
+
+def read_replica(request: Optional[Request] = None) -> Optional[Replica]:
+    """只读请求使用的副本；强制读主库、仍在写后粘滞窗口内或没有健康副本时返回None"""
+    if not replica_set.replicas or (request is not None and wants_primary(request)):
+        READ_ROUTING.inc("primary")
+        return None
+    replica = replica_set.choose()
+    READ_ROUTING.inc(replica.name if replica is not None else "primary")
+    return replica
+
+
+def read_session_factory(request: Optional[Request] = None):
+    replica = read_replica(request)
+    return replica.session_factory if replica is not None else SessionLocal
+
+
+def async_read_session_factory(request: Optional[Request] = None):
+    replica = read_replica(request)
+    return replica.async_session_factory if replica is not None else AsyncSessionLocal
+
+
+# 获取数据库会话（主库，读写）
+def get_db(request: Request):
+    mark_primary_session(request)
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# 获取只读会话：在健康的副本间轮询，未配置副本时使用主库
+def get_read_db(request: Request):
+    db = read_session_factory(request)()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# 获取异步数据库会话（主库，读写）
+async def get_async_db(request: Request):
+    mark_primary_session(request)
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# 获取异步只读会话
+async def get_async_read_db(request: Request):
+    async with async_read_session_factory(request)() as db:
+        yield db
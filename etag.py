@@ -0,0 +1,120 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from fastapi import Request, Response, status
+
+import config
+
+
+class BodyCache:
+    """按key缓存已序列化的响应体（TTL + LRU容量上限，线程安全）
+
+    每个条目带一个version，只有version与当前数据一致时才命中，
+    命中时直接返回 (etag, body)，跳过ORM加载和Pydantic序列化。
+    invalidate 只作用于当前进程，其他worker和副本依靠version变化或TTL过期读到新内容。
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Any, Tuple[float, Any, str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, key, version) -> Optional[Tuple[str, bytes]]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, cached_version, etag, body = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            if cached_version != version:
+                return None
+            self._entries.move_to_end(key)
+            return etag, body
+
+    def put(self, key, version, etag: str, body: bytes) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, version, etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def contains(self, key) -> bool:
+        """是否有未过期的条目（不比较version）"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] >= time.monotonic()
+
+    def invalidate(self, key) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+response_cache = BodyCache(config.ETAG_CACHE_TTL, config.ETAG_CACHE_SIZE)
+
+
+def artifact_etag(artifact_id, update_time: int, is_deleted: bool) -> str:
+    """图片ETag由update_time决定；update_time只由服务端写入，每次更新、软删除、批量删除时严格递增"""
+    return f'"a-{artifact_id}-{update_time}-{int(bool(is_deleted))}"'
+
+
+def content_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def serialize(schema_obj) -> bytes:
+    return schema_obj.model_dump_json().encode("utf-8")
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match 比较（弱比较，支持多个值和 *）"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def etag_response(request: Request, etag: str, body: Optional[bytes] = None) -> Response:
+    """命中If-None-Match时返回304，否则返回带ETag的JSON"""
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+def cached_response(request: Request, key, version) -> Optional[Response]:
+    """响应体缓存命中时直接返回（304或缓存的JSON），未命中返回None"""
+    cached = response_cache.get(key, version)
+    if cached is None:
+        return None
+    etag, body = cached
+    return etag_response(request, etag, body)
+
+
+def build_response(request: Request, key, version, body: bytes, etag: Optional[str] = None) -> Response:
+    """写入响应体缓存并返回；未指定etag时按内容哈希计算"""
+    etag = etag or content_etag(body)
+    response_cache.put(key, version, etag, body)
+    return etag_response(request, etag, body)
@@ -0,0 +1,143 @@
+"""检查热点查询的执行计划
+
+用各接口实际使用的查询构造函数生成语句，在 enable_seqscan=off 下执行 EXPLAIN，
+若计划中仍出现 Seq Scan，说明没有可用的索引，退出码为1。
+
+用法: python explain_check.py
+"""
+import json
+import sys
+import time
+from uuid import uuid4
+
+from psycopg2.extensions import register_adapter
+from psycopg2.extras import Json, register_uuid
+from sqlalchemy import select, text
+
+from database import engine
+import models
+import schemas
+import bulk
+from export import export_artifacts_stmt
+from buckets import BucketSpec, bucket_counts_stmt
+from fieldsets import field_columns
+from lineage import artifact_parents_stmt, artifact_tree_stmt
+from changes import changes_stmt
+from pagination import encode_cursor
+from purge import CHANGE_LOG_TRIM_SQL, cutoffs, purge_batch_sql, stamp_batch_sql
+from search import caption_search_stmt
+from queries import (
+    ArtifactFilters, JsonFilters, artifacts_page_stmt, presets_page_stmt, captions_page_stmt,
+    artifact_version_stmt, caption_row_stmt, md5_lookup_stmt
+)
+
+# 让psycopg2直接接受UUID、JSON参数（EXPLAIN语句绕过了SQLAlchemy的类型处理）
+register_uuid()
+register_adapter(dict, Json)
+
+
+def hot_queries() -> dict:
+    """接口名 -> 该接口执行的查询"""
+    now = int(time.time() * 1000)
+    some_id = uuid4()
+    purge_cutoffs = cutoffs(30)
+    artifact_columns = field_columns(models.Artifact, schemas.Artifact, None)
+    return {
+        "GET /artifacts/": artifacts_page_stmt(ArtifactFilters(), 0, 100, None),
+        "GET /artifacts/?cursor=": artifacts_page_stmt(ArtifactFilters(), 0, 100, encode_cursor(now, some_id)),
+        "GET /artifacts/?format=": artifacts_page_stmt(ArtifactFilters(format="png"), 0, 100, None),
+        "GET /artifacts/?include_deleted=true": artifacts_page_stmt(ArtifactFilters(include_deleted=True), 0, 100, None),
+        "GET /artifacts/{artifact_id}": artifact_version_stmt(models.Artifact.id == some_id),
+        "GET /artifacts/{artifact_id}/tree": artifact_tree_stmt(some_id, 3, False, artifact_columns, 1000),
+        # 需要迁移0008的children_id GIN索引
+        "GET /artifacts/{artifact_id}/parents": artifact_parents_stmt(some_id, 3, False, artifact_columns, 1000),
+        "GET /artifacts/md5/{md5}": artifact_version_stmt(models.Artifact.md5 == "0" * 32),
+        "POST /artifacts/md5/lookup": md5_lookup_stmt(["0" * 32, "1" * 32]),
+        # 需要迁移0007的宽高比、像素数索引
+        "GET /artifacts/?min_aspect=": artifacts_page_stmt(ArtifactFilters(min_aspect=1.7, max_aspect=1.8), 0, 100, None),
+        "GET /artifacts/?min_pixels=": artifacts_page_stmt(ArtifactFilters(min_pixels=8000000), 0, 100, None),
+        "GET /artifacts/buckets?resolutions=": bucket_counts_stmt(
+            ArtifactFilters(), BucketSpec(resolutions="1024x1024,1152x896,896x1152", pixel_edges="589824,1048576")
+        ),
+        "GET /artifacts/export?updated_since=": export_artifacts_stmt(ArtifactFilters(), now),
+        "GET /presets/": presets_page_stmt(False, 0, 100, None),
+        "GET /presets/?json_contains=": presets_page_stmt(
+            False, 0, 100, None, JsonFilters(json_contains='{"model": "gpt-4o"}').conditions(models.CaptionPreset.config)
+        ),
+        "GET /presets/{preset_key}": select(models.CaptionPreset).where(
+            models.CaptionPreset.preset_key == "preset", models.CaptionPreset.is_deleted == False
+        ),
+        "GET /captions/": captions_page_stmt(False, 0, 100, None),
+        "GET /captions/?cursor=": captions_page_stmt(False, 0, 100, encode_cursor(now, some_id)),
+        "GET /captions/?json_contains=": captions_page_stmt(
+            False, 0, 100, None, conditions=JsonFilters(json_contains='{"model": "gpt-4o"}').conditions(models.Caption.extra_data)
+        ),
+        # jsonb_path_ops 只能用于 jsonpath 中的等值条件
+        "GET /captions/?json_path=": captions_page_stmt(
+            False, 0, 100, None, conditions=JsonFilters(json_path='$.model ? (@ == "gpt-4o")').conditions(models.Caption.extra_data)
+        ),
+        # 需要热点键的表达式索引
+        "GET /captions/?json_key=elapsed_ms": captions_page_stmt(
+            False, 0, 100, None, conditions=JsonFilters(json_key="elapsed_ms", json_min=5000).conditions(models.Caption.extra_data)
+        ),
+        "GET /captions/{caption_id}": caption_row_stmt(some_id),
+        "GET /captions/search?q=": caption_search_stmt("red dress", "fts", None, 20, None),
+        "GET /captions/search?q=&cursor=": caption_search_stmt("red dress", "fts", None, 20, encode_cursor(0.5, some_id)),
+        # 需要迁移0004的pg_trgm索引
+        "GET /captions/search?mode=substring": caption_search_stmt("连衣裙", "substring", None, 20, None),
+        "GET /captions/preset/{preset_key}": select(models.Caption).where(
+            models.Caption.preset_key == "preset", models.Caption.is_deleted == False
+        ).limit(1),
+        "GET /artifact-caption-maps/artifact/{artifact_id}": select(models.ArtifactCaptionMap).where(
+            models.ArtifactCaptionMap.artifact_id == some_id
+        ),
+        "GET /artifact-caption-maps/caption/{caption_id}": select(models.ArtifactCaptionMap).where(
+            models.ArtifactCaptionMap.caption_id == some_id
+        ),
+        "POST /artifact-caption-maps/batch/": bulk.existing_ids_stmt(models.Caption.id, [some_id, uuid4()]),
+        # 需要迁移0006的变更日志表
+        "GET /changes?since=": changes_stmt((1000, 0), 2000, 1001),
+        "purge artifacts": text(purge_batch_sql("artifacts")).bindparams(cutoff=purge_cutoffs["artifacts"], batch_size=1000),
+        "purge captions": text(purge_batch_sql("captions")).bindparams(cutoff=purge_cutoffs["captions"], batch_size=1000),
+        "purge stamp artifacts": text(stamp_batch_sql("artifacts")).bindparams(now=purge_cutoffs["artifacts"], batch_size=1000),
+        "purge stamp captions": text(stamp_batch_sql("captions")).bindparams(now=purge_cutoffs["captions"], batch_size=1000),
+        "purge change_log": text(CHANGE_LOG_TRIM_SQL).bindparams(cutoff=purge_cutoffs["captions"], batch_size=1000),
+    }
+
+
+def seq_scans(plan: dict) -> list:
+    """递归收集计划树中的顺序扫描表名"""
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def explain(conn, stmt) -> dict:
+    # 内联 literal_execute 参数（如JSON键路径），与实际执行的语句一致
+    compiled = stmt.compile(dialect=engine.dialect, compile_kwargs={"render_postcompile": True})
+    result = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params).scalar()
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result[0]["Plan"]
+
+
+def main() -> int:
+    failed = 0
+    with engine.connect() as conn:
+        conn.exec_driver_sql("SET enable_seqscan = off")
+        for name, stmt in hot_queries().items():
+            scans = seq_scans(explain(conn, stmt))
+            if scans:
+                failed += 1
+                print(f"[SEQ SCAN] {name}: {', '.join(scans)}")
+            else:
+                print(f"[OK]       {name}")
+        conn.rollback()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+import json
+from typing import Iterator, Optional
+
+from sqlalchemy import select
+
+from database import SessionLocal
+import models
+from queries import ArtifactFilters
+
+# 每次从服务端游标取回的行数，决定导出时的内存占用上限
+EXPORT_BATCH_SIZE = 1000
+
+
+def export_artifacts_stmt(filters: ArtifactFilters, updated_since: Optional[int] = None):
+    """导出使用Core按列查询，不经过ORM identity map；不排序，按物理顺序输出"""
+    stmt = select(*models.Artifact.__table__.columns).where(*filters.conditions())
+    if updated_since is not None:
+        stmt = stmt.where(models.Artifact.update_time >= updated_since)
+    return stmt
+
+
+def _dumps(row: dict) -> bytes:
+    return json.dumps(row, default=str, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def stream_ndjson(stmt, batch_size: int = EXPORT_BATCH_SIZE, session_factory=SessionLocal) -> Iterator[bytes]:
+    """通过服务端游标（stream_results）逐批读取并输出NDJSON
+
+    会话在生成器内部创建，生命周期覆盖整个响应流，与请求依赖注入的会话无关；
+    session_factory 可以是只读副本的会话工厂。
+    """
+    db = session_factory()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=batch_size))
+        for rows in result.partitions():
+            yield b"".join(_dumps(dict(row._mapping)) for row in rows)
+    finally:
+        db.close()
@@ -0,0 +1,45 @@
+from typing import List, Optional
+
+import orjson
+from fastapi import HTTPException, status
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from sqlalchemy import null
+
+
+class RowsResponse(ORJSONResponse):
+    """orjson编码；asyncpg返回的UUID等非内置类型按字符串输出"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+def field_columns(model, schema: type[BaseModel], fields: Optional[str]) -> list:
+    """将 fields=a,b,c 解析为要查询的列；未指定时为schema的全部字段
+
+    schema中有但表中没有的字段输出null，与按schema序列化的结果一致。
+    """
+    names = list(schema.model_fields)
+    if fields:
+        requested = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+        unknown = [f for f in requested if f not in schema.model_fields]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"未知字段: {', '.join(unknown)}"
+            )
+        names = requested
+    table_columns = model.__table__.columns
+    return [table_columns[name] if name in table_columns else null().label(name) for name in names]
+
+
+def with_keys(columns: list, *keys) -> list:
+    """追加分页游标需要但未被请求的排序列，输出时会被去掉"""
+    names = {col.key for col in columns}
+    return columns + [key for key in keys if key.key not in names]
+
+
+def rows_response(rows: List, columns: list, headers: Optional[dict] = None) -> RowsResponse:
+    """Core行直接转dict交给orjson编码，跳过ORM对象和pydantic校验"""
+    names = [col.key for col in columns]
+    return RowsResponse([dict(zip(names, row)) for row in rows], headers=headers)
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from uuid import uuid4
+
+from sqlalchemy import select
+
+import models
+import schemas
+from fieldsets import field_columns, with_keys
+from queries import (
+    ArtifactFilters, artifact_version_stmt, artifacts_page_stmt, by_ids_stmt, caption_row_stmt, captions_page_stmt,
+    md5_lookup_stmt, presets_page_stmt,
+)
+
+logger = logging.getLogger(__name__)
+
+_ready = threading.Event()
+_draining = threading.Event()
+
+
+def mark_ready() -> None:
+    _ready.set()
+
+
+def start_draining() -> None:
+    _draining.set()
+
+
+def is_draining() -> bool:
+    return _draining.is_set()
+
+
+def is_ready() -> bool:
+    """预热完成且未进入停机排空"""
+    return _ready.is_set() and not _draining.is_set()
+
+
+def hot_statements() -> list:
+    """与各读接口形状一致的查询；执行一遍即填充引擎的编译缓存，首个请求不再编译SQL"""
+    some_id = uuid4()
+    artifact_columns = field_columns(models.Artifact, schemas.Artifact, None)
+    caption_columns = field_columns(models.Caption, schemas.Caption, None)
+    return [
+        artifacts_page_stmt(ArtifactFilters(), 0, 1, None,
+                            with_keys(artifact_columns, models.Artifact.upload_time, models.Artifact.id)),
+        captions_page_stmt(False, 0, 1, None, with_keys(caption_columns, models.Caption.upload_time, models.Caption.id)),
+        presets_page_stmt(False, 0, 1, None),
+        artifact_version_stmt(models.Artifact.id == some_id),
+        artifact_version_stmt(models.Artifact.md5 == "0" * 32),
+        caption_row_stmt(some_id),
+        select(models.CaptionPreset).where(
+            models.CaptionPreset.preset_key == "", models.CaptionPreset.is_deleted == False
+        ),
+        md5_lookup_stmt(["0" * 32]),
+        by_ids_stmt(models.Artifact, [some_id], False),
+        by_ids_stmt(models.Caption, [some_id], False),
+    ]
+
+
+def _pool_target(engine, connections: int) -> int:
+    """不超过pool_size，超出部分归还时会被关闭，预热没有意义"""
+    return max(0, min(connections, engine.pool.size()))
+
+
+def warm_engine(engine, connections: int) -> int:
+    """并发建立连接后归还给连接池，并在其中一条连接上执行热点查询；返回建立的连接数"""
+    count = _pool_target(engine, connections)
+    if count == 0:
+        return 0
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        conns = list(executor.map(lambda _: engine.connect(), range(count)))
+    try:
+        for stmt in hot_statements():
+            conns[0].execute(stmt).all()
+        conns[0].rollback()
+    finally:
+        for conn in conns:
+            conn.close()
+    return count
+
+
+async def warm_async_engine(engine, connections: int) -> int:
+    count = _pool_target(engine.sync_engine, connections)
+    if count == 0:
+        return 0
+    conns = await asyncio.gather(*[engine.connect() for _ in range(count)])
+    try:
+        for stmt in hot_statements():
+            (await conns[0].execute(stmt)).all()
+        await conns[0].rollback()
+    finally:
+        for conn in conns:
+            await conn.close()
+    return count
+
+
+async def warm_up(sync_engines: Dict[str, object], async_engines: Dict[str, object], connections: int) -> None:
+    """预热所有连接池；失败只记录日志，不阻止启动（数据库不可用时请求本来也会失败）"""
+    start = time.perf_counter()
+    report: List[str] = []
+    loop = asyncio.get_running_loop()
+    for name, engine in sync_engines.items():
+        try:
+            count = await loop.run_in_executor(None, warm_engine, engine, connections)
+            report.append(f"{name}={count}")
+        except Exception as e:
+            logger.warning("预热连接池 %s 失败: %s", name, e)
+    for name, engine in async_engines.items():
+        try:
+            count = await warm_async_engine(engine, connections)
+            report.append(f"{name}={count}")
+        except Exception as e:
+            logger.warning("预热连接池 %s 失败: %s", name, e)
+    logger.info("预热完成，耗时 %.0fms，连接数 %s", (time.perf_counter() - start) * 1000, ", ".join(report))
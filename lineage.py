@@ -0,0 +1,94 @@
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import Integer, any_, cast, literal, null, select
+from sqlalchemy.dialects.postgresql import UUID as PostgresUUID, array
+from sqlalchemy.orm import aliased
+
+import models
+from fieldsets import RowsResponse
+
+# 单次遍历的最大层数和最多返回的节点数
+TREE_DEPTH_MAX = 16
+TREE_NODES_MAX = 10000
+
+# 节点在图片列之外附加的列
+NODE_COLUMNS = ("depth", "from_id")
+
+
+def check_tree_params(depth: int, limit: int) -> None:
+    if not 0 < depth <= TREE_DEPTH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"depth 必须在 1 到 {TREE_DEPTH_MAX} 之间"
+        )
+    if not 0 < limit <= TREE_NODES_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"limit 必须在 1 到 {TREE_NODES_MAX} 之间"
+        )
+
+
+def _walk(artifact_id, depth: int, include_deleted: bool, edge):
+    """从 artifact_id 出发的递归CTE：(id, from_id, depth, children_id)
+
+    edge(node, cte) 返回沿一条边从 cte 中的行走到 node 的连接条件。
+    用 UNION 而不是 UNION ALL：经由多个节点到达同一节点（菱形）时，下一层的重复行被去掉，
+    行数与每层的边数成正比，而不是随路径数指数增长；环在 depth 上限处终止。
+    起点总是返回（与 GET /artifacts/{id} 一致），其余节点默认不含已删除的图片，已删除节点之后的部分不再遍历。
+    """
+    artifact = models.Artifact
+    walk = select(
+        artifact.id.label("id"),
+        cast(null(), PostgresUUID(as_uuid=True)).label("from_id"),
+        cast(literal(0), Integer).label("depth"),
+        artifact.children_id.label("children_id"),
+    ).where(artifact.id == artifact_id).cte("walk", recursive=True)
+
+    node = aliased(artifact, name="node")
+    step = select(
+        node.id, walk.c.id, walk.c.depth + 1, node.children_id
+    ).select_from(walk).join(node, edge(node, walk)).where(walk.c.depth < depth)
+    if not include_deleted:
+        step = step.where(node.is_deleted == False)
+    return walk.union(step)
+
+
+def _nodes_stmt(walk, columns: list, limit: int):
+    """展平的节点：每个节点只出现一次（取最浅的一层），图片列 + depth + from_id
+
+    按 (depth, from_id, id) 排序，同一节点的子节点（或父节点）相邻；多取一行用于判断是否截断。
+    """
+    nodes = select(walk.c.id, walk.c.depth, walk.c.from_id).distinct(walk.c.id).order_by(
+        walk.c.id, walk.c.depth, walk.c.from_id
+    ).subquery("nodes")
+    return select(*columns, nodes.c.depth, nodes.c.from_id).join_from(
+        models.Artifact, nodes, models.Artifact.id == nodes.c.id
+    ).order_by(nodes.c.depth, nodes.c.from_id, nodes.c.id).limit(limit + 1)
+
+
+def artifact_tree_stmt(artifact_id, depth: int, include_deleted: bool, columns: list, limit: int):
+    """沿 children_id 向下：子节点的 id 在上一层节点的 children_id 中（主键查找），from_id 为父节点"""
+    walk = _walk(
+        artifact_id, depth, include_deleted,
+        lambda node, walk: node.id == any_(walk.c.children_id),
+    )
+    return _nodes_stmt(walk, columns, limit)
+
+
+def artifact_parents_stmt(artifact_id, depth: int, include_deleted: bool, columns: list, limit: int):
+    """沿 children_id 向上：父节点的 children_id 包含上一层节点（children_id GIN索引，见迁移0008），from_id 为子节点"""
+    walk = _walk(
+        artifact_id, depth, include_deleted,
+        lambda node, walk: node.children_id.op("@>")(array([walk.c.id])),
+    )
+    return _nodes_stmt(walk, columns, limit)
+
+
+def tree_response(rows: List, columns: list, limit: int) -> Optional[RowsResponse]:
+    """{"nodes": [...], "truncated": bool}；起点不存在时返回None"""
+    if not rows:
+        return None
+    names = [col.key for col in columns] + list(NODE_COLUMNS)
+    return RowsResponse({
+        "nodes": [dict(zip(names, row)) for row in rows[:limit]],
+        "truncated": len(rows) > limit,
+    })
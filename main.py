@@ -1,26 +1,123 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import APIRouter, FastAPI, Depends, HTTPException, Request, Response, status
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
-from sqlalchemy import text
+from sqlalchemy import select, text
+from sqlalchemy.exc import IntegrityError
 from uuid import UUID
-import uvicorn
+from contextlib import asynccontextmanager
+import logging
 import time
 
-from database import engine, get_db, Base
+from database import engine, all_engines, get_db, get_read_db, read_session_factory, replica_set, Base, LISTEN_DSN
+import config
 import models
 import schemas
+from pagination import set_next_cursor
+from queries import (
+    ArtifactFilters, JsonFilters, artifact_version_stmt, by_ids_stmt, artifacts_page_stmt, caption_row_stmt, captions_page_stmt, chunked,
+    hard_delete_by_ids_stmt, insert_artifact_stmt, insert_map_stmt, insert_returning, json_filter_errors, md5_lookup_stmt, next_update_time, preset_caption_condition, presets_page_stmt,
+    soft_delete_by_ids_stmt, update_returning, upsert_preset_stmt, with_captions,
+)
+import bulk
+from fieldsets import RowsResponse, field_columns, rows_response, with_keys
+from search import SEARCH_ORDERS, caption_search_stmt, check_order, check_search_limit, resolve_mode
+from lineage import artifact_parents_stmt, artifact_tree_stmt, check_tree_params, tree_response
+from export import export_artifacts_stmt, stream_ndjson
+from buckets import BucketSpec, bucket_counts_stmt, bucket_ids_stmt, buckets_response, stream_bucket_ids
+from changes import (
+    check_limit, feed_response, parse_watermark, read_changes, register_listener as register_change_listener, stream_changes,
+)
+from metrics import REGISTRY
+from pool_stats import pools_report
+from request_metrics import RequestMetricsMiddleware
+from pg_listener import PgListener
+import lifecycle
+from purge import PurgeJob
+from replicas import ReadYourWritesMiddleware
+from coalescer import caption_coalescer
+from etag import (
+    artifact_etag, build_response, cached_response, etag_matches, etag_response, response_cache, serialize,
+)
+from preset_cache import notify_change, preset_cache, register_listener as register_preset_listener
+
+logger = logging.getLogger(__name__)
 
 # 创建数据库表（已经存在的不会重复创建）
 # Base.metadata.create_all(bind=engine)  # 注释掉，因为表已经存在
 
+# 跨副本通知监听（预设缓存失效、变更日志推送），没有订阅时不会建立连接
+listener = PgListener(LISTEN_DSN)
+if config.PRESET_CACHE_NOTIFY:
+    register_preset_listener(listener)
+if config.CHANGES_LISTEN:
+    register_change_listener(listener)
+
+# 软删除清理任务，PURGE_ENABLED开启时随应用启动，也可通过 POST /admin/purge 手动触发
+purge_job = PurgeJob(
+    engine,
+    retention_days=config.PURGE_RETENTION_DAYS,
+    batch_size=config.PURGE_BATCH_SIZE,
+    batch_pause=config.PURGE_BATCH_PAUSE,
+    interval=config.PURGE_INTERVAL,
+    change_log_retention_days=config.CHANGE_LOG_RETENTION_DAYS,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动：后台任务，然后预热连接池和热点查询，完成后 /readyz 才返回200
+    listener.start()
+    replica_set.start()
+    if config.PURGE_ENABLED:
+        purge_job.start()
+    if caption_coalescer is not None:
+        caption_coalescer.start()
+    sync_engines, async_engines = all_engines()
+    if config.WARMUP_ENABLED:
+        await lifecycle.warm_up(sync_engines, async_engines, config.WARMUP_CONNECTIONS)
+    lifecycle.mark_ready()
+    yield
+    # 停机：进行中的请求已经处理完（见serve.py），停止后台任务并关闭连接
+    lifecycle.start_draining()
+    listener.stop()
+    replica_set.stop()
+    purge_job.stop()
+    if caption_coalescer is not None:
+        if config.DB_ASYNC:
+            await caption_coalescer.stop()
+        else:
+            caption_coalescer.stop()
+    for sync_engine in sync_engines.values():
+        sync_engine.dispose()
+    for async_engine in async_engines.values():
+        await async_engine.dispose()
+
 # 初始化FastAPI应用
-app = FastAPI(title="Artifacts API", description="FastAPI与PostgreSQL的图片数据CRUD API")
+app = FastAPI(title="Artifacts API", description="FastAPI与PostgreSQL的图片数据CRUD API", lifespan=lifespan)
+app.add_middleware(RequestMetricsMiddleware)
+app.add_middleware(ReadYourWritesMiddleware, sticky_seconds=config.READ_PRIMARY_STICKY_SECONDS)
+
+# 图片/预设/描述/映射的同步路由；DB_ASYNC开启时由async_routes中的异步版本替代
+router = APIRouter()
 
 # 根路由 - 测试连接
 @app.get("/")
 def read_root():
     return {"status": "success", "message": "API正常运行"}
 
+# 存活探针：进程能处理请求即返回200，不访问数据库
+@app.get("/healthz")
+def read_health():
+    return {"status": "ok"}
+
+# 就绪探针：预热完成前和收到SIGTERM后的排空期间返回503，k8s据此摘除流量
+@app.get("/readyz")
+def read_ready():
+    if not lifecycle.is_ready():
+        state = "draining" if lifecycle.is_draining() else "starting"
+        return JSONResponse({"status": state}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return {"status": "ready"}
+
 @app.post("/test-connection/")
 def test_connection(db: Session = Depends(get_db)):
     try:
@@ -34,113 +131,253 @@ def test_connection(db: Session = Depends(get_db)):
             detail=f"数据库连接失败: {str(e)}"
         )
 
+# 连接池状态：已借出/空闲连接、溢出连接数、等待时间分布和超时次数，以及只读副本的健康状态
+@app.get("/admin/pool")
+def read_pool_stats():
+    return {"pools": pools_report(), "replicas": replica_set.status()}
+
+# 软删除清理进度：当前表、已执行批次和最近一次运行每张表删除的行数
+@app.get("/admin/purge")
+def read_purge_status():
+    return purge_job.status()
+
+# 立即运行一轮软删除清理（后台执行）
+@app.post("/admin/purge", status_code=status.HTTP_202_ACCEPTED)
+def trigger_purge():
+    if not purge_job.trigger():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="清理任务正在运行")
+    return purge_job.status()
+
+# Prometheus指标
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 # 创建新图片
-@app.post("/artifacts/", response_model=schemas.Artifact, status_code=status.HTTP_201_CREATED)
+@router.post("/artifacts/", response_model=schemas.Artifact, status_code=status.HTTP_201_CREATED)
 def create_artifact(artifact: schemas.ArtifactCreate, db: Session = Depends(get_db)):
+    # 创建图片，确保不包含aspect_ratio字段；md5冲突时不插入
+    artifact_dict = {k: v for k, v in artifact.model_dump().items() if k != 'aspect_ratio'}
+    try:
+        row = db.execute(insert_artifact_stmt(artifact_dict)).first()
+        existing_id = None
+        if row is None:
+            existing_id = db.execute(select(models.Artifact.id).where(models.Artifact.md5 == artifact.md5)).scalar()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.exception("创建图片时发生错误")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"创建图片失败: {str(e)}"
+        )
+
     # 检查MD5是否已存在
-    existing_artifact = db.query(models.Artifact).filter(models.Artifact.md5 == artifact.md5).first()
-    if existing_artifact:
+    if row is None:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
-            detail=f"具有相同MD5的图片已存在: {existing_artifact.id}"
+            detail=f"具有相同MD5的图片已存在: {existing_id}"
+        )
+    return dict(row._mapping)
+
+# 批量创建图片（按MD5服务端去重）
+@router.post("/artifacts/batch/", response_model=schemas.ArtifactBatchResult, status_code=status.HTTP_201_CREATED)
+def create_artifacts_batch(artifacts: List[schemas.ArtifactCreate], db: Session = Depends(get_db)):
+    if len(artifacts) > bulk.ARTIFACT_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"单次最多创建 {bulk.ARTIFACT_BATCH_MAX} 张图片"
         )
 
-    # 准备数据
     try:
-        # 创建Artifact对象，确保不包含aspect_ratio字段
-        artifact_dict = {k: v for k, v in artifact.model_dump().items() if k != 'aspect_ratio'}
-        db_artifact = models.Artifact(**artifact_dict)
+        rows = bulk.prepare_artifact_rows(artifacts)
+        created = {}
+        for chunk in chunked(rows, bulk.ARTIFACT_BATCH_CHUNK):
+            for artifact_id, md5 in db.execute(bulk.insert_artifacts_stmt(chunk)):
+                created[md5] = artifact_id
+
+        # 未插入的行即为重复，查询已存在图片的id
+        duplicate_md5s = [row["md5"] for row in rows if row["md5"] not in created]
+        existing = {}
+        if duplicate_md5s:
+            existing = dict(db.execute(bulk.existing_artifacts_stmt(duplicate_md5s)).all())
 
-        # 添加到数据库
-        db.add(db_artifact)
         db.commit()
-        db.refresh(db_artifact)
-
-        return db_artifact
+        return bulk.artifact_batch_result(artifacts, created, existing)
     except Exception as e:
         db.rollback()
-        print(f"创建图片时发生错误: {str(e)}")
+        logger.exception("批量创建图片时发生错误")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"创建图片失败: {str(e)}"
+            detail=f"批量创建图片失败: {str(e)}"
         )
 
 # 获取所有图片（支持分页和过滤）
-@app.get("/artifacts/", response_model=List[schemas.Artifact])
+@router.get("/artifacts/", response_model=List[schemas.Artifact])
 def read_artifacts(
     skip: int = 0,
     limit: int = 100,
-    format: Optional[str] = None,
-    min_width: Optional[int] = None,
-    max_width: Optional[int] = None,
-    min_height: Optional[int] = None,
-    max_height: Optional[int] = None,
-    include_deleted: bool = False,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    filters: ArtifactFilters = Depends(),
+    db: Session = Depends(get_read_db)
+):
+    # 只查询fields指定的列（默认全部），Core行直接由orjson编码
+    # 传入cursor时使用 (upload_time, id) 键集分页，否则兼容skip
+    columns = field_columns(models.Artifact, schemas.Artifact, fields)
+    stmt = artifacts_page_stmt(
+        filters, skip, limit, cursor, with_keys(columns, models.Artifact.upload_time, models.Artifact.id)
+    )
+    rows = db.execute(stmt).all()
+
+    response = rows_response(rows, columns)
+    set_next_cursor(response, rows, limit, "upload_time", "id")
+    return response
+
+# 获取图片列表及其描述（描述通过一条selectin查询批量加载）
+@router.get("/artifacts/full/", response_model=List[schemas.ArtifactWithCaptions])
+def read_artifacts_full(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    preset_key: Optional[str] = None,
+    filters: ArtifactFilters = Depends(),
+    db: Session = Depends(get_read_db)
 ):
-    query = db.query(models.Artifact)
-
-    # 应用过滤条件
-    if not include_deleted:
-        query = query.filter(models.Artifact.is_deleted == False)
-    if format:
-        query = query.filter(models.Artifact.format == format)
-    if min_width:
-        query = query.filter(models.Artifact.width >= min_width)
-    if max_width:
-        query = query.filter(models.Artifact.width <= max_width)
-    if min_height:
-        query = query.filter(models.Artifact.height >= min_height)
-    if max_height:
-        query = query.filter(models.Artifact.height <= max_height)
-
-    # 应用排序和分页
-    query = query.order_by(models.Artifact.upload_time.desc())
-    artifacts = query.offset(skip).limit(limit).all()
+    stmt = with_captions(artifacts_page_stmt(filters, skip, limit, cursor), preset_key)
+    artifacts = db.execute(stmt).scalars().all()
 
+    set_next_cursor(response, artifacts, limit, "upload_time", "id")
     return artifacts
 
-# 获取单个图片
-@app.get("/artifacts/{artifact_id}", response_model=schemas.Artifact)
-def read_artifact(artifact_id: UUID, db: Session = Depends(get_db)):
-    db_artifact = db.query(models.Artifact).filter(models.Artifact.id == artifact_id).first()
+# 按宽高比/分辨率、像素数分桶统计图片数量；ids=true 时以NDJSON流式输出每个桶的图片id
+@router.get("/artifacts/buckets", response_model=schemas.ArtifactBuckets)
+def read_artifact_buckets(
+    request: Request,
+    spec: BucketSpec = Depends(),
+    filters: ArtifactFilters = Depends(),
+    ids: bool = False,
+):
+    # 只取会话工厂：ids=true 时由流式生成器自己打开会话，不额外占用一个连接
+    session_factory = read_session_factory(request)
+    if ids:
+        return StreamingResponse(
+            stream_bucket_ids(bucket_ids_stmt(filters, spec), spec, session_factory=session_factory),
+            media_type="application/x-ndjson",
+        )
+    with session_factory() as db:
+        return buckets_response(db.execute(bucket_counts_stmt(filters, spec)).all(), spec)
+
+# 获取单个图片及其描述
+@router.get("/artifacts/{artifact_id}/full", response_model=schemas.ArtifactWithCaptions)
+def read_artifact_full(artifact_id: UUID, preset_key: Optional[str] = None, db: Session = Depends(get_read_db)):
+    stmt = with_captions(select(models.Artifact).where(models.Artifact.id == artifact_id), preset_key)
+    db_artifact = db.execute(stmt).scalars().first()
     if db_artifact is None:
         raise HTTPException(status_code=404, detail="图片不存在")
     return db_artifact
 
-# 更新图片
-@app.put("/artifacts/{artifact_id}", response_model=schemas.Artifact)
-def update_artifact(artifact_id: UUID, artifact: schemas.ArtifactUpdate, db: Session = Depends(get_db)):
-    db_artifact = db.query(models.Artifact).filter(models.Artifact.id == artifact_id).first()
-    if db_artifact is None:
+# 获取图片的派生树（沿children_id向下），一条递归CTE查询返回展平的节点及层数
+@router.get("/artifacts/{artifact_id}/tree", response_model=schemas.ArtifactTree)
+def read_artifact_tree(
+    artifact_id: UUID,
+    depth: int = 3,
+    limit: int = 1000,
+    include_deleted: bool = False,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    check_tree_params(depth, limit)
+    columns = field_columns(models.Artifact, schemas.Artifact, fields)
+    stmt = artifact_tree_stmt(artifact_id, depth, include_deleted, columns, limit)
+    response = tree_response(db.execute(stmt).all(), columns, limit)
+    if response is None:
         raise HTTPException(status_code=404, detail="图片不存在")
+    return response
+
+# 获取图片的来源（沿children_id向上查找父图片，使用children_id的GIN索引）
+@router.get("/artifacts/{artifact_id}/parents", response_model=schemas.ArtifactTree)
+def read_artifact_parents(
+    artifact_id: UUID,
+    depth: int = 3,
+    limit: int = 1000,
+    include_deleted: bool = False,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    check_tree_params(depth, limit)
+    columns = field_columns(models.Artifact, schemas.Artifact, fields)
+    stmt = artifact_parents_stmt(artifact_id, depth, include_deleted, columns, limit)
+    response = tree_response(db.execute(stmt).all(), columns, limit)
+    if response is None:
+        raise HTTPException(status_code=404, detail="图片不存在")
+    return response
 
-    # 更新时间戳
+# 获取单个图片
+@router.get("/artifacts/{artifact_id}", response_model=schemas.Artifact)
+def read_artifact(artifact_id: UUID, request: Request, db: Session = Depends(get_read_db)):
+    response = artifact_response(request, db, models.Artifact.id == artifact_id, artifact_id)
+    if response is None:
+        raise HTTPException(status_code=404, detail="图片不存在")
+    return response
+
+def artifact_response(request: Request, db: Session, condition, artifact_id: Optional[UUID] = None) -> Optional[Response]:
+    """按ETag返回304、缓存的响应体或重新序列化的图片；图片不存在时返回None
+
+    请求带If-None-Match或该图片的响应体已缓存时，先只查询版本列，304或缓存命中时不加载整行；
+    否则直接读取整行并从中取得版本，一次查询完成。
+    """
+    if request.headers.get("if-none-match") or response_cache.contains(("artifact", artifact_id)):
+        version = db.execute(artifact_version_stmt(condition)).first()
+        if version is None:
+            return None
+        etag = artifact_etag(version.id, version.update_time, version.is_deleted)
+        if etag_matches(request, etag):
+            return etag_response(request, etag)
+        response = cached_response(request, ("artifact", version.id), etag)
+        if response is not None:
+            return response
+        condition = models.Artifact.id == version.id
+    db_artifact = db.execute(select(models.Artifact).where(condition)).scalars().first()
+    if db_artifact is None:
+        return None
+    etag = artifact_etag(db_artifact.id, db_artifact.update_time, db_artifact.is_deleted)
+    key = ("artifact", db_artifact.id)
+    return build_response(request, key, etag, serialize(schemas.Artifact.model_validate(db_artifact)), etag)
+
+# 更新图片
+@router.put("/artifacts/{artifact_id}", response_model=schemas.Artifact)
+def update_artifact(artifact_id: UUID, artifact: schemas.ArtifactUpdate, db: Session = Depends(get_db)):
     update_data = artifact.model_dump(exclude_unset=True)
 
     # 移除aspect_ratio字段（这是数据库生成列）
-    if "aspect_ratio" in update_data:
-        del update_data["aspect_ratio"]
+    update_data.pop("aspect_ratio", None)
+    # update_time由服务端维护（图片ETag由它决定），忽略请求中的值；没有要更新的字段时不改动
+    update_data.pop("update_time", None)
+    if update_data:
+        update_data["update_time"] = next_update_time()
 
     try:
-        # 更新图片属性，确保不更新aspect_ratio
-        for key, value in update_data.items():
-            if key != "aspect_ratio":  # 额外检查，确保不设置aspect_ratio
-                setattr(db_artifact, key, value)
-
-        db.commit()
-        db.refresh(db_artifact)
-        return db_artifact
+        # UPDATE ... RETURNING 一次往返完成更新并取回新行
+        row = db.execute(update_returning(models.Artifact, models.Artifact.id == artifact_id, update_data)).first()
+        if row is not None:
+            db.commit()
+            response_cache.invalidate(("artifact", artifact_id))
     except Exception as e:
         db.rollback()
-        print(f"更新图片时发生错误: {str(e)}")
+        logger.exception("更新图片时发生错误")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"更新图片失败: {str(e)}"
         )
 
+    if row is None:
+        raise HTTPException(status_code=404, detail="图片不存在")
+    return dict(row._mapping)
+
 # 软删除图片
-@app.delete("/artifacts/{artifact_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/artifacts/{artifact_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_artifact(artifact_id: UUID, permanent: bool = False, db: Session = Depends(get_db)):
     db_artifact = db.query(models.Artifact).filter(models.Artifact.id == artifact_id).first()
     if db_artifact is None:
@@ -153,104 +390,110 @@ def delete_artifact(artifact_id: UUID, permanent: bool = False, db: Session = De
         # 软删除
         db_artifact.is_deleted = True
         db_artifact.deleted_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
+        db_artifact.update_time = next_update_time()
 
     db.commit()
+    response_cache.invalidate(("artifact", artifact_id))
     return None
 
 # 根据MD5查找图片
-@app.get("/artifacts/md5/{md5}", response_model=schemas.Artifact)
-def get_artifact_by_md5(md5: str, db: Session = Depends(get_db)):
-    db_artifact = db.query(models.Artifact).filter(models.Artifact.md5 == md5).first()
-    if db_artifact is None:
+@router.get("/artifacts/md5/{md5}", response_model=schemas.Artifact)
+def get_artifact_by_md5(md5: str, request: Request, db: Session = Depends(get_read_db)):
+    response = artifact_response(request, db, models.Artifact.md5 == md5)
+    if response is None:
         raise HTTPException(status_code=404, detail="未找到具有此MD5的图片")
-    return db_artifact
+    return response
 
 # Caption Preset API
-@app.post("/presets/", response_model=schemas.CaptionPreset, status_code=status.HTTP_201_CREATED)
+@router.post("/presets/", response_model=schemas.CaptionPreset, status_code=status.HTTP_201_CREATED)
 def create_preset(preset: schemas.CaptionPresetCreate, db: Session = Depends(get_db)):
-    # 检查预设是否已存在
-    existing_preset = db.query(models.CaptionPreset).filter(models.CaptionPreset.preset_key == preset.preset_key).first()
-    if existing_preset and not existing_preset.is_deleted:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail=f"具有相同键的预设已存在: {preset.preset_key}"
-        )
-
-    # 如果存在但已删除，则恢复并更新
-    if existing_preset and existing_preset.is_deleted:
-        for key, value in preset.model_dump().items():
-            setattr(existing_preset, key, value)
-        existing_preset.is_deleted = False
-        existing_preset.deleted_time = None
-        db.commit()
-        db.refresh(existing_preset)
-        return existing_preset
-
-    # 创建新预设
+    # 创建新预设；如果存在但已删除，则恢复并更新；存在且未删除时不返回行
     try:
-        db_preset = models.CaptionPreset(**preset.model_dump())
-        db.add(db_preset)
-        db.commit()
-        db.refresh(db_preset)
-        return db_preset
+        row = db.execute(upsert_preset_stmt(preset.model_dump())).first()
+        if row is not None:
+            notify_change(db, preset.preset_key)
+            db.commit()
+            preset_cache.invalidate(preset.preset_key)
     except Exception as e:
         db.rollback()
-        print(f"创建预设时发生错误: {str(e)}")
+        logger.exception("创建预设时发生错误")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"创建预设失败: {str(e)}"
         )
 
-@app.get("/presets/", response_model=List[schemas.CaptionPreset])
-def read_presets(skip: int = 0, limit: int = 100, include_deleted: bool = False, db: Session = Depends(get_db)):
-    query = db.query(models.CaptionPreset)
-
-    # 应用过滤条件
-    if not include_deleted:
-        query = query.filter(models.CaptionPreset.is_deleted == False)
-
-    # 应用排序和分页
-    query = query.order_by(models.CaptionPreset.create_time.desc())
-    presets = query.offset(skip).limit(limit).all()
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"具有相同键的预设已存在: {preset.preset_key}"
+        )
+    return dict(row._mapping)
 
+@router.get("/presets/", response_model=List[schemas.CaptionPreset])
+def read_presets(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    include_deleted: bool = False,
+    cursor: Optional[str] = None,
+    json_filters: JsonFilters = Depends(),
+    db: Session = Depends(get_read_db)
+):
+    # 传入cursor时使用 (create_time, preset_key) 键集分页；json_*参数按config过滤
+    stmt = presets_page_stmt(
+        include_deleted, skip, limit, cursor, json_filters.conditions(models.CaptionPreset.config)
+    )
+    with json_filter_errors():
+        presets = db.execute(stmt).scalars().all()
+
+    set_next_cursor(response, presets, limit, "create_time", "preset_key")
     return presets
 
-@app.get("/presets/{preset_key}", response_model=schemas.CaptionPreset)
-def read_preset(preset_key: str, db: Session = Depends(get_db)):
-    db_preset = db.query(models.CaptionPreset).filter(
-        models.CaptionPreset.preset_key == preset_key,
-        models.CaptionPreset.is_deleted == False
-    ).first()
+@router.get("/presets/{preset_key}", response_model=schemas.CaptionPreset)
+def read_preset(preset_key: str, request: Request, db: Session = Depends(get_db)):
+    generation = preset_cache.generation(preset_key)
+    preset = preset_cache.get(preset_key)
+    if preset is None:
+        db_preset = db.query(models.CaptionPreset).filter(
+            models.CaptionPreset.preset_key == preset_key,
+            models.CaptionPreset.is_deleted == False
+        ).first()
 
-    if db_preset is None:
-        raise HTTPException(status_code=404, detail="预设不存在")
+        if db_preset is None:
+            raise HTTPException(status_code=404, detail="预设不存在")
 
-    return db_preset
+        preset = schemas.CaptionPreset.model_validate(db_preset)
+        preset_cache.put(preset, generation)
 
-@app.put("/presets/{preset_key}", response_model=schemas.CaptionPreset)
-def update_preset(preset_key: str, preset: schemas.CaptionPresetUpdate, db: Session = Depends(get_db)):
-    db_preset = db.query(models.CaptionPreset).filter(models.CaptionPreset.preset_key == preset_key).first()
-    if db_preset is None:
-        raise HTTPException(status_code=404, detail="预设不存在")
+    # ETag为响应内容哈希，预设未变化时复用已序列化的响应体
+    key = ("preset", preset_key)
+    return cached_response(request, key, preset) or build_response(request, key, preset, serialize(preset))
 
+@router.put("/presets/{preset_key}", response_model=schemas.CaptionPreset)
+def update_preset(preset_key: str, preset: schemas.CaptionPresetUpdate, db: Session = Depends(get_db)):
     try:
         # 更新预设属性
         update_data = preset.model_dump(exclude_unset=True)
-        for key, value in update_data.items():
-            setattr(db_preset, key, value)
-
-        db.commit()
-        db.refresh(db_preset)
-        return db_preset
+        row = db.execute(update_returning(
+            models.CaptionPreset, models.CaptionPreset.preset_key == preset_key, update_data
+        )).first()
+        if row is not None:
+            notify_change(db, preset_key)
+            db.commit()
+            preset_cache.invalidate(preset_key)
     except Exception as e:
         db.rollback()
-        print(f"更新预设时发生错误: {str(e)}")
+        logger.exception("更新预设时发生错误")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"更新预设失败: {str(e)}"
         )
 
-@app.delete("/presets/{preset_key}", status_code=status.HTTP_204_NO_CONTENT)
+    if row is None:
+        raise HTTPException(status_code=404, detail="预设不存在")
+    return dict(row._mapping)
+
+@router.delete("/presets/{preset_key}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_preset(preset_key: str, permanent: bool = False, db: Session = Depends(get_db)):
     db_preset = db.query(models.CaptionPreset).filter(models.CaptionPreset.preset_key == preset_key).first()
     if db_preset is None:
@@ -265,22 +508,29 @@ def delete_preset(preset_key: str, permanent: bool = False, db: Session = Depend
             db_preset.is_deleted = True
             db_preset.deleted_time = int(time.time() * 1000)  # 使用毫秒时间戳
 
+        notify_change(db, preset_key)
         db.commit()
+        preset_cache.invalidate(preset_key)
         return None
     except Exception as e:
         db.rollback()
-        print(f"删除预设时发生错误: {str(e)}")
+        logger.exception("删除预设时发生错误")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"删除预设失败: {str(e)}"
         )
 
 # Caption API
-@app.post("/captions/", response_model=schemas.Caption, status_code=status.HTTP_201_CREATED)
+@router.post("/captions/", response_model=schemas.Caption, status_code=status.HTTP_201_CREATED)
 def create_caption(caption: schemas.CaptionCreate, db: Session = Depends(get_db)):
 
-    # 如果指定了preset_key，检查预设是否存在
-    if caption.preset_key:
+    # 开启写入合并时与其他请求攒成一批写入（见coalescer.py），结果与下面的逐条写入一致
+    if caption_coalescer is not None:
+        return caption_coalescer.submit(caption.model_dump())
+
+    # 如果指定了preset_key，检查预设是否存在（优先使用预设缓存）
+    generation = preset_cache.generation(caption.preset_key) if caption.preset_key else None
+    if caption.preset_key and preset_cache.get(caption.preset_key) is None:
         db_preset = db.query(models.CaptionPreset).filter(
             models.CaptionPreset.preset_key == caption.preset_key,
             models.CaptionPreset.is_deleted == False
@@ -290,68 +540,89 @@ def create_caption(caption: schemas.CaptionCreate, db: Session = Depends(get_db)
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"预设不存在: {caption.preset_key}"
             )
+        preset_cache.put(schemas.CaptionPreset.model_validate(db_preset), generation)
 
-    # 检查是否已存在相同预设的描述
-    if caption.preset_key:
-        existing_caption = db.query(models.Caption).filter(
-            models.Caption.preset_key == caption.preset_key,
-            models.Caption.is_deleted == False
-        ).first()
-
-        # 如果存在，则更新
-        if existing_caption:
-            update_data = caption.model_dump(exclude={"id"} if hasattr(caption, "id") else set())
-            for key, value in update_data.items():
-                setattr(existing_caption, key, value)
-
-            db.commit()
-            db.refresh(existing_caption)
-            return existing_caption
-
-    # 创建新描述
     try:
         caption_dict = caption.model_dump()
-        db_caption = models.Caption(**caption_dict)
-        db.add(db_caption)
+        row = None
+        # 如果已存在相同预设的描述，则更新（UPDATE ... RETURNING）
+        if caption.preset_key:
+            row = db.execute(update_returning(
+                models.Caption, preset_caption_condition(caption.preset_key), caption_dict
+            )).first()
+
+        # 创建新描述
+        if row is None:
+            row = db.execute(insert_returning(models.Caption, caption_dict)).first()
         db.commit()
-        db.refresh(db_caption)
-        return db_caption
+        return dict(row._mapping)
     except Exception as e:
         db.rollback()
-        print(f"创建描述时发生错误: {str(e)}")
+        logger.exception("创建描述时发生错误")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"创建描述失败: {str(e)}"
         )
 
-@app.get("/captions/", response_model=List[schemas.Caption])
-def read_captions(skip: int = 0, limit: int = 100, include_deleted: bool = False, db: Session = Depends(get_db)):
-    query = db.query(models.Caption)
-
-    # 应用过滤条件
-    if not include_deleted:
-        query = query.filter(models.Caption.is_deleted == False)
-
-    # 应用排序和分页
-    query = query.order_by(models.Caption.upload_time.desc())
-    captions = query.offset(skip).limit(limit).all()
+@router.get("/captions/", response_model=List[schemas.Caption])
+def read_captions(
+    skip: int = 0,
+    limit: int = 100,
+    include_deleted: bool = False,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    json_filters: JsonFilters = Depends(),
+    db: Session = Depends(get_read_db)
+):
+    # 传入cursor时使用 (upload_time, id) 键集分页；只查询fields指定的列；json_*参数按extra_data过滤
+    columns = field_columns(models.Caption, schemas.Caption, fields)
+    stmt = captions_page_stmt(
+        include_deleted, skip, limit, cursor, with_keys(columns, models.Caption.upload_time, models.Caption.id),
+        json_filters.conditions(models.Caption.extra_data),
+    )
+    with json_filter_errors():
+        rows = db.execute(stmt).all()
+
+    response = rows_response(rows, columns)
+    set_next_cursor(response, rows, limit, "upload_time", "id")
+    return response
+
+# 搜索描述文本：英文走全文搜索，含中日韩字符走子串匹配，按相关度（order=recent时按上传时间）排序，通过 X-Next-Cursor 翻页
+@router.get("/captions/search", response_model=List[schemas.CaptionSearchResult])
+def search_captions(
+    q: str,
+    preset_key: Optional[str] = None,
+    mode: str = "auto",
+    order: str = "rank",
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    stmt = caption_search_stmt(
+        q, resolve_mode(q, mode), preset_key, check_search_limit(limit), cursor, check_order(order)
+    )
+    rows = db.execute(stmt).all()
 
-    return captions
+    response = RowsResponse([dict(row._mapping, artifact_ids=row.artifact_ids or []) for row in rows])
+    set_next_cursor(response, rows, limit, *SEARCH_ORDERS[order])
+    return response
 
-@app.get("/captions/{caption_id}", response_model=schemas.Caption)
-def read_caption(caption_id: UUID, db: Session = Depends(get_db)):
-    db_caption = db.query(models.Caption).filter(
-        models.Caption.id == caption_id,
-        models.Caption.is_deleted == False
-    ).first()
+@router.get("/captions/{caption_id}", response_model=schemas.Caption)
+def read_caption(caption_id: UUID, request: Request, db: Session = Depends(get_read_db)):
+    # 使用Core读取整行，行内容未变化时复用已序列化的响应体（ETag为内容哈希）
+    row = db.execute(caption_row_stmt(caption_id)).first()
 
-    if db_caption is None:
+    if row is None:
         raise HTTPException(status_code=404, detail="描述不存在")
 
-    return db_caption
+    key = ("caption", caption_id)
+    version = tuple(row)
+    return cached_response(request, key, version) or build_response(
+        request, key, version, serialize(schemas.Caption.model_validate(dict(row._mapping)))
+    )
 
-@app.get("/captions/preset/{preset_key}", response_model=schemas.Caption)
-def read_caption_by_preset(preset_key: str, db: Session = Depends(get_db)):
+@router.get("/captions/preset/{preset_key}", response_model=schemas.Caption)
+def read_caption_by_preset(preset_key: str, db: Session = Depends(get_read_db)):
     db_caption = db.query(models.Caption).filter(
         models.Caption.preset_key == preset_key,
         models.Caption.is_deleted == False
@@ -362,30 +633,27 @@ def read_caption_by_preset(preset_key: str, db: Session = Depends(get_db)):
 
     return db_caption
 
-@app.put("/captions/{caption_id}", response_model=schemas.Caption)
+@router.put("/captions/{caption_id}", response_model=schemas.Caption)
 def update_caption(caption_id: UUID, caption: schemas.CaptionUpdate, db: Session = Depends(get_db)):
-    db_caption = db.query(models.Caption).filter(models.Caption.id == caption_id).first()
-    if db_caption is None:
-        raise HTTPException(status_code=404, detail="描述不存在")
-
     try:
         # 更新描述属性
         update_data = caption.model_dump(exclude_unset=True)
-        for key, value in update_data.items():
-            setattr(db_caption, key, value)
-
-        db.commit()
-        db.refresh(db_caption)
-        return db_caption
+        row = db.execute(update_returning(models.Caption, models.Caption.id == caption_id, update_data)).first()
+        if row is not None:
+            db.commit()
     except Exception as e:
         db.rollback()
-        print(f"更新描述时发生错误: {str(e)}")
+        logger.exception("更新描述时发生错误")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"更新描述失败: {str(e)}"
         )
 
-@app.delete("/captions/{caption_id}", status_code=status.HTTP_204_NO_CONTENT)
+    if row is None:
+        raise HTTPException(status_code=404, detail="描述不存在")
+    return dict(row._mapping)
+
+@router.delete("/captions/{caption_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_caption(caption_id: UUID, permanent: bool = False, db: Session = Depends(get_db)):
     db_caption = db.query(models.Caption).filter(models.Caption.id == caption_id).first()
     if db_caption is None:
@@ -404,78 +672,79 @@ def delete_caption(caption_id: UUID, permanent: bool = False, db: Session = Depe
         return None
     except Exception as e:
         db.rollback()
-        print(f"删除描述时发生错误: {str(e)}")
+        logger.exception("删除描述时发生错误")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"删除描述失败: {str(e)}"
         )
 
 # ArtifactCaptionMap API
-@app.post("/artifact-caption-maps/", response_model=schemas.ArtifactCaptionMap, status_code=status.HTTP_201_CREATED)
+@router.post("/artifact-caption-maps/", response_model=schemas.ArtifactCaptionMap, status_code=status.HTTP_201_CREATED)
 def create_artifact_caption_map(map_data: schemas.ArtifactCaptionMapCreate, db: Session = Depends(get_db)):
-    # 检查图片是否存在
-    db_artifact = db.query(models.Artifact).filter(models.Artifact.id == map_data.artifact_id).first()
-    if db_artifact is None:
+    # 创建新映射；图片或描述不存在时由外键约束报错，只在出错后再查询是哪一个不存在
+    try:
+        row = db.execute(insert_map_stmt(map_data.model_dump())).first()
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        # 检查图片是否存在
+        if db.get(models.Artifact, map_data.artifact_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"图片不存在: {map_data.artifact_id}"
+            )
+        # 检查描述是否存在
+        if db.get(models.Caption, map_data.caption_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"描述不存在: {map_data.caption_id}"
+            )
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"图片不存在: {map_data.artifact_id}"
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="创建映射失败"
         )
-
-    # 检查描述是否存在
-    db_caption = db.query(models.Caption).filter(models.Caption.id == map_data.caption_id).first()
-    if db_caption is None:
+    except Exception as e:
+        db.rollback()
+        logger.exception("创建映射时发生错误")
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"描述不存在: {map_data.caption_id}"
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"创建映射失败: {str(e)}"
         )
 
-    # 检查映射是否已存在
-    existing_map = db.query(models.ArtifactCaptionMap).filter(
-        models.ArtifactCaptionMap.artifact_id == map_data.artifact_id,
-        models.ArtifactCaptionMap.caption_id == map_data.caption_id
-    ).first()
-
-    if existing_map:
+    # 映射已存在时不插入、不返回行
+    if row is None:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"图片 {map_data.artifact_id} 与描述 {map_data.caption_id} 的映射已存在"
         )
+    return dict(row._mapping)
 
-    # 创建新映射
-    try:
-        db_map = models.ArtifactCaptionMap(**map_data.model_dump())
-        db.add(db_map)
-        db.commit()
-        db.refresh(db_map)
-        return db_map
-    except Exception as e:
-        db.rollback()
-        print(f"创建映射时发生错误: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"创建映射失败: {str(e)}"
-        )
-
-@app.get("/artifact-caption-maps/", response_model=List[schemas.ArtifactCaptionMap])
-def read_artifact_caption_maps(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    maps = db.query(models.ArtifactCaptionMap).offset(skip).limit(limit).all()
-    return maps
+@router.get("/artifact-caption-maps/", response_model=List[schemas.ArtifactCaptionMap])
+def read_artifact_caption_maps(
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    columns = field_columns(models.ArtifactCaptionMap, schemas.ArtifactCaptionMap, fields)
+    rows = db.execute(select(*columns).offset(skip).limit(limit)).all()
+    return rows_response(rows, columns)
 
-@app.get("/artifact-caption-maps/artifact/{artifact_id}", response_model=List[schemas.ArtifactCaptionMap])
-def read_maps_by_artifact(artifact_id: UUID, db: Session = Depends(get_db)):
+@router.get("/artifact-caption-maps/artifact/{artifact_id}", response_model=List[schemas.ArtifactCaptionMap])
+def read_maps_by_artifact(artifact_id: UUID, db: Session = Depends(get_read_db)):
     maps = db.query(models.ArtifactCaptionMap).filter(
         models.ArtifactCaptionMap.artifact_id == artifact_id
     ).all()
     return maps
 
-@app.get("/artifact-caption-maps/caption/{caption_id}", response_model=List[schemas.ArtifactCaptionMap])
-def read_maps_by_caption(caption_id: UUID, db: Session = Depends(get_db)):
+@router.get("/artifact-caption-maps/caption/{caption_id}", response_model=List[schemas.ArtifactCaptionMap])
+def read_maps_by_caption(caption_id: UUID, db: Session = Depends(get_read_db)):
     maps = db.query(models.ArtifactCaptionMap).filter(
         models.ArtifactCaptionMap.caption_id == caption_id
     ).all()
     return maps
 
-@app.delete("/artifact-caption-maps/{artifact_id}/{caption_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/artifact-caption-maps/{artifact_id}/{caption_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_artifact_caption_map(artifact_id: UUID, caption_id: UUID, db: Session = Depends(get_db)):
     db_map = db.query(models.ArtifactCaptionMap).filter(
         models.ArtifactCaptionMap.artifact_id == artifact_id,
@@ -494,57 +763,34 @@ def delete_artifact_caption_map(artifact_id: UUID, caption_id: UUID, db: Session
         return None
     except Exception as e:
         db.rollback()
-        print(f"删除映射时发生错误: {str(e)}")
+        logger.exception("删除映射时发生错误")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"删除映射失败: {str(e)}"
         )
 
 # 批量创建映射
-@app.post("/artifact-caption-maps/batch/", response_model=Dict[str, Any], status_code=status.HTTP_201_CREATED)
+@router.post("/artifact-caption-maps/batch/", response_model=Dict[str, Any], status_code=status.HTTP_201_CREATED)
 def create_artifact_caption_maps_batch(maps_data: List[schemas.ArtifactCaptionMapCreate], db: Session = Depends(get_db)):
-    created_count = 0
-    skipped_count = 0
-    errors = []
-
-    for map_data in maps_data:
-        try:
-            # 检查图片是否存在
-            db_artifact = db.query(models.Artifact).filter(models.Artifact.id == map_data.artifact_id).first()
-            if db_artifact is None:
-                errors.append(f"图片不存在: {map_data.artifact_id}")
-                continue
-
-            # 检查描述是否存在
-            db_caption = db.query(models.Caption).filter(models.Caption.id == map_data.caption_id).first()
-            if db_caption is None:
-                errors.append(f"描述不存在: {map_data.caption_id}")
-                continue
-
-            # 检查映射是否已存在
-            existing_map = db.query(models.ArtifactCaptionMap).filter(
-                models.ArtifactCaptionMap.artifact_id == map_data.artifact_id,
-                models.ArtifactCaptionMap.caption_id == map_data.caption_id
-            ).first()
-
-            if existing_map:
-                skipped_count += 1
-                continue
-
-            # 创建新映射
-            db_map = models.ArtifactCaptionMap(**map_data.model_dump())
-            db.add(db_map)
-            created_count += 1
-
-        except Exception as e:
-            errors.append(f"处理映射 {map_data.artifact_id}-{map_data.caption_id} 时出错: {str(e)}")
-
     try:
+        # 每张表只用一条 = ANY(...) 查询校验id
+        artifact_ids = {m.artifact_id for m in maps_data}
+        caption_ids = {m.caption_id for m in maps_data}
+        existing_artifacts = set(db.execute(bulk.existing_ids_stmt(models.Artifact.id, artifact_ids)).scalars()) if artifact_ids else set()
+        existing_captions = set(db.execute(bulk.existing_ids_stmt(models.Caption.id, caption_ids)).scalars()) if caption_ids else set()
+
+        rows, errors = bulk.prepare_map_rows(maps_data, existing_artifacts, existing_captions)
+
+        # INSERT ... ON CONFLICT DO NOTHING RETURNING，已存在的映射计为跳过
+        created_count = 0
+        for chunk in chunked(rows, bulk.MAP_BATCH_CHUNK):
+            created_count += len(db.execute(bulk.insert_maps_stmt(chunk)).all())
+
         db.commit()
         return {
             "success": True,
             "created_count": created_count,
-            "skipped_count": skipped_count,
+            "skipped_count": len(maps_data) - len(errors) - created_count,
             "errors": errors
         }
     except Exception as e:
@@ -554,5 +800,113 @@ def create_artifact_caption_maps_batch(maps_data: List[schemas.ArtifactCaptionMa
             detail=f"批量创建映射失败: {str(e)}"
         )
 
+# 以NDJSON流式导出图片（服务端游标，内存占用与总行数无关）
+@app.get("/artifacts/export")
+def export_artifacts(
+    request: Request,
+    filters: ArtifactFilters = Depends(),
+    updated_since: Optional[int] = None,
+):
+    stmt = export_artifacts_stmt(filters, updated_since)
+    return StreamingResponse(
+        stream_ndjson(stmt, session_factory=read_session_factory(request)), media_type="application/x-ndjson"
+    )
+
+# 变更日志：since之后的图片、描述、映射变更（按写入事务顺序），返回新水位线；since=now 只返回当前水位线
+@router.get("/changes", response_model=schemas.ChangeFeed)
+def read_change_feed(since: Optional[str] = None, limit: int = 1000, db: Session = Depends(get_read_db)):
+    rows, watermark, has_more = read_changes(db, parse_watermark(since), check_limit(limit))
+    return feed_response(rows, watermark, has_more)
+
+# 变更日志的SSE推送，断线重连时使用 Last-Event-ID 续传
+@app.get("/changes/stream")
+async def stream_change_feed(request: Request, since: Optional[str] = None, limit: int = 1000):
+    after = parse_watermark(since or request.headers.get("last-event-id"))
+    return StreamingResponse(
+        stream_changes(read_session_factory(request), after, check_limit(limit), config.CHANGES_POLL_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# 批量查询MD5是否已存在（上传前去重）
+@router.post("/artifacts/md5/lookup", response_model=schemas.Md5LookupResult)
+def lookup_artifacts_by_md5(lookup: schemas.Md5LookupRequest, db: Session = Depends(get_read_db)):
+    md5s = list(dict.fromkeys(lookup.md5s))
+    found = {}
+    if md5s:
+        for md5, artifact_id, is_deleted in db.execute(md5_lookup_stmt(md5s)):
+            found[md5] = schemas.Md5LookupItem(
+                md5=md5, id=artifact_id, is_deleted=is_deleted if lookup.with_deleted_status else None
+            )
+    return schemas.Md5LookupResult(
+        found=[found[md5] for md5 in md5s if md5 in found],
+        missing=[md5 for md5 in md5s if md5 not in found],
+    )
+
+def _lookup_by_ids(db: Session, model, lookup: schemas.IdsLookupRequest):
+    """按请求顺序返回找到的行（重复id只返回一次）和缺失的id"""
+    ids = list(dict.fromkeys(lookup.ids))
+    found = {}
+    if ids:
+        found = {row.id: row for row in db.execute(by_ids_stmt(model, ids, lookup.include_deleted)).scalars()}
+    return {
+        "items": [found[i] for i in ids if i in found],
+        "missing": [i for i in ids if i not in found],
+    }
+
+# 按id列表批量获取图片
+@router.post("/artifacts/by-ids", response_model=schemas.ArtifactsByIdsResult)
+def read_artifacts_by_ids(lookup: schemas.IdsLookupRequest, db: Session = Depends(get_read_db)):
+    return _lookup_by_ids(db, models.Artifact, lookup)
+
+# 按id列表批量获取描述
+@router.post("/captions/by-ids", response_model=schemas.CaptionsByIdsResult)
+def read_captions_by_ids(lookup: schemas.IdsLookupRequest, db: Session = Depends(get_read_db)):
+    return _lookup_by_ids(db, models.Caption, lookup)
+
+def _delete_by_ids(db: Session, model, request: schemas.IdsDeleteRequest, deleted_time):
+    """一条 id = ANY(...) 的UPDATE或DELETE，返回实际删除的id"""
+    ids = list(dict.fromkeys(request.ids))
+    if not ids:
+        return [], set()
+    if request.permanent:
+        stmt = hard_delete_by_ids_stmt(model, ids)
+    else:
+        stmt = soft_delete_by_ids_stmt(model, ids, deleted_time)
+    try:
+        deleted = set(db.execute(stmt).scalars())
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量删除失败: {str(e)}"
+        )
+    return ids, deleted
+
+# 按id列表批量删除图片
+@router.post("/artifacts/delete-batch", response_model=schemas.IdsDeleteResult)
+def delete_artifacts_batch(request: schemas.IdsDeleteRequest, db: Session = Depends(get_db)):
+    ids, deleted = _delete_by_ids(
+        db, models.Artifact, request, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
+    )
+    for artifact_id in deleted:
+        response_cache.invalidate(("artifact", artifact_id))
+    return {"deleted_count": len(deleted), "skipped": [i for i in ids if i not in deleted]}
+
+# 按id列表批量删除描述
+@router.post("/captions/delete-batch", response_model=schemas.IdsDeleteResult)
+def delete_captions_batch(request: schemas.IdsDeleteRequest, db: Session = Depends(get_db)):
+    ids, deleted = _delete_by_ids(db, models.Caption, request, int(time.time() * 1000))
+    return {"deleted_count": len(deleted), "skipped": [i for i in ids if i not in deleted]}
+
+# 根据配置注册同步或异步路由
+if config.DB_ASYNC:
+    from async_routes import router as async_router
+    app.include_router(async_router)
+else:
+    app.include_router(router)
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    import serve
+    serve.main()
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""数据库迁移脚本
+
+用法:
+    python migrate.py status            查看迁移状态
+    python migrate.py upgrade [版本]     执行到指定版本（默认最新）
+    python migrate.py downgrade 版本     回滚到指定版本（不含该版本之后的迁移）
+"""
+import importlib
+import os
+import re
+import sys
+import time
+
+from sqlalchemy import text
+
+from database import engine
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+CREATE_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    revision VARCHAR(32) PRIMARY KEY,
+    description TEXT,
+    applied_at BIGINT NOT NULL
+)
+"""
+
+
+def load_migrations():
+    """按版本号顺序加载 migrations/ 下的迁移模块"""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        if not filename.endswith(".py") or filename.startswith("_"):
+            continue
+        module = importlib.import_module(f"migrations.{filename[:-3]}")
+        migrations.append(module)
+    return migrations
+
+
+def applied_revisions(conn) -> set:
+    conn.execute(text(CREATE_VERSION_TABLE))
+    return set(conn.execute(text("SELECT revision FROM schema_migrations")).scalars())
+
+
+def extension_available(conn, name: str) -> bool:
+    return conn.execute(text("SELECT 1 FROM pg_available_extensions WHERE name = :name"), {"name": name}).first() is not None
+
+
+CONCURRENT_INDEX = re.compile(r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE)
+
+
+def index_valid(conn, name: str):
+    """索引是否可用；不存在时返回None。CONCURRENTLY 建索引失败或被取消时会留下同名的INVALID索引"""
+    return conn.execute(text(
+        "SELECT i.indisvalid FROM pg_index i WHERE i.indexrelid = to_regclass(:name)"
+    ), {"name": name}).scalar()
+
+
+def _create_index_concurrently(conn, sql: str, name: str):
+    """先删除上次失败留下的INVALID索引（否则 IF NOT EXISTS 会直接跳过），建完后确认索引可用"""
+    if index_valid(conn, name) is False:
+        print(f"  删除无效索引 {name}")
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    conn.execute(text(sql))
+    if index_valid(conn, name) is False:
+        raise RuntimeError(f"索引 {name} 创建后仍为INVALID，迁移未记录，请检查后重新执行")
+
+
+def _run(migration, statements, record_sql, params):
+    """非事务迁移使用AUTOCOMMIT逐条执行（CREATE INDEX CONCURRENTLY 不能在事务中执行）"""
+    if migration.TRANSACTIONAL:
+        with engine.begin() as conn:
+            for sql in statements:
+                conn.execute(text(sql))
+            conn.execute(text(record_sql), params)
+    else:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for sql in statements:
+                print(f"  {sql}")
+                match = CONCURRENT_INDEX.match(sql.strip())
+                if match:
+                    _create_index_concurrently(conn, sql, match.group(1))
+                else:
+                    conn.execute(text(sql))
+            conn.execute(text(record_sql), params)
+
+
+def upgrade(target: str = None):
+    with engine.begin() as conn:
+        applied = applied_revisions(conn)
+    for migration in load_migrations():
+        if target and migration.REVISION > target:
+            break
+        if migration.REVISION in applied:
+            continue
+        print(f"升级 {migration.REVISION}: {migration.DESCRIPTION}")
+        start = time.time()
+        statements = migration.UPGRADE
+        # 依赖的扩展不可用时只记录版本，不执行语句，后续迁移照常进行
+        extension = getattr(migration, "REQUIRES_EXTENSION", None)
+        if extension:
+            with engine.connect() as conn:
+                if not extension_available(conn, extension):
+                    print(f"  扩展 {extension} 不可用，跳过")
+                    statements = []
+        _run(
+            migration, statements,
+            "INSERT INTO schema_migrations (revision, description, applied_at) VALUES (:revision, :description, :applied_at)",
+            {"revision": migration.REVISION, "description": migration.DESCRIPTION, "applied_at": int(time.time() * 1000)}
+        )
+        print(f"完成 {migration.REVISION}，耗时 {time.time() - start:.1f}s")
+
+
+def downgrade(target: str):
+    with engine.begin() as conn:
+        applied = applied_revisions(conn)
+    for migration in reversed(load_migrations()):
+        if migration.REVISION <= target or migration.REVISION not in applied:
+            continue
+        print(f"回滚 {migration.REVISION}: {migration.DESCRIPTION}")
+        _run(
+            migration, migration.DOWNGRADE,
+            "DELETE FROM schema_migrations WHERE revision = :revision",
+            {"revision": migration.REVISION}
+        )
+
+
+def show_status():
+    with engine.begin() as conn:
+        applied = applied_revisions(conn)
+    for migration in load_migrations():
+        mark = "已执行" if migration.REVISION in applied else "未执行"
+        print(f"{migration.REVISION}  {mark}  {migration.DESCRIPTION}")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    if command == "upgrade":
+        upgrade(sys.argv[2] if len(sys.argv) > 2 else None)
+    elif command == "downgrade" and len(sys.argv) > 2:
+        downgrade(sys.argv[2])
+    elif command == "status":
+        show_status()
+    else:
+        print(__doc__)
+        sys.exit(1)
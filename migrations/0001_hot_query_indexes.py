@@ -0,0 +1,46 @@
+"""列表、过滤和映射查询所需的索引
+
+列表接口按 (upload_time, id) / (create_time, preset_key) 降序做键集分页，
+默认只看未删除的行，因此使用 WHERE is_deleted = false 的部分索引。
+"""
+
+REVISION = "0001"
+DESCRIPTION = "hot query indexes"
+TRANSACTIONAL = False
+
+UPGRADE = [
+    # GET /artifacts/ 默认排序与游标分页
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_artifacts_live_upload_time "
+    "ON artifacts (upload_time DESC, id DESC) WHERE is_deleted = false",
+    # GET /artifacts/?format=
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_artifacts_live_format_upload_time "
+    "ON artifacts (format, upload_time DESC, id DESC) WHERE is_deleted = false",
+    # GET /artifacts/?include_deleted=true
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_artifacts_upload_time "
+    "ON artifacts (upload_time DESC, id DESC)",
+    # GET /artifacts/export?updated_since=
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_artifacts_update_time ON artifacts (update_time)",
+    # GET /captions/
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_captions_live_upload_time "
+    "ON captions (upload_time DESC, id DESC) WHERE is_deleted = false",
+    # POST /captions/ 与 GET /captions/preset/{preset_key}
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_captions_live_preset_key "
+    "ON captions (preset_key) WHERE is_deleted = false",
+    # GET /presets/
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_caption_preset_live_create_time "
+    "ON caption_preset (create_time DESC, preset_key DESC) WHERE is_deleted = false",
+    # GET /artifact-caption-maps/caption/{caption_id}（artifact_id由主键前缀覆盖）
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_artifact_caption_map_caption_id "
+    "ON artifact_caption_map (caption_id)",
+]
+
+DOWNGRADE = [
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_artifact_caption_map_caption_id",
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_caption_preset_live_create_time",
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_captions_live_preset_key",
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_captions_live_upload_time",
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_artifacts_update_time",
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_artifacts_upload_time",
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_artifacts_live_format_upload_time",
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_artifacts_live_upload_time",
+]
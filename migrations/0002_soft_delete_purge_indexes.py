@@ -0,0 +1,24 @@
+"""软删除清理任务所需的索引
+
+清理任务按 deleted_time 取出已删除的行，部分索引只包含 is_deleted = true 的行，
+体积很小，且不影响未删除行的写入。
+"""
+
+REVISION = "0002"
+DESCRIPTION = "soft delete purge indexes"
+TRANSACTIONAL = False
+
+UPGRADE = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_artifacts_deleted_time "
+    "ON artifacts (deleted_time) WHERE is_deleted = true",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_captions_deleted_time "
+    "ON captions (deleted_time) WHERE is_deleted = true",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_caption_preset_deleted_time "
+    "ON caption_preset (deleted_time) WHERE is_deleted = true",
+]
+
+DOWNGRADE = [
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_caption_preset_deleted_time",
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_captions_deleted_time",
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_artifacts_deleted_time",
+]
@@ -0,0 +1,25 @@
+"""描述全文搜索：tsvector生成列和GIN索引
+
+GET /captions/search 用 text_search @@ websearch_to_tsquery 匹配，按 ts_rank_cd 排序。
+生成列在写入时计算，排序时不必对每个命中行重新分词。
+
+注意：添加STORED生成列会重写captions表并持有ACCESS EXCLUSIVE锁，耗时与表大小成正比，
+应在低峰期执行；GIN索引随后用 CONCURRENTLY 创建，不阻塞读写。
+文本搜索配置必须与 search.SEARCH_CONFIG 一致，否则查询无法使用索引。
+"""
+
+REVISION = "0003"
+DESCRIPTION = "caption full-text search"
+TRANSACTIONAL = False
+
+UPGRADE = [
+    "ALTER TABLE captions ADD COLUMN IF NOT EXISTS text_search tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('english', coalesce(text, ''))) STORED",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_captions_live_text_search "
+    "ON captions USING gin (text_search) WHERE is_deleted = false",
+]
+
+DOWNGRADE = [
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_captions_live_text_search",
+    "ALTER TABLE captions DROP COLUMN IF EXISTS text_search",
+]
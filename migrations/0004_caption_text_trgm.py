@@ -0,0 +1,24 @@
+"""描述子串搜索：pg_trgm三元组GIN索引
+
+英文分词器不切分中文，连续的汉字会被当成一个词，全文搜索查不到其中的片段。
+GET /captions/search 遇到中日韩字符（或 mode=substring）时改用 text ILIKE '%...%'，
+由该索引支持；查询至少3个字符才能用上三元组索引。
+
+需要 pg_trgm 扩展（阿里云RDS PostgreSQL已提供）。扩展不可用时跳过本迁移，
+子串搜索仍然可用，但会扫描全部未删除的描述。
+"""
+
+REVISION = "0004"
+DESCRIPTION = "caption substring search (pg_trgm)"
+TRANSACTIONAL = False
+REQUIRES_EXTENSION = "pg_trgm"
+
+UPGRADE = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_captions_live_text_trgm "
+    "ON captions USING gin (text gin_trgm_ops) WHERE is_deleted = false",
+]
+
+DOWNGRADE = [
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_captions_live_text_trgm",
+]
@@ -0,0 +1,33 @@
+"""描述extra_data、预设config的JSON过滤索引
+
+GET /captions/ 和 GET /presets/ 的 json_contains（@>）、json_path（@?）条件
+由 jsonb_path_ops GIN索引支持。jsonb_path_ops 只支持 @>、@?、@@，比默认的 jsonb_ops 小且快，
+但不支持 ? / ?| / ?& 键存在判断（可用 json_path=$.key 代替）。
+
+json_key + json_min/json_max 的数值范围用不上GIN索引，只为声明为热点的键建表达式索引，
+表达式必须与 queries.json_number 生成的完全一致（路径以常量内联，非数值为NULL）。
+表达式索引不加 WHERE is_deleted = false：规划器不使用部分索引上的表达式统计，
+部分索引会让范围条件按默认选择率（1/3）估算，命中很少时也不走索引。
+新增热点键时在这里和 models.py 中各加一条。
+"""
+
+REVISION = "0005"
+DESCRIPTION = "jsonb filter indexes"
+TRANSACTIONAL = False
+
+UPGRADE = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_captions_live_extra_data "
+    "ON captions USING gin (extra_data jsonb_path_ops) WHERE is_deleted = false",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_caption_preset_live_config "
+    "ON caption_preset USING gin (config jsonb_path_ops) WHERE is_deleted = false",
+    # 热点键：extra_data.elapsed_ms（按生成耗时筛选慢描述）
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_captions_elapsed_ms "
+    "ON captions ((CASE WHEN jsonb_typeof(extra_data #> '{elapsed_ms}') = 'number' "
+    "THEN (extra_data #>> '{elapsed_ms}')::numeric END))",
+]
+
+DOWNGRADE = [
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_captions_elapsed_ms",
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_caption_preset_live_config",
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_captions_live_extra_data",
+]
@@ -0,0 +1,131 @@
+"""增量变更日志：图片、描述和映射的插入、更新、删除
+
+GET /changes?since= 按水位线返回变更，下游缓存和搜索索引不必定期全表重扫。
+update_time 由客户端填写，描述和映射没有更新时间，硬删除也无从查起，因此改用触发器维护的日志表。
+
+- 语句级触发器 + 转换表（REFERENCING NEW/OLD TABLE）：批量写入每条语句只触发一次，
+  一条 INSERT ... SELECT 写入全部变更行，不是每行一次函数调用
+- is_deleted 由 false 变为 true 记为 delete（软删除）；硬删除已软删除的行（清理任务）不再重复记录
+- txid 为写入事务的 pg_current_xact_id()，读取时只返回 txid 小于当前快照 xmin 的行：
+  这些事务都已结束，之后不会再出现更小 txid 的行，水位线 (txid, seq) 可以安全推进，不会漏掉
+  提交较晚但 seq 较小的变更。代价是长事务会让变更推迟到其结束后才可见
+- 每条语句 pg_notify('change_log', '')，同一事务内相同的通知只投递一次，
+  供 GET /changes/stream 及时拉取。高并发写入时 NOTIFY 在提交时的全局锁可能成为瓶颈，
+  可执行 ALTER DATABASE ... SET change_log.notify = off 关闭，流式接口退化为定时轮询
+
+需要 PostgreSQL 13+（pg_current_xact_id / pg_current_snapshot）。
+"""
+
+REVISION = "0006"
+DESCRIPTION = "change log"
+TRANSACTIONAL = True
+
+UPGRADE = [
+    """
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq BIGSERIAL PRIMARY KEY,
+        txid BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text::bigint),
+        table_name VARCHAR(32) NOT NULL,
+        op VARCHAR(8) NOT NULL,
+        artifact_id UUID,
+        caption_id UUID,
+        change_time BIGINT NOT NULL DEFAULT ((extract(epoch FROM clock_timestamp()) * 1000)::bigint)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_change_log_txid_seq ON change_log (txid, seq)",
+    # 保留期清理按 change_time 删除；日志只追加，BRIN索引很小
+    "CREATE INDEX IF NOT EXISTS ix_change_log_change_time ON change_log USING brin (change_time)",
+    """
+    CREATE OR REPLACE FUNCTION change_log_notify() RETURNS void LANGUAGE plpgsql AS $$
+    BEGIN
+        IF coalesce(current_setting('change_log.notify', true), '') <> 'off' THEN
+            PERFORM pg_notify('change_log', '');
+        END IF;
+    END
+    $$
+    """,
+    # artifacts 和 captions 共用：id 写入与表名对应的列
+    """
+    CREATE OR REPLACE FUNCTION change_log_rows() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO change_log (table_name, op, artifact_id, caption_id)
+            SELECT TG_TABLE_NAME, 'insert',
+                   CASE WHEN TG_TABLE_NAME = 'artifacts' THEN id END,
+                   CASE WHEN TG_TABLE_NAME = 'captions' THEN id END
+            FROM new_rows;
+        ELSIF TG_OP = 'UPDATE' THEN
+            INSERT INTO change_log (table_name, op, artifact_id, caption_id)
+            SELECT TG_TABLE_NAME,
+                   CASE WHEN n.is_deleted AND NOT o.is_deleted THEN 'delete' ELSE 'update' END,
+                   CASE WHEN TG_TABLE_NAME = 'artifacts' THEN n.id END,
+                   CASE WHEN TG_TABLE_NAME = 'captions' THEN n.id END
+            FROM new_rows n JOIN old_rows o ON o.id = n.id;
+        ELSE
+            INSERT INTO change_log (table_name, op, artifact_id, caption_id)
+            SELECT TG_TABLE_NAME, 'delete',
+                   CASE WHEN TG_TABLE_NAME = 'artifacts' THEN id END,
+                   CASE WHEN TG_TABLE_NAME = 'captions' THEN id END
+            FROM old_rows WHERE NOT is_deleted;
+        END IF;
+        PERFORM change_log_notify();
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION change_log_maps() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO change_log (table_name, op, artifact_id, caption_id)
+            SELECT TG_TABLE_NAME, 'insert', artifact_id, caption_id FROM new_rows;
+        ELSE
+            INSERT INTO change_log (table_name, op, artifact_id, caption_id)
+            SELECT TG_TABLE_NAME, 'delete', artifact_id, caption_id FROM old_rows;
+        END IF;
+        PERFORM change_log_notify();
+        RETURN NULL;
+    END
+    $$
+    """,
+    # 带转换表的触发器只能对应一种事件，每张表每种事件各一个
+    "DROP TRIGGER IF EXISTS change_log_insert ON artifacts",
+    "CREATE TRIGGER change_log_insert AFTER INSERT ON artifacts REFERENCING NEW TABLE AS new_rows "
+    "FOR EACH STATEMENT EXECUTE FUNCTION change_log_rows()",
+    "DROP TRIGGER IF EXISTS change_log_update ON artifacts",
+    "CREATE TRIGGER change_log_update AFTER UPDATE ON artifacts REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+    "FOR EACH STATEMENT EXECUTE FUNCTION change_log_rows()",
+    "DROP TRIGGER IF EXISTS change_log_delete ON artifacts",
+    "CREATE TRIGGER change_log_delete AFTER DELETE ON artifacts REFERENCING OLD TABLE AS old_rows "
+    "FOR EACH STATEMENT EXECUTE FUNCTION change_log_rows()",
+    "DROP TRIGGER IF EXISTS change_log_insert ON captions",
+    "CREATE TRIGGER change_log_insert AFTER INSERT ON captions REFERENCING NEW TABLE AS new_rows "
+    "FOR EACH STATEMENT EXECUTE FUNCTION change_log_rows()",
+    "DROP TRIGGER IF EXISTS change_log_update ON captions",
+    "CREATE TRIGGER change_log_update AFTER UPDATE ON captions REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+    "FOR EACH STATEMENT EXECUTE FUNCTION change_log_rows()",
+    "DROP TRIGGER IF EXISTS change_log_delete ON captions",
+    "CREATE TRIGGER change_log_delete AFTER DELETE ON captions REFERENCING OLD TABLE AS old_rows "
+    "FOR EACH STATEMENT EXECUTE FUNCTION change_log_rows()",
+    "DROP TRIGGER IF EXISTS change_log_insert ON artifact_caption_map",
+    "CREATE TRIGGER change_log_insert AFTER INSERT ON artifact_caption_map REFERENCING NEW TABLE AS new_rows "
+    "FOR EACH STATEMENT EXECUTE FUNCTION change_log_maps()",
+    "DROP TRIGGER IF EXISTS change_log_delete ON artifact_caption_map",
+    "CREATE TRIGGER change_log_delete AFTER DELETE ON artifact_caption_map REFERENCING OLD TABLE AS old_rows "
+    "FOR EACH STATEMENT EXECUTE FUNCTION change_log_maps()",
+]
+
+DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS change_log_insert ON artifact_caption_map",
+    "DROP TRIGGER IF EXISTS change_log_delete ON artifact_caption_map",
+    "DROP TRIGGER IF EXISTS change_log_insert ON captions",
+    "DROP TRIGGER IF EXISTS change_log_update ON captions",
+    "DROP TRIGGER IF EXISTS change_log_delete ON captions",
+    "DROP TRIGGER IF EXISTS change_log_insert ON artifacts",
+    "DROP TRIGGER IF EXISTS change_log_update ON artifacts",
+    "DROP TRIGGER IF EXISTS change_log_delete ON artifacts",
+    "DROP FUNCTION IF EXISTS change_log_maps()",
+    "DROP FUNCTION IF EXISTS change_log_rows()",
+    "DROP FUNCTION IF EXISTS change_log_notify()",
+    "DROP TABLE IF EXISTS change_log",
+]
@@ -0,0 +1,24 @@
+"""图片宽高比、像素数范围过滤和分桶统计的索引
+
+GET /artifacts/ 等列表的 min_aspect/max_aspect、min_pixels/max_pixels 条件，
+以及 GET /artifacts/buckets 的分桶统计。aspect_ratio 是表上已有的生成列（width / NULLIF(height, 0)）。
+
+(aspect_ratio, pixels) 同时覆盖分桶需要的两列：默认过滤条件下分桶统计是仅索引扫描，
+不必回表读取整行；只按像素数过滤时使用 (pixels) 索引。
+"""
+
+REVISION = "0007"
+DESCRIPTION = "artifact bucket indexes"
+TRANSACTIONAL = False
+
+UPGRADE = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_artifacts_live_aspect_ratio_pixels "
+    "ON artifacts (aspect_ratio, pixels) WHERE is_deleted = false",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_artifacts_live_pixels "
+    "ON artifacts (pixels) WHERE is_deleted = false",
+]
+
+DOWNGRADE = [
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_artifacts_live_pixels",
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_artifacts_live_aspect_ratio_pixels",
+]
@@ -0,0 +1,18 @@
+"""图片派生关系：children_id 的GIN索引
+
+GET /artifacts/{id}/parents 沿 children_id 向上查找父图片（children_id @> ARRAY[id]），
+没有索引时每一层都要扫描整张表。向下的 GET /artifacts/{id}/tree 按主键查找子图片，不需要新索引。
+索引不加 WHERE is_deleted = false：include_deleted=true 时同样需要查找已删除的父图片。
+"""
+
+REVISION = "0008"
+DESCRIPTION = "artifact children index"
+TRANSACTIONAL = False
+
+UPGRADE = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_artifacts_children_id ON artifacts USING gin (children_id)",
+]
+
+DOWNGRADE = [
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_artifacts_children_id",
+]
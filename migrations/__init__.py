@@ -0,0 +1,11 @@
+"""版本化数据库迁移
+
+每个迁移是一个 NNNN_描述.py 文件，定义：
+    REVISION      版本号（与文件名前缀一致）
+    DESCRIPTION   说明
+    TRANSACTIONAL 是否在事务中执行；CREATE INDEX CONCURRENTLY 必须为 False
+    UPGRADE       升级SQL列表
+    DOWNGRADE     回滚SQL列表
+
+通过 `python migrate.py upgrade` 执行，已执行的版本记录在 schema_migrations 表中。
+"""
@@ -1,5 +1,8 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, Float, BigInteger, ARRAY, UUID, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, Boolean, Float, BigInteger, ARRAY, UUID, ForeignKey, JSON, Index
+from sqlalchemy import Computed, Numeric, case, cast, literal
 from sqlalchemy.sql import func
+from sqlalchemy.sql.expression import Grouping
+from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID as PostgresUUID, JSONB
 import uuid
 from database import Base
@@ -26,6 +29,8 @@ class Artifact(Base):
     origin_name = Column(String(255), nullable=True)
     created_time = Column(BigInteger, nullable=False)
     has_alpha = Column(Boolean, nullable=False, default=False)
+    # 数据库生成列（宽/高，高为0时为NULL），写入时不包含；RETURNING 和整行查询都会带上
+    aspect_ratio = Column(Float, Computed("width::double precision / NULLIF(height, 0)", persisted=True))
 
     # 文件路径
     original_path = Column(Text, nullable=False)
@@ -37,6 +42,11 @@ class Artifact(Base):
     is_deleted = Column(Boolean, nullable=False, default=False)
     deleted_time = Column(Text, nullable=True)  # 使用Text代替TIMESTAMP WITH TIME ZONE
 
+    # 关联的描述（只读，映射关系仍通过ArtifactCaptionMap写入）
+    captions = relationship(
+        "Caption", secondary="artifact_caption_map", viewonly=True, order_by="Caption.upload_time.desc()"
+    )
+
 class CaptionPreset(Base):
     """预设配置模型"""
     __tablename__ = "caption_preset"
@@ -68,6 +78,9 @@ class Caption(Base):
     is_deleted = Column(Boolean, nullable=False, default=False)
     deleted_time = Column(BigInteger, nullable=True)
 
+    # 关联的图片（只读）
+    artifacts = relationship("Artifact", secondary="artifact_caption_map", viewonly=True)
+
 class ArtifactCaptionMap(Base):
     """图片与描述映射模型"""
     __tablename__ = "artifact_caption_map"
@@ -75,4 +88,55 @@ class ArtifactCaptionMap(Base):
 
     artifact_id = Column(PostgresUUID(as_uuid=True), ForeignKey("artifacts.id", ondelete="CASCADE"), primary_key=True)
     caption_id = Column(PostgresUUID(as_uuid=True), ForeignKey("captions.id", ondelete="CASCADE"), primary_key=True)
-    add_time = Column(BigInteger, nullable=False)
\ No newline at end of file
+    add_time = Column(BigInteger, nullable=False)
+
+    artifact = relationship("Artifact", viewonly=True)
+    caption = relationship("Caption", viewonly=True)
+
+class ChangeLog(Base):
+    """变更日志：由 artifacts、captions、artifact_caption_map 上的触发器写入（迁移0006），只读"""
+    __tablename__ = "change_log"
+    __table_args__ = {'extend_existing': True}
+
+    seq = Column(BigInteger, primary_key=True)
+    txid = Column(BigInteger, nullable=False)  # 写入事务的 pg_current_xact_id()
+    table_name = Column(String(32), nullable=False)
+    op = Column(String(8), nullable=False)  # insert / update / delete（含软删除）
+    artifact_id = Column(PostgresUUID(as_uuid=True), nullable=True)
+    caption_id = Column(PostgresUUID(as_uuid=True), nullable=True)
+    change_time = Column(BigInteger, nullable=False)  # 毫秒时间戳
+
+# 索引定义（与 migrations/ 下的迁移保持一致，线上库通过迁移创建）
+Index("ix_artifacts_live_upload_time", Artifact.upload_time.desc(), Artifact.id.desc(),
+      postgresql_where=Artifact.is_deleted == False)
+Index("ix_artifacts_live_format_upload_time", Artifact.format, Artifact.upload_time.desc(), Artifact.id.desc(),
+      postgresql_where=Artifact.is_deleted == False)
+Index("ix_artifacts_upload_time", Artifact.upload_time.desc(), Artifact.id.desc())
+Index("ix_artifacts_update_time", Artifact.update_time)
+Index("ix_captions_live_upload_time", Caption.upload_time.desc(), Caption.id.desc(),
+      postgresql_where=Caption.is_deleted == False)
+Index("ix_captions_live_preset_key", Caption.preset_key, postgresql_where=Caption.is_deleted == False)
+Index("ix_caption_preset_live_create_time", CaptionPreset.create_time.desc(), CaptionPreset.preset_key.desc(),
+      postgresql_where=CaptionPreset.is_deleted == False)
+Index("ix_artifact_caption_map_caption_id", ArtifactCaptionMap.caption_id)
+# 软删除清理任务
+Index("ix_artifacts_deleted_time", Artifact.deleted_time, postgresql_where=Artifact.is_deleted == True)
+Index("ix_captions_deleted_time", Caption.deleted_time, postgresql_where=Caption.is_deleted == True)
+Index("ix_caption_preset_deleted_time", CaptionPreset.deleted_time, postgresql_where=CaptionPreset.is_deleted == True)
+# JSON过滤（迁移0005）
+Index("ix_captions_live_extra_data", Caption.extra_data, postgresql_using="gin",
+      postgresql_ops={"extra_data": "jsonb_path_ops"}, postgresql_where=Caption.is_deleted == False)
+Index("ix_caption_preset_live_config", CaptionPreset.config, postgresql_using="gin",
+      postgresql_ops={"config": "jsonb_path_ops"}, postgresql_where=CaptionPreset.is_deleted == False)
+# 热点键的数值表达式索引，表达式与 queries.json_number 生成的一致
+Index("ix_captions_elapsed_ms", Grouping(case(
+    (func.jsonb_typeof(Caption.extra_data.op("#>")(literal(["elapsed_ms"], ARRAY(Text)))) == "number",
+     cast(Caption.extra_data.op("#>>")(literal(["elapsed_ms"], ARRAY(Text))), Numeric)),
+)))
+# 宽高比、像素数过滤与分桶（迁移0007）；(aspect_ratio, pixels) 索引只在迁移中创建
+Index("ix_artifacts_live_pixels", Artifact.pixels, postgresql_where=Artifact.is_deleted == False)
+# 派生关系：按子图片查找父图片（迁移0008）
+Index("ix_artifacts_children_id", Artifact.children_id, postgresql_using="gin")
+# 变更日志（迁移0006）
+Index("ix_change_log_txid_seq", ChangeLog.txid, ChangeLog.seq)
+Index("ix_change_log_change_time", ChangeLog.change_time, postgresql_using="brin")
@@ -0,0 +1,87 @@
+import base64
+import json
+from typing import Any, List, Optional
+from uuid import UUID
+
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+
+# 下一页游标通过响应头返回，保持列表响应体不变（兼容旧客户端）
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values: Any) -> str:
+    """将排序键编码为不透明游标"""
+    payload = [str(v) if isinstance(v, UUID) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """解析游标，格式不合法时返回400"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError("cursor size mismatch")
+        return values
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"无效的分页游标: {cursor}"
+        )
+
+
+def _cursor_value(column, value):
+    """按列类型校验游标中的值：UUID列解析为UUID，整数、浮点数、字符串列要求JSON中的类型一致
+
+    不校验时被篡改的游标（如时间列为字符串）会在数据库中报类型错误，变成500。
+    """
+    if getattr(column.type, "as_uuid", False):
+        return UUID(value)
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is int and (isinstance(value, bool) or not isinstance(value, int)):
+        raise TypeError(f"expected int, got {value!r}")
+    if python_type is float:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise TypeError(f"expected number, got {value!r}")
+        return float(value)
+    if python_type is str and not isinstance(value, str):
+        raise TypeError(f"expected str, got {value!r}")
+    return value
+
+
+def keyset_filter(columns, cursor: Optional[str]):
+    """根据游标生成 (col1, col2) < (v1, v2) 条件，排序方向为降序"""
+    if not cursor:
+        return None
+    values = decode_cursor(cursor, len(columns))
+    try:
+        values = [_cursor_value(col, v) for col, v in zip(columns, values)]
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"无效的分页游标: {cursor}"
+        )
+    return tuple_(*columns) < tuple_(*values)
+
+
+def set_next_cursor(response, rows: list, limit: int, *attrs: str) -> None:
+    """当前页已满时，在响应头中写入下一页游标"""
+    if limit > 0 and len(rows) >= limit:
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*(getattr(last, a) for a in attrs))
+
+
+def paginate(stmt, columns, skip: int, limit: int, cursor: Optional[str]):
+    """按columns降序排序；传入cursor时使用键集分页，否则兼容offset分页"""
+    stmt = stmt.order_by(*(col.desc() for col in columns))
+    keyset = keyset_filter(columns, cursor)
+    if keyset is not None:
+        stmt = stmt.where(keyset)
+    else:
+        stmt = stmt.offset(skip)
+    return stmt.limit(limit)
@@ -0,0 +1,89 @@
+import logging
+import select
+import threading
+from typing import Callable, Dict, List
+
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+
+class PgListener:
+    """在后台线程中 LISTEN 若干频道，收到 NOTIFY 后调用注册的回调
+
+    连接断开后自动重连；重连期间可能漏掉通知，因此重连成功后会调用 on_reconnect 回调，
+    由使用方自行清空本地缓存等状态。
+    """
+
+    def __init__(self, dsn: str, poll_interval: float = 1.0, retry_interval: float = 5.0):
+        self.dsn = dsn
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self._handlers: Dict[str, List[Callable[[str], None]]] = {}
+        self._reconnect_handlers: List[Callable[[], None]] = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, channel: str, handler: Callable[[str], None]) -> None:
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def on_reconnect(self, handler: Callable[[], None]) -> None:
+        self._reconnect_handlers.append(handler)
+
+    def start(self) -> None:
+        if self._thread is not None or not self._handlers:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="pg-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+            self._thread = None
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            for channel in self._handlers:
+                cur.execute(f'LISTEN "{channel}"')
+        return conn
+
+    def _dispatch(self, channel: str, payload: str) -> None:
+        for handler in self._handlers.get(channel, []):
+            try:
+                handler(payload)
+            except Exception:
+                logger.exception("处理通知 %s 时发生错误", channel)
+
+    def _run(self) -> None:
+        first = True
+        while not self._stop.is_set():
+            try:
+                conn = self._connect()
+            except Exception as e:
+                logger.warning("LISTEN连接失败，%s秒后重试: %s", self.retry_interval, e)
+                self._stop.wait(self.retry_interval)
+                continue
+            if not first:
+                for handler in self._reconnect_handlers:
+                    handler()
+            first = False
+            try:
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self._dispatch(notify.channel, notify.payload)
+            except Exception as e:
+                logger.warning("LISTEN连接中断，准备重连: %s", e)
+            finally:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import text
+
+import config
+import schemas
+
+# 预设变更通知频道，payload为preset_key
+PRESET_CHANNEL = "caption_preset_changed"
+
+
+class PresetCache:
+    """按preset_key缓存未删除的预设（TTL + LRU容量上限，线程安全）
+
+    读库前先用generation()记下版本，put时传回；读库期间发生过invalidate则放弃写入，
+    避免把失效前读到的旧行重新放回缓存
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 整体失效的代数 + 按key失效的代数；整体失效时清空按key代数
+        self._epoch = 0
+        self._generations: Dict[str, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, preset_key: str) -> Optional[schemas.CaptionPreset]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(preset_key)
+            if entry is None:
+                return None
+            expires_at, preset = entry
+            if expires_at < time.monotonic():
+                del self._entries[preset_key]
+                return None
+            self._entries.move_to_end(preset_key)
+            return preset
+
+    def generation(self, preset_key: str) -> Tuple[int, int]:
+        with self._lock:
+            return self._epoch, self._generations.get(preset_key, 0)
+
+    def put(self, preset: schemas.CaptionPreset, generation: Optional[Tuple[int, int]] = None) -> None:
+        if not self.enabled or preset.is_deleted:
+            return
+        with self._lock:
+            current = (self._epoch, self._generations.get(preset.preset_key, 0))
+            if generation is not None and generation != current:
+                return
+            self._entries[preset.preset_key] = (time.monotonic() + self.ttl, preset)
+            self._entries.move_to_end(preset.preset_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, preset_key: Optional[str] = None) -> None:
+        with self._lock:
+            if preset_key is None:
+                self._entries.clear()
+                self._generations.clear()
+                self._epoch += 1
+            else:
+                self._entries.pop(preset_key, None)
+                self._generations[preset_key] = self._generations.get(preset_key, 0) + 1
+
+
+preset_cache = PresetCache(config.PRESET_CACHE_TTL, config.PRESET_CACHE_SIZE)
+
+
+def _notify_stmt(preset_key: str):
+    return text("SELECT pg_notify(:channel, :key)").bindparams(channel=PRESET_CHANNEL, key=preset_key)
+
+
+def notify_change(db, preset_key: str) -> None:
+    """在写事务中发送跨副本失效通知（提交后才会投递）；本副本在提交后调用invalidate"""
+    if config.PRESET_CACHE_NOTIFY:
+        db.execute(_notify_stmt(preset_key))
+
+
+async def notify_change_async(db, preset_key: str) -> None:
+    if config.PRESET_CACHE_NOTIFY:
+        await db.execute(_notify_stmt(preset_key))
+
+
+def register_listener(listener) -> None:
+    """收到其他副本的变更通知时失效对应条目；重连后清空整个缓存"""
+    listener.subscribe(PRESET_CHANNEL, lambda key: preset_cache.invalidate(key or None))
+    listener.on_reconnect(preset_cache.invalidate)
@@ -0,0 +1,225 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from metrics import REGISTRY, Counter
+
+logger = logging.getLogger(__name__)
+
+PURGED_ROWS = REGISTRY.register(Counter(
+    "soft_delete_purged_rows_total", "物理删除的软删除行数", ("table",)
+))
+
+# 多副本部署时只允许一个副本执行清理（会话级advisory lock）
+PURGE_LOCK_KEY = 0x70757267  # "purg"
+
+# 表名 -> 额外条件；deleted_time 在 artifacts 中为 '%Y-%m-%d %H:%M:%S' 文本，其余表为毫秒时间戳
+# 仍被描述引用的预设不能删除（外键没有级联），映射表通过 ON DELETE CASCADE 随图片/描述一起删除
+PURGE_TABLES: List[Tuple[str, str]] = [
+    ("artifacts", ""),
+    ("captions", ""),
+    ("caption_preset", "AND NOT EXISTS (SELECT 1 FROM captions WHERE captions.preset_key = caption_preset.preset_key)"),
+]
+
+
+def purge_batch_sql(table: str, extra: str = "") -> str:
+    """删除一批过期的软删除行
+
+    先按部分索引取出最多 :batch_size 行的 ctid，再用 ctid = ANY(ARRAY(...)) 走TID扫描删除，
+    SKIP LOCKED 跳过正在被业务事务修改的行，每批在独立的短事务中执行。
+    """
+    return (
+        f"DELETE FROM {table} WHERE ctid = ANY(ARRAY("
+        f"SELECT ctid FROM {table} WHERE is_deleted = true AND deleted_time < :cutoff {extra} "
+        f"LIMIT :batch_size FOR UPDATE SKIP LOCKED))"
+    )
+
+
+def stamp_batch_sql(table: str) -> str:
+    """为一批 deleted_time 为空的软删除行补上删除时间（:now）
+
+    旧的 PUT ... is_deleted=true 等路径不写 deleted_time，这些行按 deleted_time < :cutoff 永远不会被清理；
+    补上当前时间后从此刻开始计算保留期，而不是立即删除。同样按部分索引取出ctid、SKIP LOCKED、短事务。
+    """
+    return (
+        f"UPDATE {table} SET deleted_time = :now WHERE ctid = ANY(ARRAY("
+        f"SELECT ctid FROM {table} WHERE is_deleted = true AND deleted_time IS NULL "
+        f"LIMIT :batch_size FOR UPDATE SKIP LOCKED))"
+    )
+
+
+# 变更日志（迁移0006）按 change_time 删除超过保留期的行，走BRIN索引；日志只追加，没有业务事务争用
+CHANGE_LOG_TRIM_SQL = (
+    "DELETE FROM change_log WHERE seq = ANY(ARRAY("
+    "SELECT seq FROM change_log WHERE change_time < :cutoff LIMIT :batch_size))"
+)
+
+
+def cutoffs(retention_days: float, now: Optional[float] = None,
+            change_log_retention_days: Optional[float] = None) -> Dict[str, object]:
+    """各表的 deleted_time 截止值；传入 change_log_retention_days 时包含变更日志的 change_time 截止值"""
+    now = time.time() if now is None else now
+    deadline = now - retention_days * 86400
+    limits: Dict[str, object] = {
+        "artifacts": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(deadline)),
+        "captions": int(deadline * 1000),
+        "caption_preset": int(deadline * 1000),
+    }
+    if change_log_retention_days is not None:
+        limits["change_log"] = int((now - change_log_retention_days * 86400) * 1000)
+    return limits
+
+
+class PurgeJob:
+    """后台定期物理删除超过保留期的软删除行
+
+    按表分批删除，每批之间暂停 batch_pause 秒，单批锁住的行数不超过 batch_size；
+    status() 返回当前进度和最近一次运行每张表删除的行数。
+    设置 change_log_retention_days 时，每轮最后同样分批删除过期的变更日志。
+    """
+
+    def __init__(self, engine, retention_days: float, batch_size: int, batch_pause: float, interval: float,
+                 lock_timeout_ms: int = 2000, change_log_retention_days: Optional[float] = None):
+        self.engine = engine
+        self.retention_days = retention_days
+        self.change_log_retention_days = change_log_retention_days
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.interval = interval
+        self.lock_timeout_ms = lock_timeout_ms
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._run_lock = threading.Lock()
+        self._thread = None
+        self._state: Dict[str, object] = {
+            "running": False,
+            "table": None,
+            "started_at": None,
+            "batches": 0,
+            "purged": {},
+        }
+        self._last_run: Optional[Dict[str, object]] = None
+        self._runs = 0
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="soft-delete-purge", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.batch_pause + 5)
+            self._thread = None
+
+    def trigger(self) -> bool:
+        """在后台线程中立即运行一次；后台线程未启动时新建线程运行，已在运行时返回False"""
+        if self._state["running"]:
+            return False
+        if self._thread is not None:
+            self._wake.set()
+        else:
+            threading.Thread(target=self.run_once, name="soft-delete-purge-once", daemon=True).start()
+        return True
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "enabled": self._thread is not None,
+            "retention_days": self.retention_days,
+            "change_log_retention_days": self.change_log_retention_days,
+            "batch_size": self.batch_size,
+            "batch_pause": self.batch_pause,
+            "interval": self.interval,
+            "runs": self._runs,
+            "current": dict(self._state, purged=dict(self._state["purged"])),
+            "last_run": self._last_run,
+        }
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("清理软删除数据时发生错误")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def run_once(self) -> Optional[Dict[str, object]]:
+        """执行一轮清理，返回每张表删除的行数；其他线程或副本正在清理时返回None"""
+        if not self._run_lock.acquire(blocking=False):
+            return None
+        try:
+            with self.engine.connect() as lock_conn:
+                locked = lock_conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": PURGE_LOCK_KEY}).scalar()
+                # 会话级锁在提交后仍然持有；立即结束隐式事务，避免清理期间一直 idle in transaction
+                # （拖住xmin和vacuum，且可能被 idle_in_transaction_session_timeout 断开而丢锁）
+                lock_conn.commit()
+                if not locked:
+                    logger.info("其他副本正在清理软删除数据，跳过本轮")
+                    return None
+                try:
+                    return self._purge_all()
+                finally:
+                    lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": PURGE_LOCK_KEY})
+                    lock_conn.commit()
+        finally:
+            self._run_lock.release()
+
+    def _batches(self, sql, params: Dict[str, object]):
+        """分批执行直到某批不足 batch_size 行，逐批产出影响的行数"""
+        params = dict(params, batch_size=self.batch_size)
+        while not self._stop.is_set():
+            with self.engine.begin() as conn:
+                conn.execute(text(f"SET LOCAL lock_timeout = {int(self.lock_timeout_ms)}"))
+                count = conn.execute(sql, params).rowcount
+            self._state["batches"] += 1
+            yield count
+            if count < self.batch_size:
+                break
+            self._stop.wait(self.batch_pause)
+
+    def _purge_all(self) -> Dict[str, object]:
+        started = time.time()
+        limits = cutoffs(self.retention_days, started, self.change_log_retention_days)
+        now = cutoffs(0, started)
+        purged: Dict[str, int] = {}
+        stamped: Dict[str, int] = {}
+        self._state.update(running=True, table=None, started_at=started, batches=0, purged=purged)
+        steps = [(table, purge_batch_sql(table, extra)) for table, extra in PURGE_TABLES]
+        if self.change_log_retention_days is not None:
+            steps.append(("change_log", CHANGE_LOG_TRIM_SQL))
+        error = None
+        try:
+            for table, batch_sql in steps:
+                self._state["table"] = table
+                if table in now:
+                    stamped[table] = sum(self._batches(text(stamp_batch_sql(table)), {"now": now[table]}))
+                purged[table] = 0
+                for deleted in self._batches(text(batch_sql), {"cutoff": limits[table]}):
+                    purged[table] += deleted
+                    PURGED_ROWS.inc(table, amount=deleted)
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            self._runs += 1
+            self._last_run = {
+                "started_at": started,
+                "finished_at": time.time(),
+                "cutoffs": limits,
+                "batches": self._state["batches"],
+                "purged": dict(purged),
+                "stamped": dict(stamped),
+                "error": error,
+            }
+            self._state.update(running=False, table=None)
+        if any(stamped.values()):
+            logger.info("为缺少删除时间的软删除行补上 deleted_time: %s", stamped)
+        logger.info("软删除清理完成: %s", purged)
+        return dict(purged)
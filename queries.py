@@ -0,0 +1,331 @@
+import json
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+from fastapi import HTTPException, status
+from sqlalchemy import (
+    Numeric, String, Text, any_, bindparam, case, cast, delete, func, insert, literal_column, select, update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONPATH, UUID as PostgresUUID, insert as pg_insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import selectinload
+
+import models
+from pagination import paginate
+
+
+def uuid_any(column, ids: Iterable):
+    """column = ANY(CAST(:ids AS UUID[]))，整个列表只占一个绑定参数"""
+    return column == any_(cast(list(ids), ARRAY(PostgresUUID(as_uuid=True))))
+
+
+def text_any(column, values: Iterable[str]):
+    """column = ANY(CAST(:values AS VARCHAR[]))"""
+    return column == any_(cast(list(values), ARRAY(String)))
+
+
+def chunked(items: Sequence, size: int) -> Iterator[List]:
+    """按固定大小切分列表，避免单条语句超过参数上限"""
+    for start in range(0, len(items), size):
+        yield list(items[start:start + size])
+
+
+# aspect_ratio 是数据库生成列（width / NULLIF(height, 0)）
+ASPECT_RATIO = models.Artifact.aspect_ratio
+
+
+class ArtifactFilters:
+    """图片列表的过滤参数，作为依赖在同步/异步路由间共享
+
+    宽高比（width/height）和像素数范围由 (aspect_ratio, pixels)、(pixels) 部分索引支持（见迁移0007）。
+    """
+
+    def __init__(
+        self,
+        format: Optional[str] = None,
+        min_width: Optional[int] = None,
+        max_width: Optional[int] = None,
+        min_height: Optional[int] = None,
+        max_height: Optional[int] = None,
+        min_aspect: Optional[float] = None,
+        max_aspect: Optional[float] = None,
+        min_pixels: Optional[int] = None,
+        max_pixels: Optional[int] = None,
+        include_deleted: bool = False,
+    ):
+        self.format = format
+        self.min_width = min_width
+        self.max_width = max_width
+        self.min_height = min_height
+        self.max_height = max_height
+        self.min_aspect = min_aspect
+        self.max_aspect = max_aspect
+        self.min_pixels = min_pixels
+        self.max_pixels = max_pixels
+        self.include_deleted = include_deleted
+
+    def conditions(self) -> list:
+        conditions = []
+        if not self.include_deleted:
+            conditions.append(models.Artifact.is_deleted == False)
+        if self.format:
+            conditions.append(models.Artifact.format == self.format)
+        if self.min_width:
+            conditions.append(models.Artifact.width >= self.min_width)
+        if self.max_width:
+            conditions.append(models.Artifact.width <= self.max_width)
+        if self.min_height:
+            conditions.append(models.Artifact.height >= self.min_height)
+        if self.max_height:
+            conditions.append(models.Artifact.height <= self.max_height)
+        if self.min_aspect is not None:
+            conditions.append(ASPECT_RATIO >= self.min_aspect)
+        if self.max_aspect is not None:
+            conditions.append(ASPECT_RATIO <= self.max_aspect)
+        if self.min_pixels is not None:
+            conditions.append(models.Artifact.pixels >= self.min_pixels)
+        if self.max_pixels is not None:
+            conditions.append(models.Artifact.pixels <= self.max_pixels)
+        return conditions
+
+
+class JsonFilters:
+    """JSONB列（描述的extra_data、预设的config）的过滤参数
+
+    - json_contains：JSON对象或数组，包含关系 @>，例如 {"model": "gemini-1.5-pro"}
+    - json_path：jsonpath表达式，@? 存在判断，例如 $.scores.dress ? (@ > 0.8)
+    - json_key + json_min/json_max：点号分隔的键路径上的数值范围，非数值或缺失的键不匹配
+    @> 和 @?（仅jsonpath中的等值条件）走 jsonb_path_ops GIN索引；数值范围在声明为热点的键上走表达式索引（见迁移0005）。
+    """
+
+    def __init__(
+        self,
+        json_contains: Optional[str] = None,
+        json_path: Optional[str] = None,
+        json_key: Optional[str] = None,
+        json_min: Optional[float] = None,
+        json_max: Optional[float] = None,
+    ):
+        self.contains = _json_document(json_contains) if json_contains else None
+        self.path = json_path
+        self.key = _json_key(json_key) if json_key else None
+        if self.key is None and (json_min is not None or json_max is not None):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="json_min/json_max 需要同时指定 json_key")
+        if self.key is not None and json_min is None and json_max is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="json_key 需要同时指定 json_min 或 json_max")
+        self.min = json_min
+        self.max = json_max
+
+    def conditions(self, column) -> list:
+        conditions = []
+        if self.contains is not None:
+            conditions.append(column.contains(self.contains))
+        if self.path:
+            conditions.append(column.op("@?")(cast(self.path, JSONPATH)))
+        if self.key is not None:
+            number = json_number(column, self.key)
+            if self.min is not None:
+                conditions.append(number >= self.min)
+            if self.max is not None:
+                conditions.append(number <= self.max)
+        return conditions
+
+
+def _json_document(value: str):
+    try:
+        document = json.loads(value)
+    except ValueError:
+        document = None
+    if not isinstance(document, (dict, list)):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"json_contains 必须是JSON对象或数组: {value}")
+    return document
+
+
+def _json_key(value: str) -> List[str]:
+    path = value.split(".")
+    if not all(path):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"无效的 json_key: {value}")
+    return path
+
+
+def json_number(column, path: List[str]):
+    """键路径上的数值，不是数值时为NULL（不会因类型转换报错）
+
+    路径在执行时内联为常量，表达式与迁移0005中的表达式索引一致时才能走索引。
+    """
+    path_literal = bindparam(None, path, type_=ARRAY(Text), literal_execute=True)
+    return case(
+        (func.jsonb_typeof(column.op("#>")(path_literal)) == literal_column("'number'"),
+         cast(column.op("#>>")(path_literal), Numeric)),
+    )
+
+
+# 用户输入导致的SQL错误：jsonpath语法错误（42601）、SQL/JSON错误（2203x）
+_JSON_INPUT_SQLSTATES = ("42601", "2203")
+
+
+@contextmanager
+def json_filter_errors():
+    """执行带JSON过滤条件的查询：jsonpath等用户输入错误转为400，其他数据库错误原样抛出"""
+    try:
+        yield
+    except DBAPIError as e:
+        code = getattr(e.orig, "pgcode", None) or getattr(e.orig, "sqlstate", None) or ""
+        if code.startswith(_JSON_INPUT_SQLSTATES):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail=f"无效的JSON过滤条件: {str(e.orig).splitlines()[0]}"
+            ) from e
+        raise
+
+
+def artifacts_page_stmt(filters: ArtifactFilters, skip: int, limit: int, cursor: Optional[str], columns=None):
+    """图片列表：按 (upload_time, id) 降序；传入columns时只查询这些列"""
+    stmt = select(*columns) if columns else select(models.Artifact)
+    stmt = stmt.where(*filters.conditions())
+    return paginate(stmt, (models.Artifact.upload_time, models.Artifact.id), skip, limit, cursor)
+
+
+def presets_page_stmt(include_deleted: bool, skip: int, limit: int, cursor: Optional[str], conditions=()):
+    """预设列表：按 (create_time, preset_key) 降序；conditions为额外的过滤条件（如config的JSON过滤）"""
+    stmt = select(models.CaptionPreset).where(*conditions)
+    if not include_deleted:
+        stmt = stmt.where(models.CaptionPreset.is_deleted == False)
+    return paginate(stmt, (models.CaptionPreset.create_time, models.CaptionPreset.preset_key), skip, limit, cursor)
+
+
+def captions_page_stmt(include_deleted: bool, skip: int, limit: int, cursor: Optional[str], columns=None,
+                       conditions=()):
+    """描述列表：按 (upload_time, id) 降序；传入columns时只查询这些列，conditions为额外的过滤条件"""
+    stmt = select(*columns) if columns else select(models.Caption)
+    stmt = stmt.where(*conditions)
+    if not include_deleted:
+        stmt = stmt.where(models.Caption.is_deleted == False)
+    return paginate(stmt, (models.Caption.upload_time, models.Caption.id), skip, limit, cursor)
+
+
+def with_captions(stmt, preset_key: Optional[str] = None):
+    """附加一条selectin查询，批量加载图片的未删除描述（可按preset_key过滤）"""
+    criteria = [models.Caption.is_deleted == False]
+    if preset_key:
+        criteria.append(models.Caption.preset_key == preset_key)
+    return stmt.options(selectinload(models.Artifact.captions.and_(*criteria)))
+
+
+def artifact_version_stmt(*conditions):
+    """只查询计算ETag所需的列"""
+    return select(models.Artifact.id, models.Artifact.update_time, models.Artifact.is_deleted).where(*conditions)
+
+
+def caption_row_stmt(caption_id):
+    """不经过ORM读取未删除描述的整行，行内容即缓存版本"""
+    return select(*models.Caption.__table__.columns).where(
+        models.Caption.id == caption_id,
+        models.Caption.is_deleted == False
+    )
+
+
+def by_ids_stmt(model, ids: List, include_deleted: bool):
+    """一条 id = ANY(:ids) 查询，走主键索引"""
+    stmt = select(model).where(uuid_any(model.id, ids))
+    if not include_deleted:
+        stmt = stmt.where(model.is_deleted == False)
+    return stmt
+
+
+def md5_lookup_stmt(md5s: List[str]):
+    """一条 md5 = ANY(:md5s) 查询，走md5唯一索引"""
+    return select(models.Artifact.md5, models.Artifact.id, models.Artifact.is_deleted).where(
+        text_any(models.Artifact.md5, md5s)
+    )
+
+
+def insert_returning(model, values: dict):
+    """INSERT ... RETURNING 全部列，一次往返取回新行（包括数据库生成的列）"""
+    return insert(model.__table__).values(**values).returning(*model.__table__.columns)
+
+
+def update_returning(model, condition, values: dict):
+    """UPDATE ... WHERE condition RETURNING 全部列，没有匹配行时结果为空；values为空时退化为SELECT"""
+    columns = model.__table__.columns
+    if not values:
+        return select(*columns).where(condition)
+    return update(model.__table__).where(condition).values(**values).returning(*columns)
+
+
+def next_update_time():
+    """服务端写入图片时的update_time：当前毫秒时间戳，且严格大于原值
+
+    图片ETag由update_time决定，同一毫秒内的两次写入也必须得到不同的ETag。
+    """
+    return func.greatest(int(time.time() * 1000), models.Artifact.update_time + 1)
+
+
+def insert_artifact_stmt(values: dict):
+    """md5冲突时不插入、不返回行，由调用方返回409"""
+    table = models.Artifact.__table__
+    return pg_insert(table).values(**values).on_conflict_do_nothing(
+        index_elements=[table.c.md5]
+    ).returning(*table.columns)
+
+
+def upsert_preset_stmt(values: dict):
+    """新建预设，或恢复同名的已删除预设；同名预设未删除时不返回行（409）"""
+    table = models.CaptionPreset.__table__
+    stmt = pg_insert(table).values(**values)
+    restored = {key: stmt.excluded[key] for key in values if key != "preset_key"}
+    restored.update(is_deleted=False, deleted_time=None)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.preset_key],
+        set_=restored,
+        where=table.c.is_deleted == True,
+    ).returning(*table.columns)
+
+
+def preset_caption_condition(preset_key: str):
+    """同一预设下第一条未删除的描述（create_caption按预设覆盖更新）"""
+    return models.Caption.id == select(models.Caption.id).where(
+        models.Caption.preset_key == preset_key,
+        models.Caption.is_deleted == False
+    ).limit(1).scalar_subquery()
+
+
+def preset_caption_targets_stmt(preset_keys: List[str]):
+    """每个预设一条未删除描述的id，即 preset_caption_condition 逐个预设选出的覆盖目标"""
+    return select(models.Caption.preset_key, models.Caption.id).where(
+        text_any(models.Caption.preset_key, preset_keys),
+        models.Caption.is_deleted == False
+    ).distinct(models.Caption.preset_key)
+
+
+def insert_many_returning(model, rows: List[dict]):
+    """单条多行 INSERT ... RETURNING 全部列；各行的键必须相同"""
+    return insert(model.__table__).values(rows).returning(*model.__table__.columns)
+
+
+def insert_map_stmt(values: dict):
+    """映射已存在时不插入、不返回行（409）；图片或描述不存在时触发外键错误"""
+    return pg_insert(models.ArtifactCaptionMap.__table__).values(**values).on_conflict_do_nothing().returning(
+        *models.ArtifactCaptionMap.__table__.columns
+    )
+
+
+def soft_delete_by_ids_stmt(model, ids: List, deleted_time):
+    """UPDATE ... SET is_deleted = true WHERE id = ANY(:ids) AND is_deleted = false RETURNING id
+
+    已删除的行不再更新，避免推迟其 deleted_time 导致清理任务延后删除。
+    带 update_time 的表（图片）同时更新 update_time，使ETag随之变化。
+    """
+    table = model.__table__
+    values = dict(is_deleted=True, deleted_time=deleted_time)
+    if "update_time" in table.c:
+        values["update_time"] = next_update_time()
+    return update(table).where(uuid_any(table.c.id, ids), table.c.is_deleted == False).values(
+        **values
+    ).returning(table.c.id)
+
+
+def hard_delete_by_ids_stmt(model, ids: List):
+    """DELETE ... WHERE id = ANY(:ids) RETURNING id，映射表由外键级联删除"""
+    table = model.__table__
+    return delete(table).where(uuid_any(table.c.id, ids)).returning(table.c.id)
@@ -0,0 +1,176 @@
+import itertools
+import logging
+import threading
+import time
+from http.cookies import SimpleCookie
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from metrics import REGISTRY, Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+# 请求头为真值时读请求走主库
+READ_PRIMARY_HEADER = "X-Read-Primary"
+# 写请求成功后下发的cookie，值为走主库的截止时间（毫秒时间戳）
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# 请求使用了主库读写会话时在 request.state 上设置的标记，只有这类请求才触发粘滞
+PRIMARY_SESSION_FLAG = "used_primary_session"
+
+READ_ROUTING = REGISTRY.register(Counter(
+    "db_read_routing_total", "Read-only sessions by target database", ("target",),
+))
+
+# 复制延迟查询：主库（未处于恢复状态）返回0
+LAG_SQL = (
+    "SELECT CASE WHEN pg_is_in_recovery() "
+    "THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) ELSE 0 END"
+)
+
+
+class Replica:
+    """单个只读副本：同步引擎和会话工厂、可选的异步引擎和会话工厂，以及最近一次健康检查的结果"""
+
+    def __init__(self, name: str, engine, session_factory, async_engine=None, async_session_factory=None):
+        self.name = name
+        self.engine = engine
+        self.session_factory = session_factory
+        self.async_engine = async_engine
+        self.async_session_factory = async_session_factory
+        # 启动时默认健康，第一次检查失败后才摘除
+        self.healthy = True
+        self.lag: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+
+
+class ReplicaSet:
+    """在健康的副本之间轮询分配读会话，后台线程定期检查副本连通性和复制延迟"""
+
+    def __init__(self, replicas: List[Replica], check_interval: float, max_lag: float = 0):
+        self.replicas = replicas
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self._counter = itertools.count()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def choose(self) -> Optional[Replica]:
+        """轮询返回一个健康的副本，没有健康副本时返回None（由调用方回退到主库）"""
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    def check(self, replica: Replica) -> None:
+        try:
+            with replica.engine.connect() as conn:
+                lag = float(conn.execute(text(LAG_SQL)).scalar() or 0)
+            replica.lag = lag
+            replica.last_error = None
+            healthy = not (self.max_lag > 0 and lag > self.max_lag)
+            if not healthy:
+                replica.last_error = f"复制延迟 {lag:.1f}s 超过 {self.max_lag}s"
+        except Exception as e:
+            healthy = False
+            replica.last_error = str(e)
+        if healthy != replica.healthy:
+            logger.warning("只读副本 %s %s: %s", replica.name, "恢复" if healthy else "摘除", replica.last_error or "")
+        replica.healthy = healthy
+        replica.checked_at = time.time()
+
+    def check_all(self) -> None:
+        for replica in self.replicas:
+            self.check(replica)
+
+    def start(self) -> None:
+        if self._thread is not None or not self.replicas:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="replica-health", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.check_interval + 1)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.check_all()
+            self._stop.wait(self.check_interval)
+
+    def status(self) -> List[Dict[str, object]]:
+        return [
+            {
+                "name": r.name,
+                "healthy": r.healthy,
+                "lag_seconds": r.lag,
+                "last_error": r.last_error,
+                "checked_at": r.checked_at,
+            }
+            for r in self.replicas
+        ]
+
+    def healthy_gauge(self):
+        return [((r.name,), 1 if r.healthy else 0) for r in self.replicas]
+
+
+def wants_primary(request) -> bool:
+    """请求头 X-Read-Primary 为真，或仍在写请求之后的粘滞窗口内时，读请求走主库"""
+    if request.headers.get(READ_PRIMARY_HEADER, "").strip().lower() in ("1", "true", "yes", "on"):
+        return True
+    until = request.cookies.get(READ_PRIMARY_COOKIE)
+    if until:
+        try:
+            return int(until) > time.time() * 1000
+        except ValueError:
+            return False
+    return False
+
+
+def register_gauge(replica_set: ReplicaSet) -> None:
+    REGISTRY.register(Gauge(
+        "db_replica_healthy", "1 if the read replica passed its last health check", ("replica",),
+        replica_set.healthy_gauge,
+    ))
+
+
+def mark_primary_session(request) -> None:
+    setattr(request.state, PRIMARY_SESSION_FLAG, True)
+
+
+class ReadYourWritesMiddleware:
+    """ASGI中间件：写请求成功后下发cookie，粘滞窗口内该客户端的读请求走主库
+
+    只读的POST接口（md5查询、按id批量获取）使用只读会话，不会触发粘滞。
+    """
+
+    def __init__(self, app, sticky_seconds: float):
+        self.app = app
+        self.sticky_seconds = sticky_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS or self.sticky_seconds <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            used_primary = scope.get("state", {}).get(PRIMARY_SESSION_FLAG, False)
+            if message["type"] == "http.response.start" and message["status"] < 400 and used_primary:
+                cookie = SimpleCookie()
+                cookie[READ_PRIMARY_COOKIE] = str(int((time.time() + self.sticky_seconds) * 1000))
+                cookie[READ_PRIMARY_COOKIE]["max-age"] = int(self.sticky_seconds) + 1
+                cookie[READ_PRIMARY_COOKIE]["path"] = "/"
+                cookie[READ_PRIMARY_COOKIE]["httponly"] = True
+                headers = list(message.get("headers", []))
+                headers.append((b"set-cookie", cookie[READ_PRIMARY_COOKIE].OutputString().encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
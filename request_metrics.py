@@ -0,0 +1,121 @@
+import logging
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+import config
+from metrics import REGISTRY, Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+# 每个请求的SQL条数分桶，用于发现N+1
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 500, 1000)
+
+QUERY_COUNT_HEADER = "X-Query-Count"
+
+# 未匹配任何路由的请求（404）统一归为一类，避免标签基数随路径增长
+UNMATCHED_ROUTE = "unmatched"
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total", "HTTP requests by route and status code", ("method", "route", "status"),
+))
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route"),
+))
+HTTP_REQUEST_DB_TIME = REGISTRY.register(Histogram(
+    "http_request_db_seconds", "Time spent executing SQL per request", ("method", "route"),
+))
+HTTP_REQUEST_QUERIES = REGISTRY.register(Histogram(
+    "http_request_queries", "SQL statements executed per request", ("method", "route"), QUERY_COUNT_BUCKETS,
+))
+SLOW_QUERIES = REGISTRY.register(Counter(
+    "db_slow_queries_total", "SQL statements slower than SLOW_QUERY_MS", ("route",),
+))
+
+
+class RequestStats:
+    """单个请求内的SQL统计，由中间件创建，引擎事件累加"""
+
+    __slots__ = ("scope", "query_count", "db_time")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.query_count = 0
+        self.db_time = 0.0
+
+    @property
+    def route(self) -> str:
+        return route_template(self.scope)
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+# endpoint函数 -> 路由模板，首次使用时从app.routes构建
+_route_paths: Dict[object, str] = {}
+
+
+def route_template(scope: dict) -> str:
+    """返回匹配到的路由模板（如 /artifacts/{artifact_id}），而不是实际路径"""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return UNMATCHED_ROUTE
+    if endpoint not in _route_paths:
+        for route in scope["app"].routes:
+            if getattr(route, "endpoint", None) is not None:
+                _route_paths.setdefault(route.endpoint, route.path)
+    return _route_paths.get(endpoint, UNMATCHED_ROUTE)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # 同一连接上的语句串行执行，只需保存最近一次的开始时间（执行失败时下一次会覆盖）
+    conn.info["query_start_time"] = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"]
+    stats = _current.get()
+    if stats is not None:
+        stats.query_count += 1
+        stats.db_time += elapsed
+    if config.SLOW_QUERY_MS > 0 and elapsed * 1000 >= config.SLOW_QUERY_MS:
+        route = stats.route if stats is not None else "-"
+        SLOW_QUERIES.inc(route)
+        logger.warning("慢查询 %.1fms route=%s: %s", elapsed * 1000, route, statement[:2000])
+
+
+class RequestMetricsMiddleware:
+    """ASGI中间件：记录每个路由的延迟、状态码、SQL条数和SQL耗时"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_stats(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # 流式响应在发送响应头之后仍可能执行SQL，这里只是发送响应头时的条数
+                headers = list(message.get("headers", []))
+                headers.append((QUERY_COUNT_HEADER.lower().encode("latin-1"), str(stats.query_count).encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _current.reset(token)
+            route = stats.route
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, route, str(status_code))
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, method, route)
+            HTTP_REQUEST_DB_TIME.observe(stats.db_time, method, route)
+            HTTP_REQUEST_QUERIES.observe(stats.query_count, method, route)
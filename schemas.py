@@ -33,7 +33,7 @@ class ArtifactCreate(ArtifactBase):
 class ArtifactUpdate(BaseModel):
     """更新图片Schema"""
     upload_time: Optional[int] = None
-    update_time: Optional[int] = None
+    update_time: Optional[int] = None  # 由服务端维护，更新时忽略
     upload_user: Optional[UUID] = None
     children_id: Optional[List[UUID]] = None
     width: Optional[int] = None
@@ -69,6 +69,16 @@ class Artifact(ArtifactBase):
     class Config:
         from_attributes = True
 
+class ArtifactTreeNode(Artifact):
+    """派生关系中的一个节点：depth为与起点相隔的层数（起点为0），from_id为到达该节点的上一个节点"""
+    depth: int
+    from_id: Optional[UUID] = None
+
+class ArtifactTree(BaseModel):
+    """GET /artifacts/{id}/tree 和 /parents 的结果，按层数排序；truncated为true时节点数超过limit被截断"""
+    nodes: List[ArtifactTreeNode]
+    truncated: bool
+
 # Caption Preset Schemas
 class CaptionPresetBase(BaseModel):
     """预设基础Schema"""
@@ -130,6 +140,11 @@ class Caption(CaptionBase):
     class Config:
         from_attributes = True
 
+class CaptionSearchResult(Caption):
+    """描述搜索结果，rank为相关度，artifact_ids为通过映射关联的图片"""
+    rank: float
+    artifact_ids: List[UUID] = []
+
 # ArtifactCaptionMap Schemas
 class ArtifactCaptionMapBase(BaseModel):
     """映射基础Schema"""
@@ -144,4 +159,97 @@ class ArtifactCaptionMapCreate(ArtifactCaptionMapBase):
 class ArtifactCaptionMap(ArtifactCaptionMapBase):
     """映射完整Schema"""
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ArtifactWithCaptions(Artifact):
+    """图片及其未删除的描述"""
+    captions: List[Caption] = []
+
+# 批量创建图片Schemas
+class ArtifactBatchItem(BaseModel):
+    """批量创建单行结果"""
+    md5: str
+    status: str  # created 或 duplicate
+    id: Optional[UUID] = None  # 新建或已存在图片的id
+
+class ArtifactBatchResult(BaseModel):
+    """批量创建图片结果"""
+    created_count: int
+    duplicate_count: int
+    results: List[ArtifactBatchItem]
+
+# MD5批量查询Schemas
+class Md5LookupRequest(BaseModel):
+    """MD5批量查询请求"""
+    md5s: List[str] = Field(..., max_length=50000)
+    with_deleted_status: bool = False  # 是否返回is_deleted
+
+class Md5LookupItem(BaseModel):
+    """已存在的MD5"""
+    md5: str
+    id: UUID
+    is_deleted: Optional[bool] = None
+
+class Md5LookupResult(BaseModel):
+    """MD5批量查询结果"""
+    found: List[Md5LookupItem]
+    missing: List[str]
+
+# 按id批量查询Schemas
+class IdsLookupRequest(BaseModel):
+    """按id批量查询请求"""
+    ids: List[UUID] = Field(..., max_length=10000)
+    include_deleted: bool = False
+
+class ArtifactsByIdsResult(BaseModel):
+    """按id批量查询图片结果，items与请求顺序一致"""
+    items: List[Artifact]
+    missing: List[UUID]
+
+class CaptionsByIdsResult(BaseModel):
+    """按id批量查询描述结果，items与请求顺序一致"""
+    items: List[Caption]
+    missing: List[UUID]
+
+# 按id批量删除Schemas
+class IdsDeleteRequest(BaseModel):
+    """按id批量删除请求"""
+    ids: List[UUID] = Field(..., max_length=10000)
+    permanent: bool = False  # 为true时物理删除，否则软删除
+
+class IdsDeleteResult(BaseModel):
+    """按id批量删除结果，skipped为不存在（软删除时还包括已删除）的id"""
+    deleted_count: int
+    skipped: List[UUID]
+
+# 变更日志Schemas
+class Change(BaseModel):
+    """一条变更：artifacts 只有artifact_id，captions 只有caption_id，artifact_caption_map 两者都有"""
+    table: str
+    op: str  # insert / update / delete
+    artifact_id: Optional[UUID] = None
+    caption_id: Optional[UUID] = None
+    change_time: int
+
+class ChangeFeed(BaseModel):
+    """GET /changes 结果；watermark 作为下次请求的since，has_more为true时应立即继续拉取"""
+    items: List[Change]
+    watermark: str
+    has_more: bool
+
+# 图片分桶Schemas
+class ArtifactBucket(BaseModel):
+    """一个非空的桶：宽高比范围为 [min_aspect, max_aspect)，像素数范围为 [min_pixels, max_pixels)，两端的桶没有下界或上界"""
+    aspect_bucket: int
+    pixel_bucket: int
+    resolution: Optional[str] = None  # 按 resolutions 分桶时为对应的分辨率
+    min_aspect: Optional[float] = None
+    max_aspect: Optional[float] = None
+    min_pixels: Optional[int] = None
+    max_pixels: Optional[int] = None
+    count: int
+
+class ArtifactBuckets(BaseModel):
+    """GET /artifacts/buckets 结果，按 (aspect_bucket, pixel_bucket) 排序"""
+    buckets: List[ArtifactBucket]
+    total: int
@@ -0,0 +1,105 @@
+import re
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import Float, cast, func, literal_column, select
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+import models
+from pagination import keyset_filter
+
+# 与迁移0003中 text_search 生成列使用的文本搜索配置一致
+SEARCH_CONFIG = "english"
+
+# text_search 是数据库生成列（迁移0003），不在模型中声明，其他查询和 RETURNING 不会带出tsvector
+TEXT_SEARCH = literal_column("captions.text_search", TSVECTOR)
+
+SEARCH_MODES = ("auto", "fts", "substring")
+
+# 排序方式 -> 游标中的排序键。rank需要为所有命中行计算相关度再取前N，命中很多的宽泛查询较慢；
+# recent 按 (upload_time, id) 沿索引倒序扫描并过滤，命中越多返回越快
+SEARCH_ORDERS = {"rank": ("rank", "id"), "recent": ("upload_time", "id")}
+
+# 中日韩字符：分词器不会切分，auto模式下改用子串匹配
+CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+
+# pg_trgm 按3个字符切分，更短的子串用不上三元组索引
+MIN_SUBSTRING_LENGTH = 3
+
+# 单页最多返回的描述数
+SEARCH_LIMIT_MAX = 200
+
+
+def resolve_mode(q: str, mode: str) -> str:
+    """auto：查询含中日韩字符时用子串匹配，否则用全文搜索"""
+    if mode not in SEARCH_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"无效的搜索模式: {mode}，可选 {', '.join(SEARCH_MODES)}"
+        )
+    if mode == "auto":
+        mode = "substring" if CJK_PATTERN.search(q) else "fts"
+    if mode == "substring" and len(q) < MIN_SUBSTRING_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"子串搜索至少需要 {MIN_SUBSTRING_LENGTH} 个字符"
+        )
+    return mode
+
+
+def check_order(order: str) -> str:
+    if order not in SEARCH_ORDERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"无效的排序方式: {order}，可选 {', '.join(SEARCH_ORDERS)}"
+        )
+    return order
+
+
+def check_search_limit(limit: int) -> int:
+    if not 0 < limit <= SEARCH_LIMIT_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"limit 必须在 1 到 {SEARCH_LIMIT_MAX} 之间"
+        )
+    return limit
+
+
+def _like_pattern(q: str) -> str:
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def caption_search_stmt(q: str, mode: str, preset_key: Optional[str], limit: int, cursor: Optional[str],
+                        order: str = "rank"):
+    """搜索未删除的描述，按相关度（或上传时间）降序，附带通过映射表关联的图片id
+
+    fts：text_search @@ websearch_to_tsquery（支持引号短语、OR、-排除），ts_rank_cd 排序
+    substring：text ILIKE '%q%'（有pg_trgm索引时走索引），查询占描述长度的比例排序，
+               不依赖pg_trgm的函数，扩展不可用时也能执行
+    游标为 (rank, id) 或 (upload_time, id)，rank统一为双精度，经游标往返后比较仍然精确；
+    先在内层取出一页，再只为这一页的描述查询映射。
+    """
+    caption = models.Caption
+    if mode == "fts":
+        tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+        match = TEXT_SEARCH.op("@@")(tsquery)
+        rank = cast(func.ts_rank_cd(TEXT_SEARCH, tsquery), Float)
+    else:
+        match = caption.text.ilike(_like_pattern(q), escape="\\")
+        rank = cast(len(q), Float) / func.greatest(func.char_length(caption.text), 1)
+
+    page = select(*caption.__table__.columns, rank.label("rank")).where(match, caption.is_deleted == False)
+    if preset_key:
+        page = page.where(caption.preset_key == preset_key)
+    keys = [rank if order == "rank" else caption.upload_time, caption.id]
+    keyset = keyset_filter(keys, cursor)
+    if keyset is not None:
+        page = page.where(keyset)
+    page = page.order_by(*(key.desc() for key in keys)).limit(limit).subquery()
+
+    artifact_ids = select(func.array_agg(models.ArtifactCaptionMap.artifact_id)).where(
+        models.ArtifactCaptionMap.caption_id == page.c.id
+    ).scalar_subquery()
+    return select(page, artifact_ids.label("artifact_ids")).order_by(
+        *(page.c[name].desc() for name in SEARCH_ORDERS[order])
+    )
@@ -0,0 +1,108 @@
+"""生产环境启动入口
+
+用法:
+    python serve.py                 按CPU配额决定worker数
+    WEB_CONCURRENCY=4 python serve.py
+
+- worker数默认取容器CPU配额（cgroup v2 cpu.max / v1 cfs_quota），没有配额时取CPU核数，至少为1
+- 通过 WEB_CONCURRENCY 把worker数传给各worker进程，config.py 据此平分 DB_POOL_BUDGET
+- 收到SIGTERM后先进入排空期（/readyz 返回503，继续处理请求 SHUTDOWN_DRAIN_SECONDS 秒），
+  再停止接受连接，最多等待 SHUTDOWN_GRACEFUL_TIMEOUT 秒让进行中的请求完成
+"""
+import logging
+import os
+import signal
+import threading
+from typing import Optional
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+import config
+import lifecycle
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def cpu_quota() -> Optional[float]:
+    """容器的CPU配额（核数），未限制时返回None"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def default_workers() -> int:
+    """CPU配额向下取整（500m配额为1个worker），不超过可用核数"""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    quota = cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, quota)
+    return max(1, int(cpus))
+
+
+class DrainingServer(uvicorn.Server):
+    """第一次SIGTERM只进入排空期，排空结束后才按uvicorn的流程停机；排空期间再次收到信号则立即停机"""
+
+    drain_seconds = 0.0
+
+    def handle_exit(self, sig: int, frame) -> None:
+        if sig != signal.SIGTERM or self.drain_seconds <= 0 or lifecycle.is_draining():
+            super().handle_exit(sig, frame)
+            return
+        lifecycle.start_draining()
+        logger.info("收到SIGTERM，排空 %.1f 秒后停止接受连接", self.drain_seconds)
+        timer = threading.Timer(self.drain_seconds, super().handle_exit, (sig, frame))
+        timer.daemon = True
+        timer.start()
+
+
+class ParallelShutdownMultiprocess(Multiprocess):
+    """同时向所有worker发送SIGTERM再等待退出（uvicorn默认逐个terminate+join，排空时间会按worker数累加）"""
+
+    def shutdown(self) -> None:
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        logger.info("Stopping parent process [%s]", self.pid)
+
+
+def main() -> None:
+    workers = int(os.environ.get("WEB_CONCURRENCY") or default_workers())
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+
+    uvicorn_config = uvicorn.Config(
+        "main:app",
+        host=config.SERVER_HOST,
+        port=config.SERVER_PORT,
+        workers=workers,
+        lifespan="on",
+        proxy_headers=True,
+        timeout_graceful_shutdown=config.SHUTDOWN_GRACEFUL_TIMEOUT,
+    )
+    server = DrainingServer(uvicorn_config)
+    server.drain_seconds = config.SHUTDOWN_DRAIN_SECONDS
+    logger.info("启动 %d 个worker（CPU配额 %s）", workers, cpu_quota())
+    if workers > 1:
+        sock = uvicorn_config.bind_socket()
+        ParallelShutdownMultiprocess(uvicorn_config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    main()